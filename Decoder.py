@@ -1,38 +1,141 @@
 import struct
 import easydict
 
+# 报文格式注册表：同一个FMT只编译一次struct.Struct，所有operator共享
+_codec_registry = {}
+
+
+def compile_fmt(fmt: str) -> struct.Struct:
+    codec = _codec_registry.get(fmt)
+    if codec is None:
+        codec = _codec_registry.setdefault(fmt, struct.Struct(fmt))
+    return codec
+
+
+class Record:
+    # 解码结果容器的基类。子类用__slots__保存字段，不再为每个头部/链路创建dict；
+    # 同时兼容原来EasyDict的下标访问、遍历与打印方式。
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __repr__(self):
+        return str(dict(self.items()))
+
+
 class Operator:
+    _instances = {}
+
     def __init__(self):
         self.fields = []
         self.dataContainer = None
+        self._codec = None
+        self._names = None
+        self._field_codecs = {}
+
+    @classmethod
+    def shared(cls):
+        # operator不保存任何解码状态，因此每个类只需要一个实例，可以被所有线程共享
+        instance = Operator._instances.get(cls)
+        if instance is None:
+            instance = Operator._instances.setdefault(cls, cls())
+        return instance
 
     @property
     def FMT(self)->str:
         return "!"+"".join([x[0] for x in self.fields])
 
-    def decode(self, data:bytes):
-        size = struct.calcsize(self.FMT)
-        if len(data) < size:
-            raise Exception("{} is too short for FMT {}".format(len(data), self.FMT))
-        unpacked_data = struct.unpack(self.FMT, data[:size])
-        tmp = {}
-        for i in range(len(self.fields)):
-            tmp[self.fields[i][1]] = unpacked_data[i]
-        return easydict.EasyDict(tmp)
+    @property
+    def codec(self) -> struct.Struct:
+        if self._codec is None:
+            self._names = tuple(x[1] for x in self.fields)
+            self._codec = compile_fmt(self.FMT)
+        return self._codec
+
+    @property
+    def size(self) -> int:
+        return self.codec.size
+
+    def decode(self, data:bytes, offset=0):
+        # data可以是bytes或者整个报文的memoryview，通过offset定位，不做切片拷贝
+        codec = self.codec
+        if len(data) - offset < codec.size:
+            raise Exception("{} is too short for FMT {}".format(len(data) - offset, codec.format))
+        if self.dataContainer is not None:
+            return self.dataContainer(codec.unpack_from(data, offset))
+        return easydict.EasyDict(zip(self._names, codec.unpack_from(data, offset)))
 
     def encode(self, *data, **dic):
+        codec = self.codec
         encode_values = list(data)
         try:
-            encode_values += [dic[kv[0]] for kv in self.fields[len(encode_values):]]
+            encode_values += [dic[kv[1]] for kv in self.fields[len(encode_values):]]
         except:
             raise Exception("need data of {} but only get {}".format(self.fields[len(encode_values):], dic))
         if len(encode_values) != len(self.fields):
             raise Exception("data is not enough")
-        return struct.pack(self.FMT, *encode_values)
+        return codec.pack(*encode_values)
 
-    def get_len(self,data):
-        return struct.calcsize(self.FMT)
+    def pack_into(self, buf, offset, *data):
+        # 直接写入预先分配好的bytearray，返回写完之后的offset
+        codec = self.codec
+        codec.pack_into(buf, offset, *data)
+        return offset + codec.size
+
+    def _field_codec(self, name):
+        field = self._field_codecs.get(name)
+        if field is None:
+            index = [x[1] for x in self.fields].index(name)
+            field_offset = struct.calcsize("!" + "".join([x[0] for x in self.fields[:index]]))
+            field = self._field_codecs.setdefault(name, (field_offset, compile_fmt("!" + self.fields[index][0])))
+        return field
+
+    def field_offset(self, name) -> int:
+        return self._field_codec(name)[0]
+
+    def pack_field_into(self, buf, offset, name, value):
+        # 只改写已写好报文中的单个字段（长度、校验和等），不重新编码整个头部
+        field = self._field_codec(name)
+        field[1].pack_into(buf, offset + field[0], value)
+
+    def unpack_array(self, data, offset=0, count=None):
+        # 按固定步长解码重复元素（hello邻居、attached router等），返回原始元组列表
+        codec = self.codec
+        if count is None:
+            count = (len(data) - offset) // codec.size
+        end = offset + count * codec.size
+        if len(data) < end:
+            raise Exception("{} is too short for {} * FMT {}".format(len(data) - offset, count, codec.format))
+        return list(codec.iter_unpack(memoryview(data)[offset:end]))
+
+    def pack_array(self, rows):
+        pack = self.codec.pack
+        return b''.join([pack(*row) for row in rows])
+
+    def get_len(self, data, offset=0):
+        return self.codec.size
 
     def next_data(self, data):
         return data[self.get_len(data):]
-
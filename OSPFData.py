@@ -4,9 +4,17 @@ from typing import List
 
 from Decoder import *
 from STATIC import *
+from address import bytes_to_ip, ip_to_int
 
+try:
+    import numpy
+except ImportError:  # numpy是可选依赖，未安装时批量解码退回struct.iter_unpack
+    numpy = None
+
+
+class OSPFHeaderData(Record):  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+    __slots__ = ('version', 'type', 'length', 'router_id', 'area_id', 'checksum', 'autype', 'authentication')
 
-class OSPFHeaderData():  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
     def __init__(self, data):
         self.version = data[0]
         self.type = data[1]
@@ -21,6 +29,7 @@ class OSPFHeaderData():  # 为了能够在编写过程中进行代码提示，
 class OSPFHeaderOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFHeaderData
         # 解包OSPF头部 (version, type, length, router_id, area_id, checksum, autype, authentication)
         self.fields += [
             ('B', 'version'),
@@ -33,10 +42,10 @@ class OSPFHeaderOperator(Operator):
             ('Q', 'authentication')
         ]
 
-    def decode(self, data: bytes) -> OSPFHeaderData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        res = super().decode(data)
-        res.router_id = socket.inet_ntoa(res.router_id)
-        res.area_id = socket.inet_ntoa(res.area_id)
+    def decode(self, data: bytes, offset=0) -> OSPFHeaderData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        res.router_id = bytes_to_ip(res.router_id)
+        res.area_id = bytes_to_ip(res.area_id)
         return res
 
     def encode(self, type: int, packetLenth: int, router_id: str, area_id: str, checksum: int,
@@ -47,8 +56,20 @@ class OSPFHeaderOperator(Operator):
         area_id = socket.inet_aton(area_id)
         return super().encode(version, type, packetLenth, router_id, area_id, checksum, autype, authentication)
 
+    def pack_into(self, buf, offset, type: int, packetLenth: int, router_id: str, area_id: str, checksum: int,
+                  autype: int = OSPFAuthType.NULL,
+                  version: int = 2,
+                  authentication: int = 0):
+        router_id = socket.inet_aton(router_id)
+        area_id = socket.inet_aton(area_id)
+        return super().pack_into(buf, offset, version, type, packetLenth, router_id, area_id, checksum, autype,
+                                 authentication)
+
+
+class OSPFHelloData(Record):  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+    __slots__ = ('network_mask', 'hello_interval', 'options', 'router_priority', 'router_dead_interval', 'dr', 'bdr',
+                 'neighbours')
 
-class OSPFHelloData():  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
     def __init__(self, data):
         self.network_mask = data[0]
         self.hello_interval = data[1]
@@ -57,12 +78,21 @@ class OSPFHelloData():  # 为了能够在编写过程中进行代码提示，故
         self.router_dead_interval = data[4]
         self.dr = data[5]
         self.bdr = data[6]
-        self.neighbours = data[7]
+        self.neighbours = []
+
+
+class OSPFHelloNeighbourOperator(Operator):
+    def __init__(self):
+        super().__init__()
+        self.fields += [
+            ('4s', 'neighbour')
+        ]
 
 
 class OSPFHelloOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFHelloData
         self.fields += [
             ('4s', 'network_mask'),
             ('H', 'hello_interval'),
@@ -72,21 +102,16 @@ class OSPFHelloOperator(Operator):
             ('4s', 'dr'),
             ('4s', 'bdr')
         ]
-        # neighbour will be added in encode/decode
-
-    def decode(self, data: bytes) -> OSPFHelloData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        neighbour_cnt = 0
-        while struct.calcsize(self.FMT) < len(data):
-            self.fields.append(('4s', 'neighbour{}'.format(neighbour_cnt)))
-            neighbour_cnt += 1
-        logging.debug("find {} neighbours in hello packet".format(neighbour_cnt))
-        res = super().decode(data)
-        res['neighbours'] = []
-        for i in range(neighbour_cnt):
-            res['neighbours'].append(socket.inet_ntoa(res['neighbour{}'.format(i)]))
-        res.network_mask = socket.inet_ntoa(res.network_mask)
-        res.dr = socket.inet_ntoa(res.dr)
-        res.bdr = socket.inet_ntoa(res.bdr)
+        # neighbours紧跟在固定部分之后，按4字节定长数组编解码
+
+    def decode(self, data: bytes, offset=0) -> OSPFHelloData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        neighbours = OSPFHelloNeighbourOperator.shared().unpack_array(data, offset + self.size)
+        logging.debug("find {} neighbours in hello packet".format(len(neighbours)))
+        res.neighbours = [bytes_to_ip(nei) for (nei,) in neighbours]
+        res.network_mask = bytes_to_ip(res.network_mask)
+        res.dr = bytes_to_ip(res.dr)
+        res.bdr = bytes_to_ip(res.bdr)
         return res
 
     def encode(self, network_mask, hello_interval, options,
@@ -95,25 +120,29 @@ class OSPFHelloOperator(Operator):
         network_mask = socket.inet_aton(network_mask)
         dr = socket.inet_aton(dr)
         bdr = socket.inet_aton(bdr)
-        self.fields += ([('4s', 'neighbour')] * len(neighbours))
-        Nneighbours = [socket.inet_aton(nei) for nei in neighbours]
         res = super().encode(network_mask, hello_interval, options, router_priority, router_dead_interval,
-                             dr, bdr, *Nneighbours)
-        return res
+                             dr, bdr)
+        return res + OSPFHelloNeighbourOperator.shared().pack_array([(socket.inet_aton(nei),) for nei in neighbours])
+
+    def get_len(self, data, offset=0):
+        return len(data) - offset
 
 
-class OSPFDDData():  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+class OSPFDDData(Record):  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+    __slots__ = ('interface_mtu', 'options', 'DD_options', 'DD_seq', 'LSA_headers')
+
     def __init__(self, data):
         self.interface_mtu = data[0]
         self.options = data[1]
         self.DD_options = data[2]
         self.DD_seq = data[3]
-        self.LSA_headers = data[4]
+        self.LSA_headers: OSPFLSAHeaderColumns = None
 
 
 class OSPFDDOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFDDData
         self.fields += [
             ('H', 'interface_mtu'),
             ('B', 'options'),
@@ -121,8 +150,12 @@ class OSPFDDOperator(Operator):
             ('I', 'DD_seq')
         ]
 
-    def decode(self, data: bytes) -> OSPFDDData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        res = super().decode(data)
+    def decode(self, data: bytes, offset=0) -> OSPFDDData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        # DD固定部分之后是若干个20字节的LSA头，按列批量解码
+        offset += self.size
+        res.LSA_headers = OSPFLSAHeaderColumns(data, offset,
+                                               (len(data) - offset) // OSPFLSAHeaderOperator.shared().size)
         return res
 
     def encode(self, interface_mtu, options, DD_options, DD_seq):
@@ -130,7 +163,9 @@ class OSPFDDOperator(Operator):
         return res
 
 
-class OSPFLSAHeaderData():  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+class OSPFLSAHeaderData(Record):  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+    __slots__ = ('age', 'options', 'type', 'id', 'advertising_router', 'seq', 'checksum', 'length')
+
     def __init__(self, data):
         self.age = data[0]
         self.options = data[1]
@@ -145,6 +180,7 @@ class OSPFLSAHeaderData():  # 为了能够在编写过程中进行代码提示
 class OSPFLSAHeaderOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFLSAHeaderData
         # 解包OSPF头部 (version, type, length, router_id, area_id, checksum, autype, authentication)
         self.fields += [
             ('H', 'age'),
@@ -157,10 +193,10 @@ class OSPFLSAHeaderOperator(Operator):
             ('H', 'length')
         ]
 
-    def decode(self, data: bytes) -> OSPFLSAHeaderData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        res = super().decode(data)
-        res.advertising_router = socket.inet_ntoa(res.advertising_router)
-        res.id = socket.inet_ntoa(res.id)
+    def decode(self, data: bytes, offset=0) -> OSPFLSAHeaderData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        res.advertising_router = bytes_to_ip(res.advertising_router)
+        res.id = bytes_to_ip(res.id)
         return res
 
     def encode(self, age, options, type, id, advertising_router, seq, checksum, length):
@@ -169,42 +205,128 @@ class OSPFLSAHeaderOperator(Operator):
         res = super().encode(age, options, type, id, advertising_router, seq, checksum, length)
         return res
 
+    def pack_into(self, buf, offset, age, options, type, id, advertising_router, seq, checksum, length):
+        advertising_router = socket.inet_aton(advertising_router)
+        id = socket.inet_aton(id)
+        return super().pack_into(buf, offset, age, options, type, id, advertising_router, seq, checksum, length)
+
+
+# 批量解码时id/advertising_router按32位整数解出，方便与LSDB直接比较
+LSA_HEADER_COLUMN_FMT = '!HBBIIiHH'
+LSA_HEADER_COLUMNS = ('age', 'options', 'type', 'id', 'advertising_router', 'seq', 'checksum', 'length')
+if numpy is not None:
+    LSA_HEADER_DTYPE = numpy.dtype([('age', '>u2'), ('options', 'u1'), ('type', 'u1'), ('id', '>u4'),
+                                    ('advertising_router', '>u4'), ('seq', '>i4'), ('checksum', '>u2'),
+                                    ('length', '>u2')])
+
+
+def ip_key(ip: str) -> int:
+    return ip_to_int(ip)
+
+
+def lsa_key(lsa):
+    # LSA对象和解码出的LSA头都可以用(type, id, advertising_router)唯一标识
+    return lsa.type, ip_key(lsa.id), ip_key(lsa.advertising_router)
+
+
+class OSPFLSAHeaderColumns():
+    # DD与LSAck中的LSA头数组按列解码：安装了numpy时直接把报文视为结构化数组（不拷贝），
+    # 否则用struct.iter_unpack一次解出。只有真正需要的LSA头才会被解码成OSPFLSAHeaderData。
+    __slots__ = LSA_HEADER_COLUMNS + ('_data', '_offset', '_count')
+
+    def __init__(self, data, offset, count):
+        self._data = data
+        self._offset = offset
+        self._count = count
+        if numpy is not None:
+            array = numpy.frombuffer(data, LSA_HEADER_DTYPE, count, offset)
+            for name in LSA_HEADER_COLUMNS:
+                setattr(self, name, array[name])
+        else:
+            codec = compile_fmt(LSA_HEADER_COLUMN_FMT)
+            rows = list(codec.iter_unpack(memoryview(data)[offset:offset + count * codec.size]))
+            columns = list(zip(*rows)) if rows else [()] * len(LSA_HEADER_COLUMNS)
+            for name, column in zip(LSA_HEADER_COLUMNS, columns):
+                setattr(self, name, column)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index) -> OSPFLSAHeaderData:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        operator = OSPFLSAHeaderOperator.shared()
+        return operator.decode(self._data, self._offset + index * operator.size)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def keys(self):
+        if numpy is not None:
+            return list(zip(self.type.tolist(), self.id.tolist(), self.advertising_router.tolist()))
+        return list(zip(self.type, self.id, self.advertising_router))
+
+    def headers(self, indexes) -> List[OSPFLSAHeaderData]:
+        return [self[i] for i in indexes]
+
+    def newer_than(self, known_seqs):
+        # known_seqs与keys()一一对应，是LSDB中同一LSA的序号（没有时为比任何序号都小的值）
+        if numpy is not None:
+            return numpy.flatnonzero(self.seq > numpy.array(known_seqs, dtype=numpy.int64)).tolist()
+        return [i for i, (seq, known) in enumerate(zip(self.seq, known_seqs)) if seq > known]
+
+
+def lsa_header_keys(lsa_headers):
+    if isinstance(lsa_headers, OSPFLSAHeaderColumns):
+        return lsa_headers.keys()
+    return [lsa_key(header) for header in lsa_headers]
+
+
+class OSPFTosData(Record):
+    __slots__ = ('tos', 'metric')
 
-class OSPFTosData():
     def __init__(self, data):
         self.tos = data[0]
-        self.metric = data[1]
+        self.metric = data[2]
 
 
 class OSPFTosOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFTosData
         self.fields += [
             ('B', 'tos'),
             ('B', '_'),
             ('H', 'metric')
         ]
 
-    def decode(self, data: bytes) -> OSPFTosData:
-        return super().decode(data)
+    def decode(self, data: bytes, offset=0) -> OSPFTosData:
+        return super().decode(data, offset)
 
     def encode(self, tos, metric):
         return super().encode(tos, 0, metric)
 
+    def pack_into(self, buf, offset, tos, metric):
+        return super().pack_into(buf, offset, tos, 0, metric)
+
+
+class OSPFRouterLinkData(Record):
+    __slots__ = ('id', 'data', 'type', 'tos_num', 'metric', 'toss')
 
-class OSPFRouterLinkData():
     def __init__(self, data):
-        self.type = data[0]
-        self.id = data[1]
-        self.data = data[2]
+        self.id = data[0]
+        self.data = data[1]
+        self.type = data[2]
         self.tos_num = data[3]
         self.metric = data[4]
-        self.toss = data[5]
+        self.toss = []
 
 
 class OSPFRouterLinkOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFRouterLinkData
         self.fields += [
             ('4s', 'id'),
             ('4s', 'data'),
@@ -213,78 +335,91 @@ class OSPFRouterLinkOperator(Operator):
             ('H', 'metric')
         ]
 
-    def decode(self, data: bytes) -> OSPFRouterLinkData:
-        res = super().decode(data)
-        res.data = socket.inet_ntoa(res.data)
-        res.id = socket.inet_ntoa(res.id)
-        data_toss = super().next_data(data)
-        res['toss'] = []
-        self.tos_operators = []
+    def decode(self, data: bytes, offset=0) -> OSPFRouterLinkData:
+        res = super().decode(data, offset)
+        res.data = bytes_to_ip(res.data)
+        res.id = bytes_to_ip(res.id)
+        tos_operator = OSPFTosOperator.shared()
+        offset += self.size
         for i in range(res.tos_num):
-            tos_operator = OSPFTosOperator()
-            self.tos_operators.append(tos_operator)
-            res.toss.append(tos_operator.decode(data_toss))
-            data_toss = tos_operator.next_data(data_toss)
+            res.toss.append(tos_operator.decode(data, offset))
+            offset += tos_operator.size
         return res
 
-    def next_data(self, data):
-        data1 = super().next_data(data)
-        for tos_operator in self.tos_operators:
-            data1 = tos_operator.next_data(data1)
-        return data1
+    def get_len(self, data, offset=0):
+        # tos_num位于link的第10个字节，每个tos占4字节
+        return self.size + data[offset + 9] * OSPFTosOperator.shared().size
 
     def encode(self, id, data, type, metric, toss):
         data = socket.inet_aton(data)
         id = socket.inet_aton(id)
         data1 = super().encode(id, data, type, len(toss), metric)
+        tos_operator = OSPFTosOperator.shared()
         for tos in toss:
-            data1 += OSPFTosOperator().encode(tos['tos'], tos['metric'])
+            data1 += tos_operator.encode(tos['tos'], tos['metric'])
         return data1
 
+    def pack_into(self, buf, offset, id, data, type, metric, toss=()):
+        data = socket.inet_aton(data)
+        id = socket.inet_aton(id)
+        offset = super().pack_into(buf, offset, id, data, type, len(toss), metric)
+        tos_operator = OSPFTosOperator.shared()
+        for tos in toss:
+            offset = tos_operator.pack_into(buf, offset, tos['tos'], tos['metric'])
+        return offset
+
+
+class OSPFRouterLSADATA(Record):
+    __slots__ = ('options', 'link_num', 'links')
 
-class OSPFRouterLSADATA():
     def __init__(self, data):
         self.options = data[0]
-        self.link_num = data[1]
-        self.links:List[OSPFRouterLinkData] = data[2]
+        self.link_num = data[2]
+        self.links:List[OSPFRouterLinkData] = []
 
 
 class OSPFRouterLSAOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFRouterLSADATA
         self.fields += [
             ('B', 'options'),
             ('B', '_'),
             ('H', 'link_num')
         ]
 
-    def decode(self, data: bytes, lsa_len):
-        res = super().decode(data)
-        links_data = super().next_data(data)
-        res['links'] = []
-        self.router_link_operators = []
+    def decode(self, data: bytes, lsa_len, offset=0):
+        res = super().decode(data, offset)
+        operator = OSPFRouterLinkOperator.shared()
+        offset += self.size
         for i in range(res.link_num):
-            operator = OSPFRouterLinkOperator()
-            self.router_link_operators.append(operator)
-            res['links'].append(operator.decode(links_data))
-            links_data = operator.next_data(links_data)
+            link = operator.decode(data, offset)
+            res.links.append(link)
+            offset += operator.size + link.tos_num * OSPFTosOperator.shared().size
         return res
 
-    def next_data(self, data):
-        data1 = super().next_data(data)
-        for operator in self.router_link_operators:
-            data1 = operator.next_data(data1)
-        return data1
+    def get_len(self, data, offset=0):
+        operator = OSPFRouterLinkOperator.shared()
+        end = offset + self.size
+        for i in range(super().decode(data, offset).link_num):
+            end += operator.get_len(data, end)
+        return end - offset
 
     def encode(self, options, links):
         data1 = super().encode(options, 0, len(links))
+        operator = OSPFRouterLinkOperator.shared()
         for link in links:
-            operator = OSPFRouterLinkOperator()
             data1 += operator.encode(link['id'], link['data'], link['type'], link['metric'], link['toss'])
         return data1
 
+    def pack_into(self, buf, offset, options, link_num):
+        # 只写入固定部分，链路由OSPFRouterLinkOperator.pack_into逐条写入
+        return super().pack_into(buf, offset, options, 0, link_num)
+
+
+class OSPFNetworkLSAAttachedData(Record):
+    __slots__ = ('attached_router',)
 
-class OSPFNetworkLSAAttachedData():
     def __init__(self, data):
         self.attached_router = data[0]
 
@@ -292,61 +427,62 @@ class OSPFNetworkLSAAttachedData():
 class OSPFNetworkLSAAttachedOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFNetworkLSAAttachedData
         self.fields += [
             ('4s', 'attached_router')
         ]
 
-    def decode(self, data: bytes) -> OSPFNetworkLSAAttachedData:
-        res = super().decode(data)
-        res.attached_router = socket.inet_ntoa(res.attached_router)
+    def decode(self, data: bytes, offset=0) -> OSPFNetworkLSAAttachedData:
+        res = super().decode(data, offset)
+        res.attached_router = bytes_to_ip(res.attached_router)
         return res
 
     def encode(self, attached_router):
         attached_router = socket.inet_aton(attached_router)
         return super().encode(attached_router)
 
+    def pack_into(self, buf, offset, attached_router):
+        return super().pack_into(buf, offset, socket.inet_aton(attached_router))
+
+
+class OSPFNetworkLSADATA(Record):
+    __slots__ = ('network_mask', 'attached_routers')
 
-class OSPFNetworkLSADATA():
     def __init__(self, data):
         self.network_mask = data[0]
-        self.attached_routers = data[1]
+        self.attached_routers = []
 
 
 class OSPFNetworkLSAOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFNetworkLSADATA
         self.fields += [
             ('4s', 'network_mask')
         ]
 
-    def decode(self, data: bytes, lsa_len) -> OSPFNetworkLSADATA:
-        res = super().decode(data)
-        res.network_mask = socket.inet_ntoa(res.network_mask)
-        data = super().next_data(data)
-        self.attached_operators = []
-        res.attached_routers = []
-        for i in range((lsa_len - 24) // 4):
-            operator = OSPFNetworkLSAAttachedOperator()
-            self.attached_operators.append(operator)
-            res.attached_routers.append(operator.decode(data).attached_router)
-            data = operator.next_data(data)
+    def decode(self, data: bytes, lsa_len, offset=0) -> OSPFNetworkLSADATA:
+        res = super().decode(data, offset)
+        res.network_mask = bytes_to_ip(res.network_mask)
+        attached = OSPFNetworkLSAAttachedOperator.shared().unpack_array(data, offset + self.size,
+                                                                        (lsa_len - 24) // 4)
+        res.attached_routers = [bytes_to_ip(router) for (router,) in attached]
         return res
 
-    def next_data(self, data):
-        data = super().next_data(data)
-        for operator in self.attached_operators:
-            data = operator.next_data(data)
-        return data
-
     def encode(self, mask, attached_routers: List[str]):
         mask = socket.inet_aton(mask)
         data = super().encode(mask)
-        for router in attached_routers:
-            data += OSPFNetworkLSAAttachedOperator().encode(router)
-        return data
+        return data + OSPFNetworkLSAAttachedOperator.shared().pack_array(
+            [(socket.inet_aton(router),) for router in attached_routers])
+
+    def pack_into(self, buf, offset, mask):
+        # 只写入network_mask，attached router由OSPFNetworkLSAAttachedOperator.pack_into逐个写入
+        return super().pack_into(buf, offset, socket.inet_aton(mask))
+
 
+class OSPFSummaryLSADATA(Record):
+    __slots__ = ('network_mask', 'metric')
 
-class OSPFSummaryLSADATA():
     def __init__(self, data):
         self.network_mask = data[0]
         self.metric = data[1]
@@ -355,6 +491,7 @@ class OSPFSummaryLSADATA():
 class OSPFSummaryLSAOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFSummaryLSADATA
         self.fields += [
             ('4s', 'network_mask'),
             ('I', 'metric')
@@ -362,26 +499,29 @@ class OSPFSummaryLSAOperator(Operator):
 
     def encode(self, mask, metric):
         mask = socket.inet_aton(mask)
-        super().encode(mask, metric)
+        return super().encode(mask, metric)
 
-    def decode(self, data: bytes,  lsa_len):
-        res = super().decode(data)
-        res.network_mask = socket.inet_ntoa(res.network_mask)
+    def decode(self, data: bytes, lsa_len, offset=0):
+        res = super().decode(data, offset)
+        res.network_mask = bytes_to_ip(res.network_mask)
         return res
 
 
-class OSPFExternalLSADATA():
+class OSPFExternalLSADATA(Record):
+    __slots__ = ('network_mask', 'options', 'metric', 'forwarding_address', 'external_routing_tag')
+
     def __init__(self, data):
         self.network_mask = data[0]
         self.options = data[1]
-        self.metric = data[2]
-        self.forwarding_address = data[3]
-        self.external_routing_tag = data[4]
+        self.metric = data[3]
+        self.forwarding_address = data[4]
+        self.external_routing_tag = data[5]
 
 
 class OSPFExternalLSAOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFExternalLSADATA
         self.fields += [
             ('4s', 'network_mask'),
             ('B', 'options'),
@@ -391,11 +531,11 @@ class OSPFExternalLSAOperator(Operator):
             ('4s', 'external_routing_tag')
         ]
 
-    def decode(self, data: bytes, lsa_len):
-        res = super().decode(data)
-        res.network_mask = socket.inet_ntoa(res.network_mask)
-        res.forwarding_address = socket.inet_ntoa(res.forwarding_address)
-        res.external_routing_tag = socket.inet_ntoa(res.external_routing_tag)
+    def decode(self, data: bytes, lsa_len, offset=0):
+        res = super().decode(data, offset)
+        res.network_mask = bytes_to_ip(res.network_mask)
+        res.forwarding_address = bytes_to_ip(res.forwarding_address)
+        res.external_routing_tag = bytes_to_ip(res.external_routing_tag)
         return res
 
     def encode(self, network_mask, options, metric, forwarding_address='0.0.0.0', external_routing_tag='0.0.0.0'):
@@ -405,7 +545,9 @@ class OSPFExternalLSAOperator(Operator):
         return super().encode(network_mask, options, 0, metric, forwarding_address, external_routing_tag)
 
 
-class OSPFLSRLSAIdentDATA():
+class OSPFLSRLSAIdentDATA(Record):
+    __slots__ = ('type', 'id', 'advertising_router')
+
     def __init__(self, data):
         self.type = data[0]
         self.id = data[1]
@@ -415,16 +557,17 @@ class OSPFLSRLSAIdentDATA():
 class OSPFLSRLSAIdentOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFLSRLSAIdentDATA
         self.fields += [
             ('I', 'type'),
             ('4s', 'id'),
             ('4s', 'advertising_router')
         ]
 
-    def decode(self, data: bytes) -> OSPFDDData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        res = super().decode(data)
-        res.id = socket.inet_ntoa(res.id)
-        res.advertising_router = socket.inet_ntoa(res.advertising_router)
+    def decode(self, data: bytes, offset=0) -> OSPFDDData:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        res.id = bytes_to_ip(res.id)
+        res.advertising_router = bytes_to_ip(res.advertising_router)
         return res
 
     def encode(self, type, id, advertising_router):
@@ -433,91 +576,124 @@ class OSPFLSRLSAIdentOperator(Operator):
         res = super().encode(type, id, advertising_router)
         return res
 
+    def pack_into(self, buf, offset, type, id, advertising_router):
+        id = socket.inet_aton(id)
+        advertising_router = socket.inet_aton(advertising_router)
+        return super().pack_into(buf, offset, type, id, advertising_router)
+
+
+class OSPFLSRDATA(Record):
+    __slots__ = ('lsa_idents',)
 
-class OSPFLSRDATA():
     def __init__(self, data):
-        self.lsa_idents: List[OSPFLSRLSAIdentDATA] = data[0]
+        self.lsa_idents: List[OSPFLSRLSAIdentDATA] = []
 
 
 class OSPFLSROperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFLSRDATA
 
-    def decode(self, data: bytes) -> OSPFLSRDATA:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
-        res = super().decode(data)
-        res.lsa_idents = []
-        data1 = data
-        self.ident_operators = []
-        while len(data1):
-            operator = OSPFLSRLSAIdentOperator()
-            self.ident_operators.append(operator)
-            _ = operator.decode(data1)
-            res.lsa_idents.append(_)
-            data1 = operator.next_data(data1)
+    def decode(self, data: bytes, offset=0) -> OSPFLSRDATA:  # 为了能够在编写过程中进行代码提示，故使用该容器类，以提供代码提示。
+        res = super().decode(data, offset)
+        operator = OSPFLSRLSAIdentOperator.shared()
+        for offset in range(offset, len(data) - operator.size + 1, operator.size):
+            res.lsa_idents.append(operator.decode(data, offset))
         return res
 
     def encode(self, lsa_idents: List[OSPFLSRLSAIdentDATA]):
-        res = ''.encode()
-        for ident in lsa_idents:
-            operator = OSPFLSRLSAIdentOperator()
-            res += operator.encode(ident.type, ident.id, ident.advertising_router)
-        return res
+        operator = OSPFLSRLSAIdentOperator.shared()
+        return b''.join([operator.encode(ident.type, ident.id, ident.advertising_router) for ident in lsa_idents])
 
 
-class OSPFLSUDATA():
-    def __init__(self):
+LSA_BODY_OPERATORS = {1: OSPFRouterLSAOperator.shared(),
+                      2: OSPFNetworkLSAOperator.shared(),
+                      3: OSPFSummaryLSAOperator.shared(),
+                      4: OSPFSummaryLSAOperator.shared(),
+                      5: OSPFExternalLSAOperator.shared()}
+
+
+class OSPFLazyLSAData():
+    # LSU中的LSA只先解码20字节的LSA头，LSA体保留原始字节，真正需要安装/读取时才解码
+    __slots__ = ('header', 'raw', '_data')
+
+    def __init__(self, header: OSPFLSAHeaderData, raw):
+        self.header = header
+        self.raw = raw
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = LSA_BODY_OPERATORS[self.header.type].decode(self.raw, self.header.length,
+                                                                     OSPFLSAHeaderOperator.shared().size)
+        return self._data
+
+    def gen_packet_header(self):
+        # 确认报文中直接使用收到的LSA头
+        return bytes(self.raw[:OSPFLSAHeaderOperator.shared().size])
+
+    def pack_header_into(self, buf, offset):
+        size = OSPFLSAHeaderOperator.shared().size
+        buf[offset:offset + size] = self.raw[:size]
+        return offset + size
+
+    def __str__(self):
+        return f'LSA type {self.header.type}, id {self.header.id}, advertising_router {self.header.advertising_router}'
+
+
+class OSPFLSUDATA(Record):
+    __slots__ = ('lsa_num', 'lsa_headers', 'lsas')
+
+    def __init__(self, data):
+        self.lsa_num = data[0]
         self.lsa_headers:List[OSPFLSAHeaderData] = []
-        self.lsa_datas = []
+        self.lsas:List[OSPFLazyLSAData] = []
 
 
 class OSPFLSUOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFLSUDATA
         self.fields += [
             ('I', 'lsa_num')
         ]
 
-    def decode(self, data: bytes)->OSPFLSUDATA:
-        res = super().decode(data)
-        res.lsa_headers = []
-        res.lsa_datas = []
-        data = super().next_data(data)
+    def decode(self, data: bytes, offset=0)->OSPFLSUDATA:
+        res = super().decode(data, offset)
+        data = memoryview(data)
+        header_operator = OSPFLSAHeaderOperator.shared()
+        offset += self.size
         for i in range(res.lsa_num):
-            header_operator = OSPFLSAHeaderOperator()
-            header = header_operator.decode(data)
+            header = header_operator.decode(data, offset)
+            if header.length < header_operator.size or offset + header.length > len(data):
+                # 长度错误的LSA之后的内容都无法定位，整个报文作为错误报文丢弃
+                raise Exception("lsa length {} is invalid for {} bytes left".format(header.length, len(data) - offset))
             res.lsa_headers.append(header)
-            data = header_operator.next_data(data)
-            class_map = {1: OSPFRouterLSAOperator,
-                         2: OSPFNetworkLSAOperator,
-                         3: OSPFSummaryLSAOperator,
-                         4: OSPFSummaryLSAOperator,
-                         5: OSPFExternalLSAOperator}
-            operator = class_map[header.type]()
-            res.lsa_datas.append(operator.decode(data, header.length))
-            data = operator.next_data(data)
+            res.lsas.append(OSPFLazyLSAData(header, data[offset:offset + header.length]))
+            offset += header.length
         return res
 
     def encode(self, lsa_num):
         return super().encode(lsa_num)
 
 
-class OSPFLSAckDATA():
-    def __init__(self):
-        self.lsa_headers = []
+class OSPFLSAckDATA(Record):
+    __slots__ = ('lsa_headers',)
+
+    def __init__(self, data):
+        self.lsa_headers: OSPFLSAHeaderColumns = None
 
 
 class OSPFLSAckOperator(Operator):
     def __init__(self):
         super().__init__()
+        self.dataContainer = OSPFLSAckDATA
 
-    def decode(self, data: bytes)->OSPFLSAckDATA:
-        res = super().decode(data)
-        res.lsa_headers = []
-        while len(data):
-            header_operator = OSPFLSAHeaderOperator()
-            header = header_operator.decode(data)
-            res.lsa_headers.append(header)
-            data = header_operator.next_data(data)
+    def decode(self, data: bytes, offset=0)->OSPFLSAckDATA:
+        res = super().decode(data, offset)
+        res.lsa_headers = OSPFLSAHeaderColumns(data, offset,
+                                               (len(data) - offset) // OSPFLSAHeaderOperator.shared().size)
         return res
 
     def encode(self, lsas):
@@ -4,8 +4,39 @@ from tools import *
 from OSPFData import *
 
 
+class LSAFieldList(list):
+    # links/attached_routers使用该列表，内容变化时清空所属LSA缓存的报文
+    def __init__(self, owner, items=()):
+        super().__init__(items)
+        self.owner = owner
+
+    def _changed(self):
+        self.owner.clear_packet_cache()
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        res = method(self, *args)
+        self._changed()
+        return res
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(LSAFieldList, _name, _invalidating(_name))
+
+
 class LSA:
+    # 不影响报文内容的属性，修改时不需要清空缓存
+    NON_WIRE_ATTRS = ('born', '_packet')
+    LIST_ATTRS = ('links', 'attached_routers')
+
     def __init__(self, options, type, id, advertising_router, seq):
+        self._packet: bytearray = None  # 编码好的完整LSA（含校验和），age在发送时再就地写入
         self.born = int(time.time())
         self.options = options
         self.type = type
@@ -16,42 +47,90 @@ class LSA:
     def __str__(self):
         return f'LSA type {self.type}, id {self.id}, advertising_router {self.advertising_router}'
 
+    def __setattr__(self, name, value):
+        if name in self.LIST_ATTRS and not isinstance(value, LSAFieldList):
+            value = LSAFieldList(self, value)
+        object.__setattr__(self, name, value)
+        if name not in self.NON_WIRE_ATTRS:
+            object.__setattr__(self, '_packet', None)
+
+    def clear_packet_cache(self):
+        self._packet = None
+
+    @property
+    def age(self):
+        return int(time.time()) - self.born
+
+    @property
+    def checksum(self):
+        return OSPFLSAHeaderData(OSPFLSAHeaderOperator.shared().codec.unpack_from(self.packet)).checksum
+
+    @property
+    def packet(self) -> bytearray:
+        # 只有内容变化后第一次发送时才重新编码并计算Fletcher校验和
+        packet = self._packet
+        if packet is None:
+            packet = bytearray(len(self))
+            self.encode_into(packet, 0)
+            self._packet = packet
+        return packet
+
     def is_same(self, lsa):
         return self.type == lsa.type and self.id == lsa.id and self.advertising_router == lsa.advertising_router
 
     def __len__(self):
         return 20
 
+    def pack_body_into(self, buf, offset) -> int:
+        logging.error('call original pack_body_into, something wrong!')
+        return offset
+
+    def encode_into(self, buf, offset) -> int:
+        # LSA头和LSA体一次写入buf，之后就地补上Fletcher校验和（校验和不覆盖age字段）
+        lsa_header_operator = OSPFLSAHeaderOperator.shared()
+        body_offset = lsa_header_operator.pack_into(buf, offset,
+                                                    self.age,
+                                                    self.options,
+                                                    self.type,
+                                                    self.id,
+                                                    self.advertising_router,
+                                                    self.seq,
+                                                    0,
+                                                    len(self))
+        end = self.pack_body_into(buf, body_offset)
+        lsa_header_operator.pack_field_into(buf, offset, 'checksum', fletcher16(memoryview(buf)[offset + 2:end]))
+        return end
+
+    def pack_into(self, buf, offset) -> int:
+        # 复制缓存的报文，只就地改写age字段
+        packet = self.packet
+        end = offset + len(packet)
+        buf[offset:end] = packet
+        OSPFLSAHeaderOperator.shared().pack_field_into(buf, offset, 'age', self.age)
+        return end
+
+    def pack_header_into(self, buf, offset) -> int:
+        size = OSPFLSAHeaderOperator.shared().size
+        buf[offset:offset + size] = memoryview(self.packet)[:size]
+        OSPFLSAHeaderOperator.shared().pack_field_into(buf, offset, 'age', self.age)
+        return offset + size
+
+    def gen_packet(self) -> bytearray:
+        buf = bytearray(len(self))
+        self.pack_into(buf, 0)
+        return buf
+
     def gen_packet_body(self) -> bytes:
-        logging.error('call original gen_lsa_packet_body, something wrong!')
-        return ''.encode()
+        return bytes(self.packet[OSPFLSAHeaderOperator.shared().size:])
 
     def gen_packet_header(self):
-        retdic = self.gen_header_dict()
-        lsa = easydict.EasyDict(retdic)
-        lsa_header_operator = OSPFLSAHeaderOperator()
-        _ = lsa_header_operator.encode(age=0,
-                                       options=lsa.options,
-                                       type=lsa.type,
-                                       id=lsa.id,
-                                       advertising_router=lsa.advertising_router,
-                                       seq=lsa.seq,
-                                       checksum=0,
-                                       length=lsa.length)
-        full_data = _ + self.gen_packet_body()
-        checksum = fletcher16(full_data[2:])
-        return lsa_header_operator.encode(age=lsa.age,
-                                          options=lsa.options,
-                                          type=lsa.type,
-                                          id=lsa.id,
-                                          advertising_router=lsa.advertising_router,
-                                          seq=lsa.seq,
-                                          checksum=checksum,
-                                          length=lsa.length)
+        buf = bytearray(OSPFLSAHeaderOperator.shared().size)
+        self.pack_header_into(buf, 0)
+        return bytes(buf)
 
     def gen_header_dict(self):
         retdic = {
-            'age': int(time.time()) - self.born,
+            'age': self.age,
             'options': self.options,
             'type': self.type,
             'id': self.id,
@@ -64,12 +143,19 @@ class LSA:
 
 
 class Router_link():
+    # 不可变：所属LSA缓存了编码好的报文，修改链路只能替换links中的元素（会清空缓存）
+    __slots__ = ('type', 'data', 'id', 'metric', 'interface')
+
     def __init__(self, type, data, id, metric, interface = None):
-        self.type = type
-        self.data = data
-        self.id = id
-        self.metric = metric
-        self.interface = interface
+        object.__setattr__(self, 'type', type)
+        object.__setattr__(self, 'data', data)
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'metric', metric)
+        object.__setattr__(self, 'interface', interface)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Router_link is immutable, replace the link in Router_LSA.links instead of setting {name}')
+
     def __str__(self):
         return f'type: {self.type} \tdata: {self.data} \tmetric: {self.metric} \tid: {self.id}'
 
@@ -116,24 +202,16 @@ class Router_LSA(LSA):
                     res.append(link)
         return res
 
-    def gen_packet_body(self):
-        operator = OSPFRouterLSAOperator()
+    def pack_body_into(self, buf, offset):
         v = 1 if self.V else 0
         e = 1 if self.ASBR else 0
         b = 1 if self.ABR else 0
         options = (v << 2) + (e << 1) + b
-        links = []
+        offset = OSPFRouterLSAOperator.shared().pack_into(buf, offset, options, len(self.links))
+        link_operator = OSPFRouterLinkOperator.shared()
         for link in self.links:
-            links.append(easydict.EasyDict(
-                {
-                    'id': link.id,
-                    'data': link.data,
-                    'type': link.type,
-                    'metric': link.metric,
-                    'toss': []
-                }
-            ))
-        return operator.encode(options, links)
+            offset = link_operator.pack_into(buf, offset, link.id, link.data, link.type, link.metric)
+        return offset
 
     def __len__(self):
         return 24 + len(self.links) * 12
@@ -147,12 +225,33 @@ class Network_LSA(LSA):
     def __len__(self):
         return 24 + len(self.attached_routers)*4
 
-    def gen_packet_body(self):
-        operator = OSPFNetworkLSAOperator()
-        data = operator.encode(self.network_mask, self.attached_routers)
-        return data
+    def pack_body_into(self, buf, offset):
+        offset = OSPFNetworkLSAOperator.shared().pack_into(buf, offset, self.network_mask)
+        attached_operator = OSPFNetworkLSAAttachedOperator.shared()
+        for router in self.attached_routers:
+            offset = attached_operator.pack_into(buf, offset, router)
+        return offset
 
     def __str__(self):
         res = super().__str__()
         res += f'\nnetwork_mask: {self.network_mask}\nattached_routers:{self.attached_routers}'
         return res
+
+
+def decode_lsa(lazy_lsa: OSPFLazyLSAData) -> LSA:
+    # 只有需要安装进LSDB的LSA才会走到这里，此时才解码LSA体并创建LSA对象
+    header = lazy_lsa.header
+    if header.type == 1:
+        lsa_data: OSPFRouterLSADATA = lazy_lsa.data
+        lsa = Router_LSA(header.options, header.id, header.advertising_router, header.seq,
+                         **Router_LSA.options2dict(lsa_data.options))
+        for link in lsa_data.links:
+            lsa.add_link(link.type, link.data, link.id, link.metric)
+        return lsa
+    elif header.type == 2:
+        lsa_data: OSPFNetworkLSADATA = lazy_lsa.data
+        return Network_LSA(header.options, header.id, header.advertising_router, header.seq,
+                           lsa_data.network_mask,
+                           lsa_data.attached_routers)
+    logging.warning(f'decoding lsa of type {header.type} not yet support')
+    return None
@@ -1,21 +1,31 @@
 import sender
+from flooding import lsu_packer
 from OSPFRole.interface import BoardcastInterface
 from calculator import *
 
 
+LSA_SEQ_UNKNOWN = -(2 ** 31) - 1  # 比任何合法LSA序号都小，表示LSDB中没有该LSA
+
+
 class Area:
     def __init__(self, id="0.0.0.0", router_id='1.1.1.1', as_external_lsa=[]):
         self.id = id  # Area Id
         self.router_id = router_id
-        self.router_lsa: List[Router_LSA] = [] # LSDB中的RouterLSA
-        self.network_lsa: List[Network_LSA] = [] # LSDB中的NetworkLSA
-        self.summary_lsa = [] # LSDB中的SummaryLSA
+        self.init_lsdb()
         self.as_external_lsa = as_external_lsa # LSDB中的asExternalLSA
         self.TransitCapability = False
         self.ExternalRouterCapability = True
         self.stabDefaultCost = 10
         self.interfaces: List[BoardcastInterface] = []
         self.lsa_seq = -(2 ** 31) + 1
+        self._lsdb_seq_index = None  # (type, id, advertising_router) -> seq，LSDB变化时清空
+        self._lsdb_index = None  # (type, id, advertising_router) -> LSA，LSDB变化时清空
+        self.route_scheduler = None  # 设置后LSDB变化只提交路由计算请求，由I/O运行时的流水线异步计算并写路由表
+
+    def init_lsdb(self):
+        self.router_lsa: List[Router_LSA] = [] # LSDB中的RouterLSA
+        self.network_lsa: List[Network_LSA] = [] # LSDB中的NetworkLSA
+        self.summary_lsa = [] # LSDB中的SummaryLSA
 
     def gen_lsa_seq(self):
         ret = self.lsa_seq
@@ -29,11 +39,33 @@ class Area:
         logging.info(f'[area {self.id}]: {str}')
 
     def get_lsa_by_ident(self, ident):
-        search_range = self.network_lsa + self.summary_lsa + self.router_lsa
-        for lsa in search_range:
-            if lsa.type == ident.type and lsa.id == ident.id and lsa.advertising_router == ident.advertising_router:
-                return lsa
-        return None
+        # LSR中的每个请求都查一次，用索引代替线性查找
+        return self.lsdb_index().get(lsa_key(ident))
+
+    def lsdb_index(self):
+        index = self._lsdb_index
+        if index is None:
+            index = {lsa_key(lsa): lsa for lsa in self.network_lsa + self.summary_lsa + self.router_lsa}
+            self._lsdb_index = index
+        return index
+
+    def lsdb_seq_index(self):
+        index = self._lsdb_seq_index
+        if index is None:
+            index = {lsa_key(lsa): lsa.seq for lsa in self.router_lsa + self.network_lsa + self.summary_lsa}
+            self._lsdb_seq_index = index
+        return index
+
+    def is_newer_lsa(self, header):
+        # 只根据LSA头与LSDB中的副本比较，不需要解码LSA体
+        seq = self.lsdb_seq_index().get(lsa_key(header))
+        return seq is None or header.seq > seq
+
+    def newer_lsa_headers(self, lsa_headers: OSPFLSAHeaderColumns) -> List[OSPFLSAHeaderData]:
+        # DD中的整组LSA头与LSDB一次性比较，只解码比本地副本更新的LSA头
+        index = self.lsdb_seq_index()
+        known_seqs = [index.get(key, LSA_SEQ_UNKNOWN) for key in lsa_headers.keys()]
+        return lsa_headers.headers(lsa_headers.newer_than(known_seqs))
 
     @property
     def address_range(self):
@@ -121,11 +153,12 @@ class Area:
                 continue
             if interface.STATE <= OSPFInterfaceState.WAITING:
                 continue
-            sender.send_lsa_to(interface.ip,
-                               ALLSPFRouterIP if (interface.STATE == OSPFInterfaceState.DR or
-                                                  interface.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP,
-                               self.router_id,self.id,
-                               lsa)
+            # 同一接口上短时间内泛洪的LSA合并为尽量少的LSU
+            lsu_packer.queue(interface.ip,
+                             ALLSPFRouterIP if (interface.STATE == OSPFInterfaceState.DR or
+                                                interface.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP,
+                             self.router_id, self.id, interface.mtu,
+                             lsa)
 
     def add_lsa_to_area(self, lsa: LSA, source_interface):
         if lsa.type == 1:
@@ -140,9 +173,16 @@ class Area:
         else:
             self.as_external_lsa = [x for x in self.as_external_lsa if not x.is_same(lsa)]
             self.as_external_lsa.append(lsa)
+        self._lsdb_seq_index = None
+        self._lsdb_index = None
         self.flooding_lsa(lsa, source_interface)
-        route_items = cal_path(self.router_lsa, self.network_lsa, self.get_mine_router_lsa())
-        refresh_routing_table(route_items)
+        if self.route_scheduler is not None:
+            self.route_scheduler(self)
+        else:
+            refresh_routing_table(self.calculate_routes())
+
+    def calculate_routes(self) -> List[Route_item]:
+        return cal_path(self.router_lsa, self.network_lsa, self.get_mine_router_lsa())
 
     def lsdb_text(self):
         print(f'|LSDB----Area {self.id}')
@@ -1,15 +1,22 @@
-import functools
 from OSPFRole.neighbour import Neighbor
 from IPData import IPHeaderData
-from sender import send_hello_packet, send_lsack_packet
+from sender import build_hello_packet, send_template_packet
+from validator import PacketValidator
+from policer import Policer
+from flooding import DelayedAcks
+from runtime import Timer
 from OSPFRole.LSA import *
 
 
 class BoardcastInterface:
+    HELLO_ATTRS = frozenset(('dr', 'bdr', 'router_priority', 'neighbours', 'ip', 'mask'))  # 决定hello报文内容的可变字段
+
     def __init__(self, interface_name, area, hello_interval: int = 10, router_dead_interval=40,
                  inf_trans_delay: int = 1, router_priority: int = 1, cost: int = 1, retrans_interval: int = 5,
-                 auth_type: int = OSPFAuthType.NULL, auth_key: str = ''):
+                 auth_type: int = OSPFAuthType.NULL, auth_key: str = '', ip=None, mask=None, mtu=None):
+        # ip、mask与mtu为None时从网卡读取；离线回放时直接指定
         self.type = OSPFInterfaceType.BOARDCAST
+        self.hello_template = None  # 预先构造的hello报文，第一次发送时构造
         self.area = area
         self.timer = 0
         self.hello_interval = hello_interval
@@ -20,19 +27,26 @@ class BoardcastInterface:
         self.retrans_interval = retrans_interval
         self.auth_type = auth_type
         self.auth_key = auth_key
+        self.validator = PacketValidator(area.id, auth_type)
+        self.policer = Policer()
+        self.delayed_acks = DelayedAcks(self)
         self.neighbours: List[Neighbor] = []
         self.dr = ''
         self.bdr = ''
         self.STATE = OSPFInterfaceState.DOWN
-        self.ip = get_ip_address(interface_name)
-        self.mask = get_netmask(interface_name)
+        self.ip = ip if ip is not None else get_ip_address(interface_name)
+        self.mask = mask if mask is not None else get_netmask(interface_name)
+        self.mtu = mtu if mtu is not None else get_mtu(interface_name)
         self.interface_name = interface_name
 
+    def __setattr__(self, name, value):
+        if name in self.HELLO_ATTRS:
+            # 这些字段变化后丢弃预先构造的hello报文，下次发送时重新构造
+            object.__setattr__(self, 'hello_template', None)
+        object.__setattr__(self, name, value)
+
     def get_net_address(self):
-        ip = ip_to_list(self.ip)
-        mask = ip_to_list(self.mask)
-        net_add = [ip[i] & mask[i] for i in range(4)]
-        return list_to_ip(net_add)
+        return net_address(self.ip, self.mask)
 
     def transform_neighbour_id_to_ip(self, router_id):
         if router_id == self.area.router_id:
@@ -42,6 +56,13 @@ class BoardcastInterface:
                 return nei.ip_address
         return '0.0.0.0'
 
+    def is_known_neighbour(self, router_ip):
+        # 至少达到2-Way的邻居（双向通信已经建立），伪造的源地址无法达到该状态
+        for nei in self.neighbours:
+            if nei.ip_address == router_ip:
+                return nei.STATE >= OSPFNeighbourState.TWOWAY
+        return False
+
     def transform_neighbour_ip_to_id(self, router_ip):
         if router_ip == self.ip:
             return self.area.router_id
@@ -57,28 +78,35 @@ class BoardcastInterface:
         logging.info(f'[interface {self.interface_name}]: {str}')
 
     def create_hello_timer(self):
-        self.hello_timer = threading.Timer(self.hello_interval, self.hello_timer_callback)
+        self.hello_timer = Timer(self.hello_interval, self.hello_timer_callback)
         self.hello_timer.start()
         self.debug("hello timer created")
 
+    def build_hello_template(self):
+        return build_hello_packet(source_id=self.ip,
+                                  destination_ip=ALLSPFRouterIP,
+                                  router_id=self.area.router_id,
+                                  area_id=self.area.id,
+                                  network_mask=self.mask,
+                                  hello_interval=self.hello_interval,
+                                  options=gen_options(1, 0, 0, 0, 0),
+                                  priority=self.router_priority,
+                                  dead_interval=self.router_dead_interval,
+                                  designated_router=self.transform_neighbour_id_to_ip(self.dr),
+                                  backup_designated_router=self.transform_neighbour_id_to_ip(self.bdr),
+                                  neighbours=[nei.router_id for nei in self.neighbours
+                                              if nei.STATE >= OSPFNeighbourState.INIT])
+
     def hello_timer_callback(self):
         self.debug("hello_timer_callback, send hello packet")
-        send_hello_packet(source_id=self.ip,
-                          destination_ip=ALLSPFRouterIP,
-                          router_id=self.area.router_id,
-                          area_id=self.area.id,
-                          network_mask=self.mask,
-                          hello_interval=self.hello_interval,
-                          options=gen_options(1, 0, 0, 0, 0),
-                          priority=self.router_priority,
-                          dead_interval=self.router_dead_interval,
-                          designated_router=self.transform_neighbour_id_to_ip(self.dr),
-                          backup_designated_router=self.transform_neighbour_id_to_ip(self.bdr),
-                          neighbours=[nei.router_id for nei in self.neighbours])
+        # DR/BDR、优先级与邻居不变时，直接发送上次构造的hello报文
+        if self.hello_template is None:
+            self.hello_template = self.build_hello_template()
+        send_template_packet(self.hello_template, self.ip, ALLSPFRouterIP)
         self.create_hello_timer()
 
     def create_wait_timer(self):
-        self.wait_timer = threading.Timer(self.router_dead_interval, self.wait_timer_callback)
+        self.wait_timer = Timer(self.router_dead_interval, self.wait_timer_callback)
         self.wait_timer.start()
         logging.debug('wait timer created')
 
@@ -126,15 +154,12 @@ class BoardcastInterface:
                    f"cur DR is {ori_dr}, cur BDR is {ori_bdr}")
 
         # select BDR:
-        def my_cmp(a, b):
-            if a.priority > b.priority:
-                return 1
-            if b.priority > a.priority:
-                return -1
-            return compare_router_id_bigger(a.router_id, b.router_id)
+        def my_key(nei):
+            # 先比较优先级，再按整数比较router id
+            return nei.priority, ip_to_int(nei.router_id)
 
         bdr_list = [nei for nei in two_way_neighbours if nei.dr != nei.ip_address]
-        bdr_list.sort(key=functools.cmp_to_key(my_cmp), reverse=True)
+        bdr_list.sort(key=my_key, reverse=True)
         self.debug(f'bdr list is {[x.router_id for x in bdr_list]}')
         selected_bdr = None
         for bdr_nei in bdr_list:
@@ -146,7 +171,7 @@ class BoardcastInterface:
         self.debug(f'select bdr is {selected_bdr.router_id if selected_bdr else '0.0.0.0'}')
         # select DR
         dr_list = [nei for nei in two_way_neighbours if nei.dr == nei.ip_address]
-        dr_list.sort(key=functools.cmp_to_key(my_cmp), reverse=True)
+        dr_list.sort(key=my_key, reverse=True)
         self.debug(f'dr list is {[x.router_id for x in dr_list]}')
         selected_dr = None
         if len(dr_list) > 0:
@@ -158,7 +183,7 @@ class BoardcastInterface:
             # 自身成为了DR，重新选举BDR，以避免自己被选举成BDR
             bdr_list = [nei for nei in two_way_neighbours if nei.dr != nei.ip_address and nei != phantom_nei]
             self.debug(f"start re-elevating BDR, list is {[nei.router_id for nei in bdr_list]}")
-            bdr_list.sort(key=functools.cmp_to_key(my_cmp), reverse=True)
+            bdr_list.sort(key=my_key, reverse=True)
             selected_bdr = None
             for bdr_nei in bdr_list:
                 if bdr_nei.bdr == bdr_nei.ip_address:
@@ -232,6 +257,7 @@ class BoardcastInterface:
                                      options=hello_packet.options)
             new_neighbour.priority = hello_packet.router_priority
             self.neighbours.append(new_neighbour)
+            self.hello_template = None
             matched_neighbour = new_neighbour
         self.debug(f'save ori priority {matched_neighbour.priority} of neighbour')
         ori_priority = matched_neighbour.priority
@@ -311,6 +337,11 @@ class BoardcastInterface:
 
 
 
+    def receive_lsu_headers(self, ip_header: IPHeaderData, lsa_headers: List[OSPFLSAHeaderData]):
+        for nei in self.neighbours:
+            if ip_header.sourceIP == nei.ip_address:
+                nei.receive_lsu_headers(lsa_headers)
+
     def gen_network_lsa(self):
         if not self.STATE == OSPFInterfaceState.DR:
             self.info('ERROR!')
@@ -329,12 +360,12 @@ class BoardcastInterface:
                           attached_routers)
         return lsa
 
-    def send_ack_for_lsa(self, lsa:LSA):
-        self.info(f'sending lsack for lsa: {lsa}')
-        send_lsack_packet(self.ip,
-                          ALLSPFRouterIP if (self.STATE == OSPFInterfaceState.DR or
-                                                      self.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP,
-                          self.area.router_id,
-                          self.area.id,
-                          [lsa]
-                          )
+    def send_ack_for_lsa(self, lsa: OSPFLazyLSAData):
+        # 延迟确认：与同一时间段内收到的其他LSA一起用一个LSAck确认
+        self.debug(f'queue delayed lsack for lsa: {lsa}')
+        self.delayed_acks.add(lsa)
+
+    def send_direct_ack(self, lsas: List[OSPFLazyLSAData], neighbour_ip):
+        # 重复的LSA立即直接发给该邻居确认，避免邻居继续重传
+        self.debug(f'sending direct lsack for {len(lsas)} lsas to {neighbour_ip}')
+        self.delayed_acks.direct(lsas, neighbour_ip)
@@ -1,11 +1,20 @@
+import collections
+import itertools
 import random
-from threading import Timer
+from runtime import Timer
+from typing import Union, Iterator, Dict
 from IPData import *
 from sender import *
+from flooding import lsu_packer
 from OSPFRole.LSA import *
 
 
+LSR_WINDOW = 4  # 同时等待应答的LSR报文数（每个报文按MTU装满请求）
+
+
 class Neighbor():
+    HELLO_ATTRS = frozenset(('STATE', 'router_id'))  # 决定该邻居是否以及如何出现在接口hello报文中的字段
+
     def __init__(self, router_id, ip_address, interface, options, is_master: bool = False):
         self.router_id = router_id
         self.ip_address = ip_address
@@ -19,13 +28,24 @@ class Neighbor():
         self.dr = ''
         self.bdr = ''
         self.sending_lsas = {}
-        self.request_needed_lsas: List[OSPFLSAHeaderData] = []
-        self.database_summary_list: List[LSA] = []
+        # Link state request list：(type, id, advertising_router) -> LSA头，按加入的顺序请求
+        self.request_needed_lsas: Dict[tuple, OSPFLSAHeaderData] = {}
+        self.lsr_unsent = collections.deque()  # 还没有发送过LSR的key
+        self.lsr_outstanding = set()  # 已经请求、还没有收到的key
+        self.lsr_timer: Timer = None
+        self.database_summary_list: Iterator[LSA] = iter(())
+        self.database_summary_remaining = 0
         self.inactive_timer: Timer = None
         self.interface = interface
         self.priority = -1
         self.retrans_timer: Timer = None
 
+    def __setattr__(self, name, value):
+        if name in self.HELLO_ATTRS and self.__dict__.get('interface') is not None:
+            # 邻居进入/离开Init以上的状态（如Inactivity Timer超时）后，接口的hello报文需要重新构造
+            self.interface.hello_template = None
+        object.__setattr__(self, name, value)
+
     def debug(self, str):
         logging.debug(f'[neighbour {self.router_id}]: {str}')
 
@@ -45,7 +65,12 @@ class Neighbor():
         self.dr = ''
         self.bdr = ''
         self.sending_lsas = {}  # lsa, timer
-        self.request_needed_lsas = []
+        self.request_needed_lsas = {}
+        self.lsr_unsent = collections.deque()
+        self.lsr_outstanding = set()
+        if self.lsr_timer:
+            self.lsr_timer.cancel()
+            self.lsr_timer = None
         self.inactive_timer: Timer = None
 
     def kill_neighbour(self, interface):
@@ -66,7 +91,7 @@ class Neighbor():
     def resend_exstart_dd_callback(self):
         self.debug(f'resend dd callback! resending DD packet to neighbour, interval {self.interface.retrans_interval}')
         send_dd_packet(self.interface.ip, self.ip_address, self.interface.area.router_id,
-                       self.interface.area.id, 1500, gen_options(1, 0, 0, 0, 0),
+                       self.interface.area.id, self.interface.mtu, gen_options(1, 0, 0, 0, 0),
                        gen_DD_options(True, True, True), self.dd_seq, [])
         self.retrans_timer = Timer(self.interface.retrans_interval, self.resend_exstart_dd_callback)
         self.retrans_timer.start()
@@ -140,11 +165,13 @@ class Neighbor():
         self.info('event negotiation down, start listing all area lsas')
         self.retrans_timer.cancel()
         self.debug('retrans timer cancel')
-        self.database_summary_list = []
-        self.database_summary_list += self.interface.area.router_lsa
-        self.database_summary_list += self.interface.area.network_lsa
-        self.database_summary_list += self.interface.area.summary_lsa
-        self.info(f'self database_summary_list len is {len(self.database_summary_list)}')
+        # 取当前LSDB的快照：Exchange过程中LSDB列表可能被原地修改（如fresh_router_lsa），
+        # 剩余数量必须与迭代器实际产生的LSA一致，否则M位会提前清除或多发一个空的DD
+        area = self.interface.area
+        summary = tuple(itertools.chain(area.router_lsa, area.network_lsa, area.summary_lsa))
+        self.database_summary_list = iter(summary)
+        self.database_summary_remaining = len(summary)
+        self.info(f'self database_summary_list len is {self.database_summary_remaining}')
         self.info('self into Exchange')
         self.STATE = OSPFNeighbourState.EXCHANGE
 
@@ -176,30 +203,105 @@ class Neighbor():
             if len(self.request_needed_lsas):
                 self.info('self into LOADING')
                 self.STATE = OSPFNeighbourState.LOADING
-                send_lsr_packet(self.interface.ip, self.ip_address,
-                                self.interface.area.router_id,
-                                self.interface.area.id,
-                                self.request_needed_lsas
-                                )
+                self.send_lsr_window()
                 self.info('sending lsr to neighbour.')
             else:
-                self.info('self into FULL')
-                self.STATE = OSPFNeighbourState.FULL
+                self.event_loading_done()
+
+    def event_loading_done(self):
+        self.STATE = OSPFNeighbourState.FULL
+        self.info('self into FULL, loading done. trigger flash area lsa')
+        self.interface.area.fresh_router_lsa()
+        self.interface.flesh_network_lsa()
+
+    def add_requests(self, lsa_headers):
+        # 只请求比本地LSDB副本更新的LSA；同一个LSA在请求列表中只出现一次，保留序号更大的头
+        for lsa_header in self.interface.area.newer_lsa_headers(lsa_headers):
+            key = lsa_key(lsa_header)
+            known = self.request_needed_lsas.get(key)
+            if known is None:
+                self.lsr_unsent.append(key)
+            elif known.seq >= lsa_header.seq:
+                continue
+            self.request_needed_lsas[key] = lsa_header
+            self.debug(f'adding wait requesting lsa: {lsa_header.type} {lsa_header.id} {lsa_header.advertising_router}')
+
+    def lsr_capacity(self):
+        return max(1, (self.interface.mtu - OSPF_BODY_OFFSET) // OSPFLSRLSAIdentOperator.shared().size)
+
+    def send_lsr_window(self):
+        # 滑动窗口：最多LSR_WINDOW个报文的请求未收到应答，收到一半以上后继续请求
+        budget = LSR_WINDOW * self.lsr_capacity() - len(self.lsr_outstanding)
+        keys = []
+        while self.lsr_unsent and len(keys) < budget:
+            key = self.lsr_unsent.popleft()
+            if key in self.request_needed_lsas and key not in self.lsr_outstanding:  # 已经通过泛洪收到的不再请求
+                keys.append(key)
+        if not keys:
+            return
+        self.lsr_outstanding.update(keys)
+        self.send_lsr_keys(keys)
+        self.create_lsr_timer()
+
+    def send_lsr_keys(self, keys):
+        capacity = self.lsr_capacity()
+        for start in range(0, len(keys), capacity):
+            send_lsr_packet(self.interface.ip, self.ip_address,
+                            self.interface.area.router_id,
+                            self.interface.area.id,
+                            [self.request_needed_lsas[key] for key in keys[start:start + capacity]])
+
+    def create_lsr_timer(self):
+        if self.lsr_timer:
+            self.lsr_timer.cancel()
+        self.lsr_timer = Timer(self.interface.retrans_interval, self.lsr_resend_callback)
+        self.lsr_timer.start()
+
+    def lsr_resend_callback(self):
+        self.lsr_timer = None
+        if self.STATE != OSPFNeighbourState.LOADING or not self.lsr_outstanding:
+            return
+        self.debug(f'resending lsr for {len(self.lsr_outstanding)} lsas')
+        self.send_lsr_keys([key for key in self.request_needed_lsas if key in self.lsr_outstanding])
+        self.create_lsr_timer()
+
+    def receive_lsu_headers(self, lsa_headers):
+        # 收到的LSA（无论是LSR的应答还是泛洪）与请求列表中的实例相同或更新时，从列表中删除
+        if not self.request_needed_lsas:
+            return
+        for lsa_header in lsa_headers:
+            key = lsa_key(lsa_header)
+            requested = self.request_needed_lsas.get(key)
+            if requested is not None and lsa_header.seq >= requested.seq:
+                del self.request_needed_lsas[key]
+                self.lsr_outstanding.discard(key)
+        if self.STATE != OSPFNeighbourState.LOADING:
+            return
+        if not self.request_needed_lsas:
+            if self.lsr_timer:
+                self.lsr_timer.cancel()
+                self.lsr_timer = None
+            self.event_loading_done()
+        elif len(self.lsr_outstanding) <= LSR_WINDOW * self.lsr_capacity() // 2:
+            self.send_lsr_window()
+
+    def dd_capacity(self):
+        header_size = OSPFLSAHeaderOperator.shared().size
+        return max(1, (self.interface.mtu - OSPF_BODY_OFFSET - OSPFDDOperator.shared().size) // header_size)
 
     def send_dd_in_exchange(self):
         self.info('sending dd in exchange')
         self.retrans_timer.cancel()
         self.debug('retrans timer cancel')
-        lsas_to_send = []
-        if len(self.database_summary_list):
-            lsas_to_send.append(self.database_summary_list[-1])
-            self.database_summary_list = self.database_summary_list[:-1]
+        # 每个DD报文装入接口MTU允许的最多LSA头
+        lsas_to_send = list(itertools.islice(self.database_summary_list, self.dd_capacity()))
+        self.database_summary_remaining -= len(lsas_to_send)
         self.resend_dd_callback(self.interface.ip, self.ip_address, self.interface.area.router_id,
-                                self.interface.area.id, 1500,
+                                self.interface.area.id, self.interface.mtu,
                                 gen_options(1, 0, 0, 0, 0),
                                 gen_DD_options(
                                     False,
-                                    True if len(self.database_summary_list) > 0 else False,
+                                    True if self.database_summary_remaining > 0 else False,
                                     False if self.isMaster else True
                                 ), self.dd_seq, lsas_to_send)
 
@@ -213,6 +315,12 @@ class Neighbor():
                 self.STATE == OSPFNeighbourState.TWOWAY:
             self.info('self State ignore this dd packet')
             return
+        if (self.STATE == OSPFNeighbourState.EXSTART or self.STATE == OSPFNeighbourState.EXCHANGE) and \
+                dd_data.interface_mtu > self.interface.mtu:
+            # RFC 2328 10.6：数据库交换过程中邻居的MTU大于本接口时拒绝DD，否则之后的LSU可能无法收到
+            self.interface.validator.reject(OSPFRejectReason.MTU_MISMATCH,
+                                            f'{dd_data.interface_mtu} > {self.interface.mtu}')
+            return
         if self.STATE == OSPFNeighbourState.INIT:
             self.event_two_way_received()
         elif self.STATE == OSPFNeighbourState.EXSTART:
@@ -227,7 +335,7 @@ class Neighbor():
                 self.info('this neighbour is Master')
                 # should send dd packet
                 send_dd_packet(self.interface.ip, self.ip_address, self.interface.area.router_id,
-                               self.interface.area.id, 1500, gen_options(1, 0, 0, 0, 0),
+                               self.interface.area.id, self.interface.mtu, gen_options(1, 0, 0, 0, 0),
                                gen_DD_options(False, True, False), self.dd_seq, [])
                 self.event_negotiation_done()
             elif (self.receive_dd_I == 0 and self.receive_dd_MS == 0 and dd_data.DD_seq == self.dd_seq
@@ -237,13 +345,7 @@ class Neighbor():
                 self.event_negotiation_done()
                 self.debug(f'checking lsa headers (numbers: {len(lsa_headers)})')
 
-                now_lsa_id = set([header.id for header in self.request_needed_lsas])
-
-                self.debug(f'now wait requesting lsa list is {now_lsa_id}')
-                for lsa_header in lsa_headers:
-                    if lsa_header.id not in now_lsa_id:
-                        self.request_needed_lsas.append(lsa_header)
-                        self.debug(f'adding wait requesting lsa with id: {lsa_header.id}')
+                self.add_requests(lsa_headers)
                 self.dd_seq += 1
                 self.send_dd_in_exchange()
         elif self.STATE == OSPFNeighbourState.EXCHANGE:
@@ -266,24 +368,20 @@ class Neighbor():
                 return
             self.debug(f'checking lsa headers (numbers: {len(lsa_headers)})')
 
-            now_lsa_id = set([header.id for header in self.request_needed_lsas])
             self.retrans_timer.cancel()
-            self.debug(f'now wait requesting lsa list is {now_lsa_id}')
-            self.debug(f'now summary list is {self.database_summary_list}')
-            for lsa_header in lsa_headers:
-                if lsa_header.id not in now_lsa_id:
-                    self.request_needed_lsas.append(lsa_header)
-                    self.debug(f'adding wait requesting lsa with id: {lsa_header.id}')
+            self.debug(f'now wait requesting {len(self.request_needed_lsas)} lsas')
+            self.debug(f'now summary list has {self.database_summary_remaining} lsas left')
+            self.add_requests(lsa_headers)
             if not self.isMaster:
                 self.dd_seq += 1
-                if len(self.database_summary_list) == 0 and dd_data.DD_options & OSPFDDOptionMask.M == 0:
+                if self.database_summary_remaining == 0 and dd_data.DD_options & OSPFDDOptionMask.M == 0:
                     self.event_exchange_done()
                 else:
                     self.send_dd_in_exchange()
             else:
                 self.dd_seq = dd_data.DD_seq
                 self.send_dd_in_exchange()
-                if len(self.database_summary_list) == 0 and dd_data.DD_options & OSPFDDOptionMask.M == 0:
+                if self.database_summary_remaining == 0 and dd_data.DD_options & OSPFDDOptionMask.M == 0:
                     self.event_exchange_done()
             self.debug(f'self seq now is {self.dd_seq}')
         else:
@@ -312,42 +410,39 @@ class Neighbor():
     def lsa_resend_callback(self, lsa):
         # send lsu with lsa
         self.info(f'resending lsa: {lsa}')
-        send_lsa_to(source_ip=self.interface.ip,
-                    destination_ip=ALLSPFRouterIP if (self.interface.STATE == OSPFInterfaceState.DR or
-                                                      self.interface.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP,
-                    # destination_ip=self.ip_address,
-                    router_id=self.interface.area.router_id,
-                    area_id=self.interface.area.id,
-                    lsa=lsa
-                    )
+        # 与同时到期的其他LSA一起打包发送
+        lsu_packer.queue(source_ip=self.interface.ip,
+                         destination_ip=ALLSPFRouterIP if (self.interface.STATE == OSPFInterfaceState.DR or
+                                                           self.interface.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP,
+                         # destination_ip=self.ip_address,
+                         router_id=self.interface.area.router_id,
+                         area_id=self.interface.area.id,
+                         mtu=self.interface.mtu,
+                         lsa=lsa
+                         )
+        if (timer := self.sending_lsas.get(lsa)) is not None:
+            timer.cancel()  # 重复请求同一个LSA时只保留一个重传定时器
         self.sending_lsas[lsa] = Timer(self.interface.retrans_interval, self.lsa_resend_callback, args=[lsa])
         self.sending_lsas[lsa].start()
 
     def receive_lsr_packet(self, area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
                            lsr_data: OSPFLSRDATA):
+        # 应答LSR中的每一个请求；这些LSA在同一个打包窗口内，由lsu_packer按MTU装进尽量少的LSU
         for ident in lsr_data.lsa_idents:
             if (find_res := self.interface.area.get_lsa_by_ident(ident)):
                 self.debug(f'sending lsu for {find_res}')
                 self.lsa_resend_callback(find_res)
-                return
             else:
                 self.event_bad_ls_req()
 
     def receive_lsack_packet(self, area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
-                             lsa_headers: List[OSPFLSAHeaderData]):
+                             lsa_headers: Union[OSPFLSAHeaderColumns, List[OSPFLSAHeaderData]]):
         if len(self.sending_lsas) == 0:
             return
-        for lsa_head in lsa_headers:
-            orikeys = [x for x in self.sending_lsas]
-            for lsa in orikeys:
-                if lsa.type == lsa_head.type and lsa.advertising_router == lsa_head.advertising_router and \
-                        lsa.id == lsa_head.id:
-                    self.sending_lsas[lsa].cancel()
-                    del self.sending_lsas[lsa]
-                    self.debug(f'receiving ack of lsa: {lsa}, cancel retrans timer')
-                    break
-        if len(self.sending_lsas) == 0 and self.STATE == OSPFNeighbourState.LOADING:
-            self.STATE = OSPFNeighbourState.FULL
-            self.info('self into FULL, loading done. trigger flash area lsa')
-            self.interface.area.fresh_router_lsa()
-            self.interface.flesh_network_lsa()
+        acked = set(lsa_header_keys(lsa_headers))
+        orikeys = [x for x in self.sending_lsas]
+        for lsa in orikeys:
+            if lsa_key(lsa) in acked:
+                self.sending_lsas[lsa].cancel()
+                del self.sending_lsas[lsa]
+                self.debug(f'receiving ack of lsa: {lsa}, cancel retrans timer')
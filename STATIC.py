@@ -31,6 +31,21 @@ class OSPFAuthType():
     PASSWORD = 2
 
 
+class OSPFRejectReason():  # 报文/LSA在进入状态机之前被丢弃的原因，用作计数的key
+    TRUNCATED = 'truncated'
+    BAD_VERSION = 'bad_version'
+    BAD_TYPE = 'bad_type'
+    BAD_LENGTH = 'bad_length'
+    AREA_MISMATCH = 'area_mismatch'
+    AUTH_MISMATCH = 'auth_mismatch'
+    BAD_CHECKSUM = 'bad_checksum'
+    MALFORMED = 'malformed'
+    BAD_LSA_TYPE = 'bad_lsa_type'
+    BAD_LSA_CHECKSUM = 'bad_lsa_checksum'
+    POLICED = 'policed'
+    MTU_MISMATCH = 'mtu_mismatch'
+
+
 class IPPriority():
     NetworkControl = 0b110_00000
 
@@ -73,5 +88,5 @@ identification = 12345
 
 def get_identification() -> int:
     global identification
-    identification += 1
+    identification = (identification + 1) & 0xffff  # IP头中的标识只有16位
     return identification
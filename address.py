@@ -0,0 +1,35 @@
+import functools
+import socket
+
+# 路由器ID、掩码和地址在LSDB、配置和路由表里仍然以点分十进制字符串保存，
+# 掩码/前缀运算统一转换成32位整数完成。转换结果按字符串缓存，同一个地址只解析一次。
+ADDRESS_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def ip_to_int(ip: str) -> int:
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def int_to_ip(value: int) -> str:
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def bytes_to_ip(data: bytes) -> str:
+    # 解码报文时使用：同一个地址总是返回同一个字符串对象，后续按地址查字典时不需要重复计算hash
+    return socket.inet_ntoa(data)
+
+
+@functools.lru_cache(maxsize=64)
+def mask_len(mask: str) -> int:
+    return bin(ip_to_int(mask)).count('1')
+
+
+def net_address(ip: str, mask: str) -> str:
+    return int_to_ip(ip_to_int(ip) & ip_to_int(mask))
+
+
+def in_net(ip: str, net: str, mask: str) -> bool:
+    return (ip_to_int(ip) ^ ip_to_int(net)) & ip_to_int(mask) == 0
@@ -0,0 +1,257 @@
+import argparse
+import gc
+import json
+import os
+import statistics
+import struct
+import sys
+import time
+import tracemalloc
+
+from OSPFRole.LSA import *
+from sender import build_hello_packet, build_dd_packet, build_lsr_packet, build_lsu_packet, build_lsack_packet, \
+    IP_HEADER_LEN, SendSocketPool
+from IPData import IPHeaderOperator
+
+# 编解码吞吐基准：不需要网卡和root权限，用sender.py的构造函数生成报文语料，
+# 再按receive_loop的方式解码，输出每种报文的packets/s、bytes/s与内存分配情况。
+# 结果可以保存为基线，之后的运行与基线比较，吞吐下降超过容差时返回非0。
+# 基线中保存的是相对于同一次运行中参考工作量的倍数，不同机器、不同负载下的结果可以比较。
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+MIN_BENCH_SECONDS = 0.05  # 每次测量的最短时间，很快的用例会重复足够多次
+BENCH_SAMPLES = 9  # 每个用例测量的次数，取中位数
+
+SOURCE_IP = '10.0.0.2'
+DESTINATION_IP = '224.0.0.5'
+ROUTER_ID = '1.1.1.1'
+AREA_ID = '0.0.0.0'
+REFERENCE_DATA = bytes(range(256)) * 8
+REFERENCE_STRUCT = struct.Struct('!I')
+
+
+def router_id_of(i):
+    return f'10.{(i >> 8) & 0xff}.{i & 0xff}.1'
+
+
+def make_router_lsa(i, link_num):
+    lsa = Router_LSA(gen_options(1, 0, 0, 0, 0), router_id_of(i), router_id_of(i), -2147483648 + 1 + i,
+                     False, False, False)
+    for k in range(link_num):
+        lsa.add_stub_network(f'172.{(k >> 8) & 0xff}.{k & 0xff}.0', '255.255.255.0', k + 1, None)
+    return lsa
+
+
+def make_lsas(num, link_num=20):
+    return [make_router_lsa(i, link_num) for i in range(num)]
+
+
+def build_corpus():
+    # (名称, 构造报文的函数)；构造函数每次调用都完整地生成一个可以直接发送的报文
+    corpus = []
+    for neighbour_num in (0, 50, 500):
+        neighbours = [router_id_of(i) for i in range(neighbour_num)]
+        corpus.append((f'hello-{neighbour_num}nei', lambda neighbours=neighbours: build_hello_packet(
+            SOURCE_IP, DESTINATION_IP, ROUTER_ID, AREA_ID, '255.255.255.0', 10, 2, 1, 40, '10.0.0.1', '10.0.0.2',
+            neighbours)))
+    for lsa_num in (0, 20, 60):
+        lsas = make_lsas(lsa_num)
+        corpus.append((f'dd-{lsa_num}hdr', lambda lsas=lsas: build_dd_packet(
+            SOURCE_IP, DESTINATION_IP, ROUTER_ID, AREA_ID, 1500, 2, 7, 12345, lsas)))
+    for lsa_num in (1, 100):
+        lsas = make_lsas(lsa_num)
+        corpus.append((f'lsr-{lsa_num}req', lambda lsas=lsas: build_lsr_packet(
+            SOURCE_IP, DESTINATION_IP, ROUTER_ID, AREA_ID, lsas)))
+    for lsa_num, link_num in ((1, 1), (10, 20), (100, 20)):
+        lsas = make_lsas(lsa_num, link_num)
+        corpus.append((f'lsu-{lsa_num}lsa-{link_num}link', lambda lsas=lsas: build_lsu_packet(
+            SOURCE_IP, DESTINATION_IP, ROUTER_ID, AREA_ID, lsas)))
+    for lsa_num in (1, 60):
+        lsas = make_lsas(lsa_num)
+        corpus.append((f'lsack-{lsa_num}hdr', lambda lsas=lsas: build_lsack_packet(
+            SOURCE_IP, DESTINATION_IP, ROUTER_ID, AREA_ID, lsas)))
+    return corpus
+
+
+def reference_workload():
+    # 与本仓库代码无关的固定工作量（解释器循环 + struct解码），用来衡量当前机器的速度
+    total = 0
+    for offset in range(0, len(REFERENCE_DATA), REFERENCE_STRUCT.size):
+        total += REFERENCE_STRUCT.unpack_from(REFERENCE_DATA, offset)[0]
+    return total
+
+
+def decode_packet(packet):
+    # 与start.receive_loop一致的解码路径（报文不带以太网头）；LSU中的LSA体全部解码，即安装新LSA时的开销
+    view = memoryview(packet)
+    ip_header = IPHeaderOperator.shared().decode(view, 0)
+    offset = (ip_header.versionHeaderLength & 0xf) * 4
+    ospf_header_operator = OSPFHeaderOperator.shared()
+    ospf_header = ospf_header_operator.decode(view, offset)
+    view = view[:offset + ospf_header.length]
+    offset += ospf_header_operator.size
+    if ospf_header.type == OSPFPacketType.HELLO:
+        return OSPFHelloOperator.shared().decode(view, offset)
+    elif ospf_header.type == OSPFPacketType.DD:
+        return OSPFDDOperator.shared().decode(view, offset)
+    elif ospf_header.type == OSPFPacketType.LSR:
+        return OSPFLSROperator.shared().decode(view, offset)
+    elif ospf_header.type == OSPFPacketType.LSU:
+        lsu_data = OSPFLSUOperator.shared().decode(view, offset)
+        for lsa in lsu_data.lsas:
+            lsa.data
+        return lsu_data
+    elif ospf_header.type == OSPFPacketType.LSA:
+        return OSPFLSAckOperator.shared().decode(view, offset)
+
+
+def calibrate(func):
+    # 估计单次耗时，返回运行时间不少于MIN_BENCH_SECONDS的调用次数
+    rounds = 1
+    while True:
+        elapsed = time_rounds(func, rounds)
+        if elapsed >= MIN_BENCH_SECONDS:
+            return rounds
+        rounds *= 2 if elapsed == 0 else max(2, int(MIN_BENCH_SECONDS / elapsed * 1.2))
+
+
+def time_rounds(func, rounds):
+    # 计时过程中关闭gc，避免前面用例留下的垃圾在某一次测量中被回收
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def measure_rate(func):
+    # BENCH_SAMPLES次测量的中位数（每秒调用次数）
+    rounds = calibrate(func)
+    return statistics.median(rounds / time_rounds(func, rounds) for _ in range(BENCH_SAMPLES))
+
+
+def measure_relative(func, reference_rounds):
+    # 每次测量前紧接着测一次参考工作量，按每对测量的比值取中位数：
+    # 运行过程中机器负载变化时，用例与参考工作量受到的影响相同，比值基本不变
+    rounds = calibrate(func)
+    rates = []
+    ratios = []
+    for _ in range(BENCH_SAMPLES):
+        reference = reference_rounds / time_rounds(reference_workload, reference_rounds)
+        rate = rounds / time_rounds(func, rounds)
+        rates.append(rate)
+        ratios.append(rate / reference)
+    return statistics.median(rates), statistics.median(ratios)
+
+
+def measure_memory(func, rounds=20):
+    # blocks/pkt：结果对象占用的内存块数（对象越少越好）；peak B/pkt：一次调用中临时分配的峰值字节数
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        results = [func() for _ in range(rounds)]
+        blocks = (sys.getallocatedblocks() - before - 1) / rounds
+        del results
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+    return max(blocks, 0), peak
+
+
+def run_benchmarks():
+    reference_rounds = calibrate(reference_workload)
+    results = {}
+    for name, build in build_corpus():
+        packet = bytes(build())
+        for direction, func in (('encode', build), ('decode', lambda packet=packet: decode_packet(packet))):
+            rate, relative = measure_relative(func, reference_rounds)
+            blocks, peak = measure_memory(func)
+            results[f'{name}/{direction}'] = {
+                'bytes': len(packet) - IP_HEADER_LEN,
+                'pps': rate,
+                'bps': rate * len(packet),
+                'relative': relative,
+                'blocks_per_packet': blocks,
+                'peak_bytes_per_packet': peak,
+            }
+    return results
+
+
+def socket_per_packet_send(packet, source, destination):
+    # 改为套接字池之前sender.send_packet_on的做法：每个报文socket + bind + sendto + close
+    with socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW) as sock:
+        sock.bind((source, 0))
+        sock.sendto(packet, (destination, 0))
+
+
+def run_send_benchmark(source='127.0.0.1', destination='127.0.0.1'):
+    # 需要root：经过回环接口实际发送hello报文，比较每个报文新建套接字与使用sender.send_sockets的发送速率
+    packet = bytes(build_hello_packet(source, destination, ROUTER_ID, AREA_ID, '255.0.0.0', 10, 2, 1, 40,
+                                      '0.0.0.0', '0.0.0.0', []))
+    pool = SendSocketPool()
+    print(f'{"send path":<20} {"pkts/s":>11} {"syscalls/pkt":>12}')
+    for name, send in (('socket per packet', socket_per_packet_send), ('send socket pool', pool.send)):
+        rate = measure_rate(lambda: send(packet, source, destination))
+        if send is socket_per_packet_send:
+            syscalls = 4.0
+        else:
+            syscalls = (pool.opened * 3 + pool.sent) / pool.sent  # socket、bind、setsockopt只在创建时调用一次
+        print(f'{name:<20} {rate:>11.0f} {syscalls:>12.3f}')
+    pool.close(source)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def report(results, baseline, tolerance):
+    # 返回相对吞吐低于基线(1 - tolerance)倍的用例；旧格式（只有绝对pkts/s）的基线不参与比较
+    regressions = []
+    print(f'{"case":<32} {"bytes":>6} {"pkts/s":>11} {"MB/s":>8} {"blocks/pkt":>10} {"peak B/pkt":>10} {"vs base":>8}')
+    for case, res in results.items():
+        ratio = ''
+        if baseline and 'relative' in baseline.get(case, {}):
+            change = res['relative'] / baseline[case]['relative']
+            ratio = f'{change:.2f}x'
+            if change < 1 - tolerance:
+                regressions.append(case)
+                ratio += ' !'
+        print(f'{case:<32} {res["bytes"]:>6} {res["pps"]:>11.0f} {res["bps"] / 1e6:>8.2f} '
+              f'{res["blocks_per_packet"]:>10.1f} {res["peak_bytes_per_packet"]:>10} {ratio:>8}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OSPF codec throughput benchmark')
+    parser.add_argument('--save', action='store_true', help='save this run as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline json file')
+    parser.add_argument('--check', action='store_true',
+                        help='exit non-zero when a case regressed more than --tolerance against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed drop of pkts/s (relative to the reference workload) against the baseline')
+    parser.add_argument('--send', action='store_true',
+                        help='measure raw socket sending over loopback instead of the codec (needs root)')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.send:
+        run_send_benchmark()
+        sys.exit(0)
+    results = run_benchmarks()
+    regressions = report(results, load_baseline(args.baseline), args.tolerance)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'baseline saved to {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} case(s) regressed more than {args.tolerance:.0%}: {", ".join(regressions)}')
+        if args.check:
+            sys.exit(1)
@@ -98,7 +98,8 @@ def cal_path(router_lsas: List[Router_LSA], network_lsas: List[Network_LSA], roo
         net_ip = ip_mask_to_net(net_node.network_lsa.id,
                                 net_node.network_lsa.network_mask)
         net_mask_len = mask_to_mask_len(net_node.network_lsa.network_mask)
-        net_mask = net_node.network_lsa.network_mask
+        net_mask = ip_to_int(net_node.network_lsa.network_mask)
+        net_value = ip_to_int(net_ip)
         route_items.append(Route_item(destination=net_ip,
                                       mask_len=net_mask_len,
                                       next_hop='0.0.0.0'))
@@ -106,7 +107,7 @@ def cal_path(router_lsas: List[Router_LSA], network_lsas: List[Network_LSA], roo
         for router_node in minlength_adj[net_node]:
             next_hop_ip = None
             for link in router_node.router_lsa.links:
-                if ip_in_net(link.data, net_ip, net_mask):
+                if ip_to_int(link.data) & net_mask == net_value:
                     next_hop_ip = link.data
                     break
             if not next_hop_ip:
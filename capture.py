@@ -0,0 +1,61 @@
+import struct
+import time
+
+# pcap格式的报文记录：运行时把收到的OSPF报文（从IP头开始）连同接收时间写入文件，replay.py读取后离线回放。
+# 读取时也支持tcpdump在以太网接口上抓到的文件（去掉以太网头）。
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_GLOBAL_HEADER = struct.Struct('<IHHiIII')  # magic, 版本2.4, 时区, 精度, snaplen, 链路类型
+PCAP_RECORD_HEADER = struct.Struct('<IIII')  # 秒, 微秒, 记录长度, 原始长度
+PCAP_SNAPLEN = 65535
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+ETHERNET_HEADER_LEN = 14
+ETHERTYPE_IPV4 = 0x0800
+
+
+class PcapWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(PCAP_GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, PCAP_SNAPLEN, LINKTYPE_RAW))
+        self.written = 0
+
+    def write(self, packet, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        seconds = int(timestamp)
+        self.file.write(PCAP_RECORD_HEADER.pack(seconds, int((timestamp - seconds) * 1e6), len(packet), len(packet)))
+        self.file.write(packet)
+        self.written += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_pcap(path):
+    # 依次返回(时间戳, IP报文)
+    with open(path, 'rb') as f:
+        header = f.read(PCAP_GLOBAL_HEADER.size)
+        magic = struct.unpack('<I', header[:4])[0]
+        if magic == PCAP_MAGIC:
+            endian = '<'
+        elif magic == struct.unpack('>I', struct.pack('<I', PCAP_MAGIC))[0]:
+            endian = '>'
+        else:
+            raise ValueError(f'{path} is not a pcap file')
+        linktype = struct.unpack(endian + 'IHHiIII', header)[6]
+        if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_IPV4):
+            raise ValueError(f'unsupported pcap link type {linktype}')
+        record_header = struct.Struct(endian + 'IIII')
+        while True:
+            record = f.read(record_header.size)
+            if len(record) < record_header.size:
+                return
+            seconds, microseconds, length, _ = record_header.unpack(record)
+            packet = f.read(length)
+            if linktype == LINKTYPE_ETHERNET:
+                if struct.unpack_from('!H', packet, 12)[0] != ETHERTYPE_IPV4:
+                    continue
+                packet = packet[ETHERNET_HEADER_LEN:]
+            yield seconds + microseconds / 1e6, packet
@@ -0,0 +1,118 @@
+import itertools
+import time
+
+try:
+    import numpy
+except ImportError:  # numpy是可选依赖，只在较长的数据上用于Fletcher校验和
+    numpy = None
+
+LSA_CHECKSUM_POSITION = 15  # 去掉age之后，LSA校验和位于第15、16字节（从1开始计）
+NUMPY_MIN_LEN = 256  # 实测约240字节以下numpy的调用开销比直接计算更大
+
+
+def internet_checksum(data) -> int:
+    # RFC 1071 反码和。因为 2**16 ≡ 1 (mod 0xffff)，把整段数据当作一个大端整数对0xffff取模，
+    # 结果就等于所有16位字的反码和，整个过程在C里完成。
+    if len(data) % 2:
+        data = bytes(data) + b'\x00'
+    total = int.from_bytes(data, 'big')
+    res = total % 0xffff
+    if res == 0 and total:
+        res = 0xffff
+    return (~res) & 0xffff
+
+
+def internet_checksum_parts(*parts) -> int:
+    # 多段数据拼接后的校验和（除最后一段外长度都需为偶数），用于跳过OSPF认证字段而不拷贝报文
+    total = 0
+    nonzero = False
+    for part in parts:
+        value = int.from_bytes(part, 'big')
+        if len(part) % 2:
+            value <<= 8
+        nonzero = nonzero or value != 0
+        total += value % 0xffff
+    res = total % 0xffff
+    if res == 0 and nonzero:
+        res = 0xffff
+    return (~res) & 0xffff
+
+
+def _fletcher_sums(data):
+    length = len(data)
+    if numpy is not None and length >= NUMPY_MIN_LEN:
+        array = numpy.frombuffer(data, dtype=numpy.uint8).astype(numpy.int64)
+        c0 = int(array.sum())
+        c1 = int(numpy.dot(array, numpy.arange(length, 0, -1, dtype=numpy.int64)))
+    else:
+        # C1 是前缀和之和，sum/accumulate都在C里完成
+        c0 = sum(data)
+        c1 = sum(itertools.accumulate(data))
+    return c0 % 255, c1 % 255
+
+
+def _fletcher_result(c0, c1, length, n):
+    x = (-c1 + (length - n) * c0) % 255
+    y = (c1 - (length - n + 1) * c0) % 255
+    if x == 0:
+        x = 255
+    if y == 0:
+        y = 255
+    return (x << 8) + y
+
+
+def fletcher16(data, n=LSA_CHECKSUM_POSITION) -> int:
+    # ISO 8473 Fletcher校验和（RFC 2328 12.1.7），data为去掉age字段后的LSA，校验和字段需为0
+    c0, c1 = _fletcher_sums(data)
+    return _fletcher_result(c0, c1, len(data), n)
+
+
+def fletcher16_verify(data) -> bool:
+    # 接收方校验（RFC 2328 12.1.7）：包含校验和字段一起计算，C0与C1都为0时校验通过
+    c0, c1 = _fletcher_sums(data)
+    return c0 == 0 and c1 == 0
+
+
+def internet_checksum_bytewise(data):  # 原tools.cal_checksum的逐字节实现，用于校验与对比
+    if len(data) % 2:
+        data += b'\x00'
+    res = 0
+    for i in range(len(data) >> 1):
+        res += ((data[i * 2] << 8) + data[i * 2 + 1])
+        while res > 0xffff:
+            res = (res & 0xffff) + (res >> 16)
+    return (~res) & 0xffff
+
+
+def fletcher16_bytewise(data):  # 原tools.fletcher16的逐字节实现，用于校验与对比
+    L = len(data)
+    n = 15
+    C0, C1 = 0, 0
+    for i in range(L):
+        C0 = (C0 + data[i]) % 255
+        C1 = (C1 + C0) % 255
+    X = (- C1 + (L - n) * C0) % 255
+    Y = (C1 - (L - n + 1) * C0) % 255
+    if X == 0:
+        X = 255
+    if Y == 0:
+        Y = 255
+    return (X << 8) + Y
+
+
+def _bench(func, data, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(data)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+if __name__ == '__main__':
+    # 与原逐字节实现对比每个LSA的校验和耗时（正确性见test_checksum.py）
+    import random
+    rnd = random.Random(89)
+    print(f'{"bytes":>6} {"fletcher old us":>16} {"fletcher new us":>16} {"inet old us":>12} {"inet new us":>12}')
+    for size in (36, 84, 240, 1400):  # 1/5/18条链路的Router LSA，以及接近MTU的数据
+        data = bytes(rnd.getrandbits(8) for _ in range(size))
+        print(f'{size:>6} {_bench(fletcher16_bytewise, data, 2000):>16.2f} {_bench(fletcher16, data, 2000):>16.2f} '
+              f'{_bench(internet_checksum_bytewise, data, 2000):>12.2f} {_bench(internet_checksum, data, 2000):>12.2f}')
@@ -0,0 +1,120 @@
+import pytest
+
+import sender
+from IPData import IPHeaderOperator
+from OSPFData import OSPFHeaderOperator, OSPFLSUOperator
+from OSPFRole.area import Area
+from OSPFRole.interface import BoardcastInterface
+from OSPFRole.LSA import Router_LSA
+from STATIC import ALLSPFRouterIP, OSPFInterfaceState
+from sender import IP_HEADER_LEN, build_lsu_packet
+
+# 状态机测试共用的桩：定时器由测试手动触发，发送的报文记录下来而不经过套接字
+TIMER_MODULES = ('OSPFRole.neighbour', 'OSPFRole.interface', 'flooding')
+
+ROUTER_ID = '1.1.1.1'
+NEIGHBOUR_ID = '2.2.2.2'
+NEIGHBOUR_IP = '10.0.0.2'
+
+
+class FakeTimer:
+    def __init__(self, registry, interval, function, args=None, kwargs=None):
+        self.registry = registry
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.started = False
+        self.cancelled = False
+
+    def start(self):
+        self.started = True
+        self.registry.timers.append(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def active(self):
+        return self.started and not self.cancelled
+
+    def fire(self):
+        self.cancelled = True
+        self.function(*self.args, **self.kwargs)
+
+
+class FakeTimers:
+    def __init__(self):
+        self.timers = []
+
+    def __call__(self, interval, function, args=None, kwargs=None):
+        return FakeTimer(self, interval, function, args, kwargs)
+
+    def active(self, function=None):
+        # function为绑定方法时按==比较（每次取属性都会生成新的绑定方法对象）
+        return [timer for timer in self.timers if timer.active and (function is None or timer.function == function)]
+
+    def fire(self, function=None):
+        # 触发当前所有（或某个回调的）定时器，回调中新建的定时器留给下一次
+        timers = self.active(function)
+        for timer in timers:
+            if timer.active:
+                timer.fire()
+        return len(timers)
+
+
+class SentPacket:
+    def __init__(self, packet, source, destination):
+        self.packet = bytes(packet)
+        self.source = source
+        self.destination = destination
+        self.ip_header = IPHeaderOperator.shared().decode(self.packet, 0)
+        self.ospf_header = OSPFHeaderOperator.shared().decode(self.packet, IP_HEADER_LEN)
+
+    @property
+    def type(self):
+        return self.ospf_header.type
+
+
+@pytest.fixture
+def timers(monkeypatch):
+    fake = FakeTimers()
+    for module in TIMER_MODULES:
+        monkeypatch.setattr(f'{module}.Timer', fake)
+    return fake
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    packets = []
+
+    def writer(packet, source, destination):
+        packets.append(SentPacket(packet, source, destination))
+        return True
+    monkeypatch.setattr(sender, 'packet_writer', writer)
+    return packets
+
+
+def make_lsa(i, seq=1, link_num=1):
+    # 第i个邻居路由器的Router LSA，带link_num个stub网络
+    router_id = f'2.2.{i >> 8}.{i & 0xff}'
+    lsa = Router_LSA(2, router_id, router_id, seq, False, False, False)
+    for k in range(link_num):
+        lsa.add_stub_network(f'172.{k >> 8}.{k & 0xff}.0', '255.255.255.0', 1, None)
+    return lsa
+
+
+def make_interface(mtu=1500, state=OSPFInterfaceState.DROTHER):
+    area = Area(router_id=ROUTER_ID)
+    area.route_scheduler = lambda area: None  # 不计算路由、不写内核路由表
+    interface = BoardcastInterface('eth0', area, ip='10.0.0.1', mask='255.255.255.0', mtu=mtu)
+    interface.STATE = state
+    area.interfaces.append(interface)
+    return interface
+
+
+def lazy_lsas(lsas, source=NEIGHBOUR_IP):
+    # 与接收路径相同：从LSU报文中解码出OSPFLazyLSAData
+    packet = build_lsu_packet(source, ALLSPFRouterIP, NEIGHBOUR_ID, '0.0.0.0', lsas)
+    return list(OSPFLSUOperator.shared().decode(memoryview(bytes(packet)),
+                                                IP_HEADER_LEN + OSPFHeaderOperator.shared().size).lsas)
@@ -0,0 +1,140 @@
+from IPData import *
+import OSPFRole.area as area
+from OSPFRole.LSA import *
+
+# 接收路径上的报文处理：decode_packet校验、限速并解码一个IP报文，dispatch_packet把解码结果交给接口与邻居的状态机。
+# 运行时（start.py）与离线回放（replay.py）使用同一套函数。
+
+
+def handle_hello_packet(area: area.Area, ip_header: IPHeaderData, header: OSPFHeaderData, packet: OSPFHelloData, interface):
+    logging.debug('[handle hello] dispatch hello data packet with: ' + str(packet))
+    logging.debug(f'[handle hello] checking for interface {interface.interface_name}')
+    if interface.router_dead_interval != packet.router_dead_interval:
+        logging.debug(f'packet dead interval of {packet.router_dead_interval} '
+                      f'not match {interface.router_dead_interval}')
+        return
+    if interface.hello_interval != packet.hello_interval:
+        logging.debug(f'packet hello interval of {packet.hello_interval}'
+                      f'not match {interface.hello_interval}')
+        return
+    if interface.mask != packet.network_mask:
+        logging.debug(f'packet network mask of {packet.network_mask}'
+                      f'not match {interface.mask}')
+        return
+    if interface.ip == ip_header.sourceIP:
+        logging.debug('mine ip, pass!')
+        return
+    logging.debug(f'[handle hello] pass packet check for interface {interface.interface_name},'
+                  f'move control to interface')
+    interface.receive_hello_packet(ip_header, header, packet)
+
+
+def handle_dd_packet(area: area.Area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
+                     dd_data: OSPFDDData, lsa_headers: List[OSPFLSAHeaderData], interface):
+    logging.debug('[handle dd] dispatching packet')
+    logging.debug(f'[handle dd] continue checking in interface {interface.interface_name}')
+    interface.receive_dd_packet(ip_header, ospf_header, dd_data, lsa_headers)
+
+
+def handle_lsr_packet(area: area.Area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
+                      lsr_data: OSPFLSRDATA,interface):
+    logging.debug(f'[handle lsr] dispatching packet with lsr_number:{len(lsr_data.lsa_idents)}')
+    logging.debug(f'[handle lsr] continue checking in interface {interface.interface_name}')
+    interface.receive_lsr_packet(area, ip_header, ospf_header, lsr_data)
+
+
+def handle_lsu_packet(area: area.Area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
+                      lsas: List[OSPFLazyLSAData],interface):
+    source_interface = None
+    if ip_in_net(ip_header.sourceIP, interface.ip, interface.mask):
+        if ip_header.sourceIP == interface.ip:
+            logging.debug('mine ip, pass')
+            return
+        source_interface = interface
+    if not source_interface:
+        logging.error('ERROR, source interface of lsu packet is not sure')
+        return
+    duplicates = []
+    received = []  # 通过校验的LSA头，只有它们可以从邻居的请求列表中删除
+    for lsa in lsas:
+        if not interface.validator.check_lsa(lsa):
+            # 校验和错误的LSA直接丢弃，不确认也不安装（RFC 2328 13 (1)）
+            continue
+        received.append(lsa.header)
+        if lsa.header.type == 3 or lsa.header.type == 4:
+            logging.warning('receiving summary lsa, not yet support')
+            continue
+        elif lsa.header.type == 5:
+            logging.warning('receiving as-external lsa not yet support')
+            continue
+        # 先只用LSA头与LSDB比较，重复的LSA不解码LSA体，也不创建LSA对象
+        if area.is_newer_lsa(lsa.header):
+            source_interface.send_ack_for_lsa(lsa)  # 延迟确认（RFC 2328 13.5）
+            area.add_lsa_to_area(decode_lsa(lsa), source_interface)
+        else:
+            logging.debug(f'receiving duplicate lsa: {lsa}, skip installing')
+            duplicates.append(lsa)
+        interface.receive_lsack_packet(area, ip_header, ospf_header, [lsa.header])
+    if duplicates:
+        source_interface.send_direct_ack(duplicates, ip_header.sourceIP)
+    # 从邻居的请求列表中删除已经收到的LSA，全部收到后邻居进入Full
+    interface.receive_lsu_headers(ip_header, received)
+
+
+def handle_lsack_packet(area: area.Area, ip_header: IPHeaderData, ospf_header: OSPFHeaderData,
+                        lsa_headers: List[OSPFLSAHeaderData], interface):
+    interface.receive_lsack_packet(area, ip_header, ospf_header, lsa_headers)
+
+
+PACKET_OPERATORS = {OSPFPacketType.HELLO: OSPFHelloOperator.shared(),
+                    OSPFPacketType.DD: OSPFDDOperator.shared(),
+                    OSPFPacketType.LSR: OSPFLSROperator.shared(),
+                    OSPFPacketType.LSU: OSPFLSUOperator.shared(),
+                    OSPFPacketType.LSA: OSPFLSAckOperator.shared()}
+
+
+def decode_packet(area: area.Area, interface, view: memoryview):
+    # view为一个完整的IP报文，各operator通过offset读取，不做切片拷贝；校验失败或无法解码时返回None
+    ip_operator = IPHeaderOperator.shared()
+    ospf_header_operator = OSPFHeaderOperator.shared()
+    validator = interface.validator
+    offset = 0  # 原始IP套接字收到的数据从IP头开始，且内核已经只交付OSPF报文
+    ip_header = ip_operator.decode(view, offset)
+    ip_header_len = (ip_header.versionHeaderLength & 0xf) * 4
+    offset += ip_header_len
+    # 先用定长读取检查长度、版本、区域、认证类型与校验和，不合格的报文不再解码
+    if not validator.check_packet(view, offset, ip_header.totLength - ip_header_len):
+        return None
+    # 头部合格后先按(源地址, 报文类型)限速，超过速率的报文不再解码，也不进入状态机
+    if not interface.policer.allow(ip_header.sourceIP, view[offset + 1], interface.is_known_neighbour):
+        validator.reject(OSPFRejectReason.POLICED, ip_header.sourceIP)
+        return None
+    logging.info('[receive loop] receive packet from {} to {}'.format(ip_header.sourceIP, ip_header.destinationIP))
+    ospf_header = ospf_header_operator.decode(view, offset)
+    view = view[:offset + ospf_header.length]  # 只保留OSPF头中声明的长度
+    offset += ospf_header_operator.size
+    logging.debug('[receive loop] received ospf packet of |type:{}, routerID:{}, areaID:{}, auType:{}'
+                  .format(ospf_header.type, ospf_header.router_id, ospf_header.area_id, ospf_header.autype))
+    logging.info('[receive loop] received ospf packet of type:{}'.format(ospf_header.type))
+    try:
+        packet_data = PACKET_OPERATORS[ospf_header.type].decode(view, offset)
+    except Exception as e:
+        # 通过了头部检查但报文体不完整（如LSU中LSA长度错误），丢弃该报文而不是结束接收线程
+        validator.reject(OSPFRejectReason.MALFORMED, e)
+        return None
+    return ip_header, ospf_header, packet_data
+
+
+def dispatch_packet(area: area.Area, interface, decoded):
+    ip_header, ospf_header, packet_data = decoded
+    if ospf_header.type == OSPFPacketType.HELLO:
+        handle_hello_packet(area, ip_header, ospf_header, packet_data, interface)
+    elif ospf_header.type == OSPFPacketType.DD:
+        handle_dd_packet(area, ip_header, ospf_header, packet_data, packet_data.LSA_headers, interface)
+    elif ospf_header.type == OSPFPacketType.LSR:
+        handle_lsr_packet(area, ip_header, ospf_header, packet_data, interface)
+    elif ospf_header.type == OSPFPacketType.LSU:
+        logging.debug('receiving lsu packet')
+        handle_lsu_packet(area, ip_header, ospf_header, packet_data.lsas, interface)
+    elif ospf_header.type == OSPFPacketType.LSA:
+        handle_lsack_packet(area, ip_header, ospf_header, packet_data.lsa_headers, interface)
@@ -0,0 +1,149 @@
+import logging
+import threading
+
+from OSPFData import lsa_key, OSPFLazyLSAData
+from STATIC import *
+from runtime import Timer
+from sender import build_lsu_packet, send_packet_on, send_lsack_packet, IP_HEADER_LEN, OSPF_HEADER_LEN
+
+# 泛洪与重传的LSA不再每个LSA单独发送一个LSU：按(源地址, 目的地址)收集，在一个很短的pacing窗口之后
+# 按接口MTU打包成尽量少的LSU报文。窗口内同一个LSA的多个实例只发送最新的一个。
+LSU_PACING_WINDOW = 0.01  # 秒
+LSU_COUNT_LEN = 4  # LSU报文体开头的LSA数量字段
+LSA_HEADER_LEN = 20
+DEFAULT_MTU = 1500
+ACK_DELAY = 0.2  # 延迟确认的等待时间（秒），应小于邻居的重传间隔
+
+
+class LSUPacker:
+    def __init__(self, pacing=LSU_PACING_WINDOW):
+        self.pacing = pacing
+        self.pending = {}  # (源地址, 目的地址) -> (router_id, area_id, mtu, {lsa_key: LSA})
+        self.lock = threading.Lock()  # 没有I/O运行时时，flush在定时器线程中执行
+        self.packets = 0
+        self.lsas = 0
+        self.max_lsas_per_packet = 0
+
+    def queue(self, source_ip, destination_ip, router_id, area_id, mtu, lsa):
+        key = (source_ip, destination_ip)
+        with self.lock:
+            entry = self.pending.get(key)
+            first = entry is None
+            if first:
+                entry = self.pending[key] = (router_id, area_id, mtu, {})
+            entry[3][lsa_key(lsa)] = lsa
+        if first:
+            Timer(self.pacing, self.flush, args=[key]).start()
+
+    def flush(self, key):
+        with self.lock:
+            entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        router_id, area_id, mtu, lsas = entry
+        source_ip, destination_ip = key
+        sizes = []
+        for batch in pack_lsas(list(lsas.values()), mtu):
+            packet = build_lsu_packet(source_ip, destination_ip, router_id, area_id, batch)
+            send_packet_on(packet, source_ip, destination_ip)
+            sizes.append(len(batch))
+        with self.lock:
+            self.packets += len(sizes)
+            self.lsas += sum(sizes)
+            self.max_lsas_per_packet = max([self.max_lsas_per_packet] + sizes)
+        logging.debug(f'[flooding] sent {len(lsas)} lsas from {source_ip} to {destination_ip}')
+
+    def stats_text(self):
+        with self.lock:
+            packets, lsas, max_lsas, pending = self.packets, self.lsas, self.max_lsas_per_packet, len(self.pending)
+        return (f'lsu: packets {packets}, lsas {lsas}, '
+                f'lsas/packet avg {lsas / max(packets, 1):.1f} max {max_lsas}, '
+                f'pending destinations {pending}')
+
+
+def pack_lsas(lsas, mtu):
+    # 按顺序装入LSA，放不下时开始下一个报文；单个LSA超过MTU时单独发送（由IP分片）
+    room = mtu - IP_HEADER_LEN - OSPF_HEADER_LEN - LSU_COUNT_LEN
+    batch = []
+    used = 0
+    for lsa in lsas:
+        size = len(lsa)
+        if batch and used + size > room:
+            yield batch
+            batch = []
+            used = 0
+        batch.append(lsa)
+        used += size
+    if batch:
+        yield batch
+
+
+lsu_packer = LSUPacker()
+
+
+
+class DelayedAcks:
+    # RFC 2328 13.5：新安装的LSA不立即确认，在接口上收集，等待delay秒或装满一个LSAck报文时一起发送。
+    # 重复的LSA（邻居可能在重传）仍然立即直接确认，见direct。每个接口一个实例，delay为等待时间（秒）。
+    def __init__(self, interface, delay=ACK_DELAY):
+        self.interface = interface
+        self.delay = delay
+        self.headers = []
+        self.timer = None
+        self.lock = threading.Lock()
+        self.packets = 0
+        self.acks = 0
+        self.direct_packets = 0
+        self.direct_acks = 0
+
+    def capacity(self):
+        return max(1, (self.interface.mtu - IP_HEADER_LEN - OSPF_HEADER_LEN) // LSA_HEADER_LEN)
+
+    def add(self, lsa: OSPFLazyLSAData):
+        # 只拷贝LSA头，不保留整个LSU报文
+        header = OSPFLazyLSAData(lsa.header, bytes(lsa.raw[:LSA_HEADER_LEN]))
+        with self.lock:
+            self.headers.append(header)
+            full = len(self.headers) >= self.capacity()
+            timer = None
+            if not full and self.timer is None:
+                timer = self.timer = Timer(self.delay, self.flush)
+        if full:
+            self.flush()
+        elif timer is not None:
+            timer.start()
+
+    def flush(self):
+        with self.lock:
+            headers, self.headers = self.headers, []
+            timer, self.timer = self.timer, None
+        if timer is not None:
+            timer.cancel()
+        if not headers:
+            return
+        interface = self.interface
+        destination = ALLSPFRouterIP if (interface.STATE == OSPFInterfaceState.DR or
+                                         interface.STATE == OSPFInterfaceState.BACKUP) else ALLDRoutersIP
+        packets = self._send(headers, destination)
+        with self.lock:
+            self.packets += packets
+            self.acks += len(headers)
+
+    def direct(self, lsas, destination):
+        packets = self._send(lsas, destination)
+        with self.lock:
+            self.direct_packets += packets
+            self.direct_acks += len(lsas)
+
+    def _send(self, lsas, destination) -> int:
+        interface = self.interface
+        capacity = self.capacity()
+        for start in range(0, len(lsas), capacity):
+            send_lsack_packet(interface.ip, destination, interface.area.router_id, interface.area.id,
+                              lsas[start:start + capacity])
+        return (len(lsas) + capacity - 1) // capacity
+
+    def stats_text(self):
+        with self.lock:
+            return (f'lsack: delayed {self.acks} acks in {self.packets} packets, '
+                    f'direct {self.direct_acks} acks in {self.direct_packets} packets, pending {len(self.headers)}')
@@ -0,0 +1,89 @@
+import ctypes
+import errno
+import os
+import socket
+from typing import List
+
+from STATIC import *
+
+SO_BINDTODEVICE = getattr(socket, 'SO_BINDTODEVICE', 25)
+OSPF_GROUPS = (ALLSPFRouterIP, ALLDRoutersIP)
+
+
+def open_ospf_socket(interface_name, interface_ip, groups=OSPF_GROUPS) -> socket.socket:
+    # 协议号89的原始IP套接字：内核只把OSPF报文交给用户态（收到的数据从IP头开始，不带链路层），
+    # 不再需要混杂模式，也不用在Python里过滤转发流量。
+    # 绑定到网卡，保证每个接口的接收循环只收到本接口的报文；加入AllSPFRouters/AllDRouters组播组。
+    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, OSPF_PROTOCOL)
+    sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface_name.encode())
+    for group in groups:
+        membership = socket.inet_aton(group) + socket.inet_aton(interface_ip)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    return sock
+
+
+RECV_BATCH_SIZE = 32
+RECV_BUFFER_SIZE = 65535
+MSG_WAITFORONE = 0x10000
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_IOVec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    try:
+        recvmmsg = ctypes.CDLL(None, use_errno=True).recvmmsg
+    except (OSError, AttributeError):  # 非Linux/glibc平台没有recvmmsg，退回逐个recv_into
+        return None
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return recvmmsg
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+class BatchReceiver:
+    # 一次recvmmsg系统调用收取多个报文，写入预先分配、反复使用的缓冲区。
+    # receive()返回的memoryview只在下一次receive()之前有效，需要保留的内容（如LSA头）必须先拷贝出来。
+    def __init__(self, sock: socket.socket, batch_size=RECV_BATCH_SIZE, buffer_size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.batch_size = batch_size if _recvmmsg is not None else 1
+        self.buffer_size = buffer_size
+        self._buffer = (ctypes.c_char * (self.batch_size * buffer_size))()
+        view = memoryview(self._buffer).cast('B')
+        self._views = [view[i * buffer_size:(i + 1) * buffer_size] for i in range(self.batch_size)]
+        self._iovecs = (_IOVec * self.batch_size)()
+        self._msgs = (_MMsgHdr * self.batch_size)()
+        base = ctypes.addressof(self._buffer)
+        for i in range(self.batch_size):
+            self._iovecs[i].iov_base = base + i * buffer_size
+            self._iovecs[i].iov_len = buffer_size
+            self._msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            self._msgs[i].msg_hdr.msg_iovlen = 1
+
+    def receive(self) -> List[memoryview]:
+        # 阻塞直到至少收到一个报文，然后不再等待地取走已经到达的其余报文（MSG_WAITFORONE）
+        if _recvmmsg is None:
+            return [self._views[0][:self.sock.recv_into(self._views[0])]]
+        while True:
+            count = _recvmmsg(self.sock.fileno(), self._msgs, self.batch_size, MSG_WAITFORONE, None)
+            if count >= 0:
+                break
+            err = ctypes.get_errno()
+            if err != errno.EINTR:
+                raise OSError(err, os.strerror(err))
+        msgs = self._msgs
+        return [self._views[i][:msgs[i].msg_len] for i in range(count)]
@@ -0,0 +1,197 @@
+import collections
+import logging
+import time
+
+
+class Stage:
+    # 流水线中的一级：有界队列 + 处理函数，在事件循环中按批处理，每批之后让出循环以便继续读取套接字。
+    # 队列满时put返回False并计入丢弃；coalesce为True时队列中只保留最新的一项（如待计算的路由）。
+    # executor不为None时，处理函数在该线程池中执行（如写内核路由表），同一时间只处理一项。
+    def __init__(self, name, handler, loop, capacity=1024, batch_size=64, coalesce=False, executor=None):
+        self.name = name
+        self.handler = handler
+        self.loop = loop
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.coalesce = coalesce
+        self.executor = executor
+        self.queue = collections.deque()
+        self.listeners = []  # 队列长度变化后调用，用于上游的反压
+        self._scheduled = False
+        self._busy = False
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.busy_total = 0.0
+        self.busy_max = 0.0
+
+    @property
+    def depth(self):
+        return len(self.queue)
+
+    @property
+    def idle(self):
+        # 队列为空且没有正在处理或等待调度的批次
+        return not self.depth and not self._busy and not self._scheduled
+
+    def put(self, item) -> bool:
+        if self.coalesce and self.queue:
+            self.queue[-1] = (time.perf_counter(), item)
+            self.coalesced += 1
+            return True
+        if len(self.queue) >= self.capacity:
+            self.dropped += 1
+            return False
+        self.queue.append((time.perf_counter(), item))
+        self.enqueued += 1
+        if len(self.queue) > self.max_depth:
+            self.max_depth = len(self.queue)
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        if not self._scheduled and not self._busy:
+            self._scheduled = True
+            self.loop.call_soon(self._run)
+
+    def _run(self):
+        self._scheduled = False
+        if self.executor is not None:
+            self._run_in_executor()
+            return
+        for _ in range(min(self.batch_size, len(self.queue))):
+            enqueue_time, item = self.queue.popleft()
+            self._process(enqueue_time, item)
+        self._notify()
+        if self.queue:
+            self._schedule()
+
+    def _process(self, enqueue_time, item):
+        start = time.perf_counter()
+        self._record_wait(start - enqueue_time)
+        try:
+            self.handler(item)
+        except Exception:
+            # 一项处理失败只记录，不影响后续的报文
+            self.errors += 1
+            logging.exception(f'[pipeline] stage {self.name} failed')
+        self._record_busy(time.perf_counter() - start)
+        self.processed += 1
+
+    def _run_in_executor(self):
+        if not self.queue:
+            return
+        enqueue_time, item = self.queue.popleft()
+        self._busy = True
+        self._notify()
+        future = self.loop.run_in_executor(self.executor, self._process, enqueue_time, item)
+        future.add_done_callback(self._executor_done)
+
+    def _executor_done(self, future):
+        self._busy = False
+        if self.queue:
+            self._schedule()
+
+    def _record_wait(self, wait):
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+    def _record_busy(self, busy):
+        self.busy_total += busy
+        if busy > self.busy_max:
+            self.busy_max = busy
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener(self)
+
+    def stats_text(self):
+        processed = max(self.processed, 1)
+        return (f'{self.name:<9} depth {self.depth}/{self.capacity} (max {self.max_depth}), '
+                f'processed {self.processed}, dropped {self.dropped}, coalesced {self.coalesced}, '
+                f'errors {self.errors}, wait avg {self.wait_total / processed * 1e3:.2f}ms '
+                f'max {self.wait_max * 1e3:.2f}ms, run avg {self.busy_total / processed * 1e3:.2f}ms '
+                f'max {self.busy_max * 1e3:.2f}ms')
+
+
+LATENCY_BUCKETS = (1e-4, 1e-3, 1e-2, 1e-1, 1.0)  # 等待时间直方图的上界（秒），最后一格为1s以上
+
+
+class PriorityStage(Stage):
+    # 按优先级分类的流水线级：每个类别一个有界队列，每批按类别的优先级顺序、每个类别最多处理weight项，
+    # 循环直到处理满batch_size项，高优先级的报文不会排在大量低优先级报文之后。
+    # classes为(名字, 权重, 容量)的列表，按优先级从高到低；classify(item)返回类别的下标。
+    # 每个类别记录处理数、丢弃数与等待时间的直方图。
+    def __init__(self, name, handler, loop, classes, classify, batch_size=64):
+        super().__init__(name, handler, loop, capacity=sum(capacity for _, _, capacity in classes),
+                         batch_size=batch_size)
+        self.classes = classes
+        self.classify = classify
+        self.queues = [collections.deque() for _ in classes]
+        self.class_processed = [0] * len(classes)
+        self.class_dropped = [0] * len(classes)
+        self.histograms = [[0] * (len(LATENCY_BUCKETS) + 1) for _ in classes]
+
+    @property
+    def depth(self):
+        return sum(len(queue) for queue in self.queues)
+
+    def put(self, item) -> bool:
+        index = self.classify(item)
+        queue = self.queues[index]
+        if len(queue) >= self.classes[index][2]:
+            self.class_dropped[index] += 1
+            self.dropped += 1
+            return False
+        queue.append((time.perf_counter(), item))
+        self.enqueued += 1
+        depth = self.depth
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._schedule()
+        return True
+
+    def _run(self):
+        self._scheduled = False
+        budget = self.batch_size
+        while budget > 0:
+            taken = 0
+            for index, (_, weight, _) in enumerate(self.classes):
+                queue = self.queues[index]
+                for _ in range(min(weight, len(queue), budget - taken)):
+                    enqueue_time, item = queue.popleft()
+                    self._process(enqueue_time, item)
+                    self._record_class(index, time.perf_counter() - enqueue_time)
+                    taken += 1
+            if not taken:
+                break
+            budget -= taken
+        self._notify()
+        if self.depth:
+            self._schedule()
+
+    def _record_class(self, index, latency):
+        # latency为从入队到处理完成的时间
+        self.class_processed[index] += 1
+        histogram = self.histograms[index]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency < bound:
+                histogram[i] += 1
+                return
+        histogram[-1] += 1
+
+    def stats_text(self):
+        labels = [f'<{bound * 1e3:g}ms' for bound in LATENCY_BUCKETS] + [f'>={LATENCY_BUCKETS[-1] * 1e3:g}ms']
+        lines = [super().stats_text()]
+        for index, (name, weight, capacity) in enumerate(self.classes):
+            histogram = ' '.join(f'{label}:{count}' for label, count in zip(labels, self.histograms[index]))
+            lines.append(f'  {name:<7} weight {weight}, depth {len(self.queues[index])}/{capacity}, '
+                         f'processed {self.class_processed[index]}, dropped {self.class_dropped[index]}, '
+                         f'latency {histogram}')
+        return '\n'.join(lines)
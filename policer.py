@@ -0,0 +1,121 @@
+import collections
+import logging
+import math
+import time
+
+from STATIC import *
+
+# 控制平面限速：报文头解码之后、报文体解码与状态机处理之前，按(源地址, 报文类型)的令牌桶限制速率，
+# 超过速率的报文直接丢弃并计数。每种报文类型另有一个所有来源共用的令牌桶，限制伪造大量源地址时的总速率；
+# 已经建立双向通信的邻居不经过共用令牌桶，大量伪造来源耗尽共用令牌桶时，邻居的Hello等报文不受影响。
+# 速率单位为报文/秒，burst为桶的容量。正常邻居每hello_interval才发送一个Hello，默认值留有很大的余量。
+DEFAULT_LIMITS = {OSPFPacketType.HELLO: (5, 10),
+                  OSPFPacketType.DD: (100, 200),
+                  OSPFPacketType.LSR: (50, 100),
+                  OSPFPacketType.LSU: (200, 400),
+                  OSPFPacketType.LSA: (200, 400)}
+AGGREGATE_FACTOR = 10  # 共用令牌桶的速率与容量为单个来源的倍数
+MAX_SOURCES = 4096  # 最多跟踪的(源地址, 类型)数量，超过时淘汰最久没有报文的来源
+RATE_WINDOW = 5.0  # 显示的当前速率为指数滑动平均，时间常数为秒
+PACKET_TYPE_NAMES = {OSPFPacketType.HELLO: 'hello',
+                     OSPFPacketType.DD: 'dd',
+                     OSPFPacketType.LSR: 'lsr',
+                     OSPFPacketType.LSU: 'lsu',
+                     OSPFPacketType.LSA: 'lsack'}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'last', 'passed', 'dropped', 'avg_rate', 'last_seen')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+        self.passed = 0
+        self.dropped = 0
+        self.avg_rate = 0.0  # 到达速率（包括被丢弃的报文）
+        self.last_seen = now
+
+    def consume(self, now) -> bool:
+        elapsed = now - self.last
+        self.last = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.passed += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def record_arrival(self, now):
+        self.avg_rate = self.current_rate(now) + 1 / RATE_WINDOW
+        self.last_seen = now
+
+    def current_rate(self, now):
+        return self.avg_rate * math.exp(-(now - self.last_seen) / RATE_WINDOW)
+
+
+def parse_limits(config) -> dict:
+    # config为config.yaml中的policing项，如{'hello': [5, 10], 'lsu': [200, 400]}，未配置的类型使用默认值
+    limits = dict(DEFAULT_LIMITS)
+    types = {name: type for type, name in PACKET_TYPE_NAMES.items()}
+    for name, (rate, burst) in (config or {}).items():
+        if name not in types:
+            raise ValueError(f'unknown packet type {name} in policing config')
+        limits[types[name]] = (rate, burst)
+    return limits
+
+
+class Policer:
+    # 每个接口一个实例，只在事件循环中使用
+    def __init__(self, limits=None, max_sources=MAX_SOURCES):
+        self.limits = limits if limits is not None else dict(DEFAULT_LIMITS)
+        self.max_sources = max_sources
+        self.buckets = collections.OrderedDict()  # (源地址, 类型) -> TokenBucket
+        now = time.monotonic()
+        self.aggregate = {type: TokenBucket(rate * AGGREGATE_FACTOR, burst * AGGREGATE_FACTOR, now)
+                          for type, (rate, burst) in self.limits.items()}
+        self.dropped = collections.Counter()
+
+    def _bucket(self, source, type, now):
+        key = (source, type)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[type]
+            bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+            if len(self.buckets) > self.max_sources:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, source, type, is_known=None) -> bool:
+        # source为报文的源IP，type为OSPF报文类型；返回False时报文应被丢弃。
+        # is_known(source)为True的来源（已知邻居）只受自己的令牌桶限制；只在本来源未超速时才调用
+        if type not in self.limits:
+            return True
+        now = time.monotonic()
+        bucket = self._bucket(source, type, now)
+        bucket.record_arrival(now)
+        if bucket.consume(now):
+            if is_known is not None and is_known(source):
+                return True
+            if self.aggregate[type].consume(now):
+                return True
+            bucket.passed -= 1  # 本来源未超速，但该类型的总速率超过了限制
+            bucket.dropped += 1
+        self.dropped[type] += 1
+        logging.debug(f'[policer] drop {PACKET_TYPE_NAMES[type]} packet from {source}')
+        return False
+
+    def stats_text(self, top=20):
+        now = time.monotonic()
+        lines = [f'policed: {sum(self.dropped.values())} ('
+                 + ', '.join(f'{PACKET_TYPE_NAMES[type]}: {count}' for type, count in sorted(self.dropped.items()))
+                 + ')']
+        buckets = sorted(self.buckets.items(), key=lambda item: item[1].current_rate(now), reverse=True)
+        for (source, type), bucket in buckets[:top]:
+            lines.append(f'  {source:<15} {PACKET_TYPE_NAMES[type]:<5} rate {bucket.current_rate(now):.1f}/s '
+                         f'(limit {bucket.rate}/s), passed {bucket.passed}, dropped {bucket.dropped}')
+        return '\n'.join(lines)
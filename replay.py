@@ -0,0 +1,166 @@
+import argparse
+import collections
+
+import yaml
+
+import sender
+from OSPFRole.area import Area
+from OSPFRole.interface import BoardcastInterface
+from OSPFRole.LSA import *
+from address import in_net
+from capture import read_pcap
+from dispatcher import decode_packet, dispatch_packet
+from flooding import DEFAULT_MTU, lsu_packer
+from runtime import IORuntime
+
+# 离线回放：把记录的pcap文件按原来的时间间隔（或尽可能快地）送入与运行时相同的流水线
+# （解码 -> 协议状态机 -> 路由计算 -> 写路由表），发送与写路由表替换为只计数的桩函数，不需要网卡和root权限。
+# 结束后输出吞吐与各级的等待/处理时间，可以用同一个capture比较修改前后的性能。
+FEED_WINDOW = 256  # 尽快回放时，解码与协议两级中最多积压的报文数，不会因为队列满而丢弃报文
+ReplaySource = collections.namedtuple('ReplaySource', ['area', 'interface'])
+
+
+class StubSender:
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def __call__(self, packet, source, destination):
+        self.packets += 1
+        self.bytes += len(packet)
+        return True
+
+
+class StubFIB:
+    def __init__(self):
+        self.updates = 0
+        self.routes = []
+
+    def __call__(self, routes):
+        self.updates += 1
+        self.routes = routes
+
+
+def parse_interface(value):
+    # ens38=10.0.0.1/24
+    name, address = value.split('=')
+    ip, prefix = address.split('/')
+    mask = socket.inet_ntoa(struct.pack('!I', (0xffffffff << (32 - int(prefix))) & 0xffffffff))
+    return name, ip, mask
+
+
+class Replayer:
+    def __init__(self, area_id, router_id, interfaces, speed):
+        self.speed = speed
+        self.runtime = IORuntime(decode_packet, dispatch_packet)
+        self.stub_sender = StubSender()
+        self.stub_fib = StubFIB()
+        sender.set_packet_writer(self.stub_sender)
+        self.runtime.fib_stage.handler = self.stub_fib
+        self.area = Area(id=area_id, router_id=router_id, as_external_lsa=[])
+        self.area.route_scheduler = self.runtime.schedule_route_calculation
+        self.sources = []
+        for name, ip, mask in interfaces:
+            interface = BoardcastInterface(name, self.area, ip=ip, mask=mask, mtu=DEFAULT_MTU)
+            self.area.interfaces.append(interface)
+            self.sources.append(ReplaySource(self.area, interface))
+        self.records = []
+        self.unmatched = 0
+        self.fed = 0
+        self.start_time = None
+        self.end_time = None
+
+    def source_of(self, packet):
+        # 按源地址所在的网段确定报文是从哪个接口收到的
+        source_ip = socket.inet_ntoa(packet[12:16])
+        for source in self.sources:
+            if in_net(source_ip, source.interface.ip, source.interface.mask):
+                return source
+        return None
+
+    def load(self, path):
+        for timestamp, packet in read_pcap(path):
+            source = self.source_of(packet) if len(packet) >= 20 else None
+            if source is None:
+                self.unmatched += 1
+                continue
+            self.records.append((timestamp, source, packet))
+
+    def feed_fast(self):
+        runtime = self.runtime
+        while self.fed < len(self.records) and runtime.decode_stage.depth + runtime.protocol_stage.depth < FEED_WINDOW:
+            _, source, packet = self.records[self.fed]
+            runtime.decode_stage.put((source, packet))
+            self.fed += 1
+        if self.fed < len(self.records):
+            runtime.loop.call_soon(self.feed_fast)
+        else:
+            runtime.loop.call_soon(self.wait_idle)
+
+    def feed_one(self, source, packet):
+        self.runtime.decode_stage.put((source, packet))
+        self.fed += 1
+        if self.fed == len(self.records):
+            self.wait_idle()
+
+    def schedule_realtime(self):
+        loop = self.runtime.loop
+        first = self.records[0][0]
+        for timestamp, source, packet in self.records:
+            loop.call_at(self.start_time + (timestamp - first) / self.speed, self.feed_one, source, packet)
+
+    def wait_idle(self):
+        # 等待打包窗口中的LSU与延迟确认也发送出去
+        if (self.runtime.idle() and not lsu_packer.pending
+                and not any(source.interface.delayed_acks.headers for source in self.sources)):
+            self.end_time = self.runtime.loop.time()
+            self.runtime.stop()
+        else:
+            self.runtime.loop.call_later(0.001, self.wait_idle)
+
+    def run(self):
+        for source in self.sources:
+            source.interface.event_interface_up()
+        self.area.fresh_router_lsa()
+        self.start_time = self.runtime.loop.time()
+        if not self.records:
+            self.runtime.loop.call_soon(self.wait_idle)
+        elif self.speed > 0:
+            self.schedule_realtime()
+        else:
+            self.runtime.loop.call_soon(self.feed_fast)
+        self.runtime.run()
+
+    def report(self):
+        elapsed = self.end_time - self.start_time
+        print(f'replayed {self.fed} packets ({self.unmatched} not matching any interface) in {elapsed:.3f}s, '
+              f'{self.fed / max(elapsed, 1e-9):.0f} packets/s')
+        print(f'sent {self.stub_sender.packets} packets ({self.stub_sender.bytes} bytes), '
+              f'fib updates {self.stub_fib.updates}, routes {len(self.stub_fib.routes)}')
+        print(lsu_packer.stats_text())
+        for source in self.sources:
+            interface = source.interface
+            print(f'{interface.interface_name}: {interface.validator.stats_text()}')
+            print(interface.delayed_acks.stats_text())
+        print(self.runtime.stats_text())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay a pcap capture through the OSPF receive pipeline')
+    parser.add_argument('pcap', help='capture written with the `capture` config option, or by tcpdump')
+    parser.add_argument('--interface', action='append', required=True, type=parse_interface,
+                        help='NAME=IP/PREFIX of a router interface, can be repeated')
+    parser.add_argument('--config', default='./config.yaml', help='config file providing area_id and router_id')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='replay speed relative to the capture timestamps, 0 (default) replays as fast as possible')
+    parser.add_argument('--lsdb', action='store_true', help='print the LSDB after the replay')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    with open(args.config, 'r') as f:
+        config = yaml.load(f.read(), Loader=yaml.FullLoader)
+    replayer = Replayer(config['area_id'], config['router_id'], args.interface, args.speed)
+    replayer.load(args.pcap)
+    replayer.run()
+    replayer.report()
+    if args.lsdb:
+        print(replayer.area.lsdb_text())
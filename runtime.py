@@ -0,0 +1,278 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import socket
+import threading
+
+from ingest import open_ospf_socket, BatchReceiver
+from pipeline import Stage, PriorityStage
+from STATIC import OSPFPacketType
+from sender import send_sockets, STALE_SOCKET_ERRNOS
+from tools import refresh_routing_table
+
+# 单线程I/O核心：所有接口的接收套接字注册到同一个asyncio事件循环，报文处理、定时器回调都在该循环中执行，
+# 不再为每个接口创建接收线程，也不需要在多个线程之间争用Area。发送经过每个接口的写队列。
+# 收到的报文依次经过流水线：读取 -> 解码/校验 -> 协议状态机 -> 路由计算 -> 写内核路由表，
+# 各级之间是有界队列；解码队列满时暂停读取套接字，路由计算与写路由表只处理最新的一次请求。
+# 解码与协议状态机两级按报文类型分优先级（Hello > DD/LSR > LSAck > LSU），LSU风暴时Hello仍能及时处理，
+# 邻居不会因为Inactivity定时器超时而断开；LSU队列满时丢弃LSU（由邻居重传），不暂停读取。
+_active_runtime = None
+
+# (名字, 每批最多处理的数量, 队列容量)，按优先级从高到低
+PRIORITY_CLASSES = [('hello', 8, 1024),
+                    ('dd/lsr', 4, 1024),
+                    ('lsack', 2, 1024),
+                    ('lsu', 1, 2048)]
+PACKET_PRIORITY = {OSPFPacketType.HELLO: 0,
+                   OSPFPacketType.DD: 1,
+                   OSPFPacketType.LSR: 1,
+                   OSPFPacketType.LSA: 2,
+                   OSPFPacketType.LSU: 3}
+LOWEST_PRIORITY = len(PRIORITY_CLASSES) - 1
+
+
+def classify_raw(item):
+    # 解码之前只读取OSPF头中的类型字节；太短或类型错误的报文放入最低优先级，由解码时丢弃
+    data = item[1]
+    type_offset = (data[0] & 0xf) * 4 + 1 if data else 0
+    if type_offset >= len(data):
+        return LOWEST_PRIORITY
+    return PACKET_PRIORITY.get(data[type_offset], LOWEST_PRIORITY)
+
+
+def classify_decoded(item):
+    return PACKET_PRIORITY.get(item[1][1].type, LOWEST_PRIORITY)
+
+
+class LoopTimer:
+    # 与threading.Timer相同的用法（start/cancel），回调在事件循环中执行
+    def __init__(self, runtime, interval, function, args=None, kwargs=None):
+        self.runtime = runtime
+        self.interval = interval
+        self.function = function
+        self.args = args if args is not None else []
+        self.kwargs = kwargs if kwargs is not None else {}
+        self._handle = None
+        self._cancelled = False
+
+    def start(self):
+        self.runtime.call_soon(self._schedule)
+
+    def _schedule(self):
+        if not self._cancelled:
+            self._handle = self.runtime.loop.call_later(self.interval, self._run)
+
+    def _run(self):
+        if not self._cancelled:
+            self.function(*self.args, **self.kwargs)
+
+    def cancel(self):
+        self._cancelled = True
+        if self._handle is not None:
+            self.runtime.call_soon(self._handle.cancel)
+
+
+def Timer(interval, function, args=None, kwargs=None):
+    # 有运行时时使用事件循环定时器，否则（如单独测试某个接口时）退回threading.Timer
+    if _active_runtime is not None:
+        return LoopTimer(_active_runtime, interval, function, args, kwargs)
+    return threading.Timer(interval, function, args, kwargs)
+
+
+class InterfaceIO:
+    # 一个接口的接收套接字、发送套接字与写队列
+    def __init__(self, runtime, area, interface):
+        self.runtime = runtime
+        self.area = area
+        self.interface = interface
+        self.sock = open_ospf_socket(interface.interface_name, interface.ip)
+        self.sock.setblocking(False)
+        self.receiver = BatchReceiver(self.sock)
+        # 发送套接字来自sender.send_sockets，与没有经过运行时的发送共用同一个套接字
+        self.send_sock = send_sockets.get(interface.ip)
+        self.send_sock.setblocking(False)
+        self.write_queue = collections.deque()
+        self.dropped = 0
+        self.received = 0
+        self.sent = 0
+        self.paused = False
+
+    def on_readable(self):
+        try:
+            views = self.receiver.receive()
+        except BlockingIOError:
+            return
+        decode_stage = self.runtime.decode_stage
+        capture = self.runtime.capture
+        for view in views:
+            # 接收缓冲区会被下一次receive复用，进入队列前拷贝报文
+            data = bytes(view)
+            if capture is not None:
+                capture.write(data)
+            decode_stage.put((self, data))
+        self.received += len(views)
+        if decode_stage.capacity - decode_stage.depth < self.receiver.batch_size:
+            # 放不下下一批报文时停止读取，让报文留在内核的接收缓冲区中
+            self.pause()
+
+    def pause(self):
+        if not self.paused:
+            self.paused = True
+            self.runtime.loop.remove_reader(self.sock)
+
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            self.runtime.loop.add_reader(self.sock, self.on_readable)
+
+    def send(self, packet, destination):
+        if not self.write_queue:
+            try:
+                self.send_sock.sendto(packet, (destination, 0))
+                self.sent += 1
+                return
+            except BlockingIOError:
+                self.runtime.loop.add_writer(self.send_sock, self.on_writable)
+            except OSError:
+                # 套接字失效，由on_writable重新创建后重试
+                self.write_queue.append((packet, destination))
+                self.on_writable()
+                return
+        self.write_queue.append((packet, destination))
+
+    def on_writable(self):
+        queue = self.write_queue
+        retried = False
+        while queue:
+            packet, destination = queue[0]
+            try:
+                self.send_sock.sendto(packet, (destination, 0))
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # 接口地址变化后旧套接字不能再使用，重新创建后重试一次
+                if not retried and e.errno in STALE_SOCKET_ERRNOS and self.rebuild_send_sock():
+                    retried = True
+                    continue
+                self.dropped += 1
+                logging.error(f'[runtime] send to {destination} on {self.interface.interface_name} failed: {e}')
+            else:
+                self.sent += 1
+            retried = False
+            queue.popleft()
+        self.runtime.loop.remove_writer(self.send_sock)
+
+    def rebuild_send_sock(self) -> bool:
+        if self.send_sock.fileno() != -1:
+            self.runtime.loop.remove_writer(self.send_sock)
+        try:
+            sock = send_sockets.rebuild(self.interface.ip, self.send_sock)
+        except OSError as e:
+            logging.error(f'[runtime] rebuild send socket on {self.interface.interface_name} failed: {e}')
+            self.runtime.loop.add_writer(self.send_sock, self.on_writable)
+            return False
+        sock.setblocking(False)
+        self.send_sock = sock
+        self.runtime.loop.add_writer(self.send_sock, self.on_writable)
+        return True
+
+    def close(self):
+        self.runtime.loop.remove_reader(self.sock)
+        if self.write_queue:
+            self.runtime.loop.remove_writer(self.send_sock)
+        self.sock.close()
+        send_sockets.close(self.interface.ip)
+
+
+class IORuntime:
+    def __init__(self, decode_handler, protocol_handler):
+        # decode_handler(area, interface, view)：校验并解码一个完整的IP报文，丢弃时返回None
+        # protocol_handler(area, interface, decoded)：把解码结果交给协议状态机
+        global _active_runtime
+        self.decode_handler = decode_handler
+        self.protocol_handler = protocol_handler
+        self.loop = asyncio.new_event_loop()
+        self.interfaces = {}  # 接口ip -> InterfaceIO
+        self.capture = None  # capture.PcapWriter，设置后记录所有收到的报文
+        self._thread_id = threading.get_ident()
+        self.fib_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='fib')
+        self.decode_stage = PriorityStage('decode', self._decode, self.loop, PRIORITY_CLASSES, classify_raw)
+        self.protocol_stage = PriorityStage('protocol', self._protocol, self.loop, PRIORITY_CLASSES,
+                                            classify_decoded)
+        self.route_stage = Stage('route', self._route, self.loop, capacity=1, coalesce=True)
+        self.fib_stage = Stage('fib', refresh_routing_table, self.loop, capacity=1, coalesce=True,
+                               executor=self.fib_executor)
+        self.stages = [self.decode_stage, self.protocol_stage, self.route_stage, self.fib_stage]
+        self.decode_stage.listeners.append(self._decode_drained)
+        _active_runtime = self
+
+    def _decode(self, item):
+        io, data = item
+        decoded = self.decode_handler(io.area, io.interface, memoryview(data))
+        if decoded is not None:
+            self.protocol_stage.put((io, decoded))
+
+    def _protocol(self, item):
+        io, decoded = item
+        self.protocol_handler(io.area, io.interface, decoded)
+
+    def _route(self, area):
+        self.fib_stage.put(area.calculate_routes())
+
+    def schedule_route_calculation(self, area):
+        # LSDB变化后调用；多次变化在路由计算之前合并为一次
+        self.call_soon(self.route_stage.put, area)
+
+    def _decode_drained(self, stage):
+        if stage.depth <= stage.capacity // 2:
+            for io in self.interfaces.values():
+                io.resume()
+
+    def stats_text(self):
+        lines = [f'{io.interface.interface_name:<9} received {io.received}, paused {io.paused}, '
+                 f'sent {io.sent}, send queue {len(io.write_queue)}, send dropped {io.dropped}' for io in self.interfaces.values()]
+        lines += [stage.stats_text() for stage in self.stages]
+        return '\n'.join(lines)
+
+    def idle(self):
+        return all(stage.idle for stage in self.stages)
+
+    def in_loop_thread(self):
+        return threading.get_ident() == self._thread_id
+
+    def call_soon(self, callback, *args):
+        # 其他线程（如命令行）提交的操作也在事件循环中执行
+        if self.in_loop_thread():
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def add_interface(self, area, interface):
+        io = InterfaceIO(self, area, interface)
+        self.interfaces[interface.ip] = io
+        self.loop.add_reader(io.sock, io.on_readable)
+        return io
+
+    def send(self, packet, source, destination) -> bool:
+        # 由sender.send_packet_on调用；不属于任何已注册接口的源地址返回False，由调用者直接发送
+        io = self.interfaces.get(source)
+        if io is None:
+            return False
+        self.call_soon(io.send, packet, destination)
+        return True
+
+    def run(self):
+        self._thread_id = threading.get_ident()
+        try:
+            self.loop.run_forever()
+        finally:
+            for io in self.interfaces.values():
+                io.close()
+            self.fib_executor.shutdown(wait=False)
+            self.loop.close()
+            if self.capture is not None:
+                self.capture.close()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -1,146 +1,195 @@
+import errno
+import threading
+
 from OSPFData import *
 from IPData import IPHeaderOperator
 from tools import cal_checksum
 from STATIC import *
 
+IP_HEADER_LEN = 20  # 发送的IP头固定为20字节，不带选项
+OSPF_HEADER_LEN = 24
+OSPF_BODY_OFFSET = IP_HEADER_LEN + OSPF_HEADER_LEN
 
-def send_packet_on(packet, source, destination):
-    with socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW) as sock:
+
+# 设置了I/O运行时之后，报文进入对应接口的写队列，由事件循环发送
+packet_writer = None
+
+
+def set_packet_writer(writer):
+    # writer(packet, source, destination)返回False时表示不处理该源地址，仍然直接发送
+    global packet_writer
+    packet_writer = writer
+
+
+# 地址变化或接口重建后，旧套接字sendto返回这些错误，需要重新创建套接字
+STALE_SOCKET_ERRNOS = (errno.EADDRNOTAVAIL, errno.EINVAL, errno.EBADF)
+
+
+class SendSocketPool:
+    # 每个源地址（接口）一个长期使用的原始发送套接字，第一次使用时创建，之后的报文只需要一次sendto，
+    # 不再为每个报文socket/bind/close。接口地址变化后旧套接字发送失败，此时重新创建一次。
+    # 字典的读写在锁内进行；同一个套接字可以被多个线程同时sendto。
+    def __init__(self, sndbuf=None, socket_factory=socket.socket):
+        self.sndbuf = sndbuf  # SO_SNDBUF，None时使用系统默认值
+        self.socket_factory = socket_factory
+        self.sockets = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.rebuilt = 0
+        self.sent = 0
+
+    def _open(self, source):
+        sock = self.socket_factory(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
         sock.bind((source, 0))
-        sock.sendto(packet, (destination, 0))
+        self.sockets[source] = sock
+        self.opened += 1
+        return sock
+
+    def get(self, source) -> socket.socket:
+        with self.lock:
+            sock = self.sockets.get(source)
+            return sock if sock is not None else self._open(source)
+
+    def rebuild(self, source, old_sock) -> socket.socket:
+        with self.lock:
+            sock = self.sockets.get(source)
+            if sock is not old_sock and sock is not None:
+                return sock  # 已经被其他线程重新创建
+            new_sock = self._open(source)  # 创建失败时保留原来的套接字
+            if sock is not None:
+                sock.close()
+            self.rebuilt += 1
+            return new_sock
+
+    def close(self, source):
+        with self.lock:
+            sock = self.sockets.pop(source, None)
+        if sock is not None:
+            sock.close()
+
+    def send(self, packet, source, destination):
+        sock = self.get(source)
+        try:
+            sock.sendto(packet, (destination, 0))
+        except OSError as e:
+            if e.errno not in STALE_SOCKET_ERRNOS:
+                raise
+            self.rebuild(source, sock).sendto(packet, (destination, 0))
+        self.sent += 1
+
+    def stats_text(self):
+        return (f'send sockets: {len(self.sockets)} open, opened {self.opened}, rebuilt {self.rebuilt}, '
+                f'direct sends {self.sent}')
+
+
+send_sockets = SendSocketPool()
 
-def send_hello_packet(source_id, destination_ip, router_id, area_id, network_mask, hello_interval, options, priority,
-                      dead_interval,
-                      designated_router,
-                      backup_designated_router, neighbours):
-    ip_header_operator = IPHeaderOperator()
-    ip_header = ip_header_operator.encode(source_id, destination_ip, identification=get_identification())
-    hello_operator = OSPFHelloOperator()
-    ospf_hello = hello_operator.encode(network_mask, hello_interval, options, priority, dead_interval,
-                                       designated_router,
-                                       backup_designated_router, neighbours)
-    packet_len = len(ospf_hello) + 24  # 24是OSPF头的长度
 
-    operator = OSPFHeaderOperator()
+def send_packet_on(packet, source, destination):
+    if packet_writer is not None and packet_writer(packet, source, destination):
+        return
+    send_sockets.send(packet, source, destination)
 
-    # 构建OSPF头(无校验和)
-    ospf_header = operator.encode(type=1, packetLenth=packet_len, router_id=router_id, area_id=area_id, checksum=0)
-    # 完整的OSPF HELLO包
-    ospf_packet = ospf_header + ospf_hello
-    ospf_header = operator.encode(type=1, packetLenth=packet_len, router_id=router_id, area_id=area_id,
-                                  checksum=cal_checksum(ospf_packet))
-    ospf_packet = ospf_header + ospf_hello
 
-    # 将IP头和OSPF HELLO包结合在一起
-    packet = ip_header + ospf_packet
-    send_packet_on(packet, source_id, destination_ip)
+def send_template_packet(packet: bytearray, source, destination):
+    # 预先构造的报文（如接口的hello）每次发送只改写IP标识。IP头校验和与总长度由内核填写，
+    # OSPF校验和不覆盖IP头，都不需要重新计算。
+    # 发送的是拷贝：报文可能在写队列中等待，模板在此期间会被下一次发送改写
+    IPHeaderOperator.shared().pack_field_into(packet, 0, 'identification', get_identification())
+    send_packet_on(bytes(packet), source, destination)
 
 
+def alloc_packet(body_len) -> bytearray:
+    # IP头 + OSPF头 + OSPF报文体一次性分配
+    return bytearray(OSPF_BODY_OFFSET + body_len)
 
-def send_dd_packet(source_id, destination_ip, router_id, area_id, mtu, options, dd_options, dd_seq, lsas):
-    ip_header_operator = IPHeaderOperator()
-    ip_header = ip_header_operator.encode(source_id, destination_ip, identification=get_identification())
-    dd_operator = OSPFDDOperator()
-    ospf_dd = dd_operator.encode(mtu, options, dd_options, dd_seq)
-    lsas_data = []
-    for lsa in lsas:
-        _ = lsa.gen_packet_header()
-        lsas_data.append(_)
 
-    packet_len = len(ospf_dd) + 20 * len(lsas_data) + 24  # 24是OSPF头的长度
+def finish_packet(packet: bytearray, type, source_ip, destination_ip, router_id, area_id) -> bytearray:
+    # OSPF报文体已经写入packet，这里补上IP头和OSPF头，并就地写入OSPF校验和
+    IPHeaderOperator.shared().pack_into(packet, 0, source_ip, destination_ip, identification=get_identification())
+    operator = OSPFHeaderOperator.shared()
+    operator.pack_into(packet, IP_HEADER_LEN, type=type, packetLenth=len(packet) - IP_HEADER_LEN,
+                       router_id=router_id, area_id=area_id, checksum=0)
+    operator.pack_field_into(packet, IP_HEADER_LEN, 'checksum', cal_checksum(memoryview(packet)[IP_HEADER_LEN:]))
+    return packet
 
-    operator = OSPFHeaderOperator()
 
-    # 构建OSPF头(无校验和)
-    ospf_header = operator.encode(type=2, packetLenth=packet_len, router_id=router_id, area_id=area_id, checksum=0)
-    # 完整的OSPF HELLO包
-    ospf_packet = ospf_header + ospf_dd
-    for lsa_data in lsas_data:
-        ospf_packet += lsa_data
+def build_hello_packet(source_id, destination_ip, router_id, area_id, network_mask, hello_interval, options, priority,
+                       dead_interval,
+                       designated_router,
+                       backup_designated_router, neighbours):
+    hello_operator = OSPFHelloOperator.shared()
+    ospf_hello = hello_operator.encode(network_mask, hello_interval, options, priority, dead_interval,
+                                       designated_router,
+                                       backup_designated_router, neighbours)
+    packet = alloc_packet(len(ospf_hello))
+    packet[OSPF_BODY_OFFSET:] = ospf_hello
+    return finish_packet(packet, OSPFPacketType.HELLO, source_id, destination_ip, router_id, area_id)
 
-    ospf_header = operator.encode(type=2, packetLenth=packet_len, router_id=router_id, area_id=area_id,
-                                  checksum=cal_checksum(ospf_packet))
-    ospf_packet = ospf_header + ospf_dd
-    for lsa_data in lsas_data:
-        ospf_packet += lsa_data
 
-    # 将IP头和OSPF HELLO包结合在一起
-    packet = ip_header + ospf_packet
+def send_hello_packet(source_id, destination_ip, router_id, area_id, network_mask, hello_interval, options, priority,
+                      dead_interval,
+                      designated_router,
+                      backup_designated_router, neighbours):
+    packet = build_hello_packet(source_id, destination_ip, router_id, area_id, network_mask, hello_interval, options,
+                                priority, dead_interval, designated_router, backup_designated_router, neighbours)
     send_packet_on(packet, source_id, destination_ip)
 
 
-def send_lsr_packet(source_ip, destination_ip, router_id, area_id, lsa_headers):
-    ip_header_operator = IPHeaderOperator()
-    ip_header = ip_header_operator.encode(source_ip, destination_ip, identification=get_identification())
-    lsr_operator = OSPFLSROperator()
-    idents = [easydict.EasyDict(
-        {'type': header.type,
-         'id': header.id,
-         'advertising_router':header.advertising_router}
-    ) for header in lsa_headers]
-    ospf_lsr = lsr_operator.encode(idents)
-
-    packet_len = len(ospf_lsr) + 24  # 24是OSPF头的长度
-
-    operator = OSPFHeaderOperator()
-
-    # 构建OSPF头(无校验和)
-    ospf_header = operator.encode(type=3, packetLenth=packet_len, router_id=router_id, area_id=area_id, checksum=0)
-    # 完整的OSPF HELLO包
-    ospf_packet = ospf_header + ospf_lsr
-
-    ospf_header = operator.encode(type=3, packetLenth=packet_len, router_id=router_id, area_id=area_id,
-                                  checksum=cal_checksum(ospf_packet))
-    ospf_packet = ospf_header + ospf_lsr
-
-    # 将IP头和OSPF HELLO包结合在一起
-    packet = ip_header + ospf_packet
-    send_packet_on(packet, source_ip, destination_ip)
+def build_dd_packet(source_id, destination_ip, router_id, area_id, mtu, options, dd_options, dd_seq, lsas):
+    dd_operator = OSPFDDOperator.shared()
+    packet = alloc_packet(dd_operator.size + OSPFLSAHeaderOperator.shared().size * len(lsas))
+    offset = dd_operator.pack_into(packet, OSPF_BODY_OFFSET, mtu, options, dd_options, dd_seq)
+    for lsa in lsas:
+        offset = lsa.pack_header_into(packet, offset)
+    return finish_packet(packet, OSPFPacketType.DD, source_id, destination_ip, router_id, area_id)
 
-def send_lsa_to(source_ip, destination_ip, router_id, area_id, lsa):
-    logging.info('sending lsa to interface')
-    ip_header_operator = IPHeaderOperator()
-    ip_header = ip_header_operator.encode(source_ip, destination_ip, identification=get_identification())
-    lsu_operator = OSPFLSUOperator()
-    lsu_data = lsu_operator.encode(1)
-    lsa_data = lsa.gen_packet_header()+lsa.gen_packet_body()
 
-    packet_len = len(lsu_data) + len(lsa_data) + 24  # 24是OSPF头的长度
+def send_dd_packet(source_id, destination_ip, router_id, area_id, mtu, options, dd_options, dd_seq, lsas):
+    packet = build_dd_packet(source_id, destination_ip, router_id, area_id, mtu, options, dd_options, dd_seq, lsas)
+    send_packet_on(packet, source_id, destination_ip)
 
-    operator = OSPFHeaderOperator()
 
-    # 构建OSPF头(无校验和)
-    ospf_header = operator.encode(type=4, packetLenth=packet_len, router_id=router_id, area_id=area_id, checksum=0)
-    # 完整的OSPF HELLO包
-    ospf_packet = ospf_header + lsu_data + lsa_data
+def build_lsr_packet(source_ip, destination_ip, router_id, area_id, lsa_headers):
+    ident_operator = OSPFLSRLSAIdentOperator.shared()
+    packet = alloc_packet(ident_operator.size * len(lsa_headers))
+    offset = OSPF_BODY_OFFSET
+    for header in lsa_headers:
+        offset = ident_operator.pack_into(packet, offset, header.type, header.id, header.advertising_router)
+    return finish_packet(packet, OSPFPacketType.LSR, source_ip, destination_ip, router_id, area_id)
 
-    ospf_header = operator.encode(type=4, packetLenth=packet_len, router_id=router_id, area_id=area_id,
-                                  checksum=cal_checksum(ospf_packet))
-    ospf_packet = ospf_header + lsu_data + lsa_data
 
-    # 将IP头和OSPF HELLO包结合在一起
-    packet = ip_header + ospf_packet
+def send_lsr_packet(source_ip, destination_ip, router_id, area_id, lsa_headers):
+    packet = build_lsr_packet(source_ip, destination_ip, router_id, area_id, lsa_headers)
     send_packet_on(packet, source_ip, destination_ip)
 
-def send_lsack_packet(source_ip, destination_ip, router_id, area_id, lsas):
-    ip_header_operator = IPHeaderOperator()
-    ip_header = ip_header_operator.encode(source_ip, destination_ip, identification=get_identification())
-    lsack_operator = OSPFLSAckOperator()
-    ospf_lsack = lsack_operator.encode(lsas)
 
-    packet_len = len(ospf_lsack) + 24  # 24是OSPF头的长度
+def build_lsu_packet(source_ip, destination_ip, router_id, area_id, lsas):
+    # 所有LSA直接写入同一个bytearray，每个LSA体在一次发送中只编码一次
+    lsu_operator = OSPFLSUOperator.shared()
+    packet = alloc_packet(lsu_operator.size + sum([len(lsa) for lsa in lsas]))
+    offset = lsu_operator.pack_into(packet, OSPF_BODY_OFFSET, len(lsas))
+    for lsa in lsas:
+        offset = lsa.pack_into(packet, offset)
+    return finish_packet(packet, OSPFPacketType.LSU, source_ip, destination_ip, router_id, area_id)
 
-    operator = OSPFHeaderOperator()
 
-    # 构建OSPF头(无校验和)
-    ospf_header = operator.encode(type=5, packetLenth=packet_len, router_id=router_id, area_id=area_id, checksum=0)
-    # 完整的OSPF HELLO包
-    ospf_packet = ospf_header + ospf_lsack
+def send_lsa_to(source_ip, destination_ip, router_id, area_id, lsa):
+    logging.info('sending lsa to interface')
+    packet = build_lsu_packet(source_ip, destination_ip, router_id, area_id, [lsa])
+    send_packet_on(packet, source_ip, destination_ip)
 
-    ospf_header = operator.encode(type=5, packetLenth=packet_len, router_id=router_id, area_id=area_id,
-                                  checksum=cal_checksum(ospf_packet))
-    ospf_packet = ospf_header + ospf_lsack
 
-    # 将IP头和OSPF HELLO包结合在一起
-    packet = ip_header + ospf_packet
-    send_packet_on(packet, source_ip, destination_ip)
\ No newline at end of file
+def build_lsack_packet(source_ip, destination_ip, router_id, area_id, lsas):
+    packet = alloc_packet(OSPFLSAHeaderOperator.shared().size * len(lsas))
+    offset = OSPF_BODY_OFFSET
+    for lsa in lsas:
+        offset = lsa.pack_header_into(packet, offset)
+    return finish_packet(packet, OSPFPacketType.LSA, source_ip, destination_ip, router_id, area_id)
+
+
+def send_lsack_packet(source_ip, destination_ip, router_id, area_id, lsas):
+    packet = build_lsack_packet(source_ip, destination_ip, router_id, area_id, lsas)
+    send_packet_on(packet, source_ip, destination_ip)
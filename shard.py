@@ -0,0 +1,251 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+import sender
+from OSPFRole.area import Area
+from OSPFRole.LSA import *
+from address import ip_to_int, net_address
+from flooding import lsu_packer, DelayedAcks, ACK_DELAY
+from policer import Policer, parse_limits
+from runtime import IORuntime
+from shared_lsdb import SharedLSDB
+from tools import refresh_routing_table
+
+# 多进程运行方式：每个接口的BoardcastInterface/Neighbor状态机在单独的工作进程中运行（各自一个I/O运行时），
+# LSDB、Router LSA的生成、泛洪、SPF与写路由表在LSDB进程中。工作进程把收到的LSA报文与接口状态通过队列交给
+# LSDB进程，LSDB进程把整个LSDB写入共享内存，工作进程直接从共享内存读取（DD摘要、LSR应答、新旧比较）。
+
+
+class InterfaceSnapshot:
+    # 工作进程中接口状态的快照，字段与LSDB进程生成Router LSA、泛洪时用到的BoardcastInterface属性一致
+    def __init__(self, interface):
+        self.interface_name = interface.interface_name
+        self.ip = interface.ip
+        self.mask = interface.mask
+        self.cost = interface.cost
+        self.mtu = interface.mtu
+        self.STATE = interface.STATE
+        self.dr = interface.dr
+        self.dr_ip = interface.transform_neighbour_id_to_ip(interface.dr)
+        self.trans_net = interface.can_be_trans_net()
+
+    def get_net_address(self):
+        return net_address(self.ip, self.mask)
+
+    def can_be_trans_net(self):
+        return self.trans_net
+
+    def transform_neighbour_id_to_ip(self, router_id):
+        return self.dr_ip if router_id == self.dr else '0.0.0.0'
+
+
+def lsa_from_packet(packet) -> LSA:
+    raw = memoryview(packet)
+    return decode_lsa(OSPFLazyLSAData(OSPFLSAHeaderOperator.shared().decode(raw), raw))
+
+
+class ShardArea(Area):
+    # 工作进程中的Area：LSDB只读，来自共享内存；安装LSA与刷新Router LSA都交给LSDB进程
+    def __init__(self, id, router_id, lsdb: SharedLSDB, publish_queue):
+        self.lsdb = lsdb
+        self.publish_queue = publish_queue
+        self._lists_version = None
+        self._lsdb_lsas = {}  # (type, id, advertising_router) -> LSA，只重新解码序号变化的LSA
+        self._lsdb_lists = ([], [], [])
+        super().__init__(id=id, router_id=router_id, as_external_lsa=[])
+
+    def init_lsdb(self):
+        pass  # LSDB列表由LSDB进程维护
+
+    def _load_lsdb(self):
+        self.lsdb.refresh()
+        if self._lists_version != self.lsdb.snapshot_version:
+            for key in self.lsdb.take_changes():
+                lsa = lsa_from_packet(self.lsdb.image(key))
+                if lsa is not None:
+                    self._lsdb_lsas[key] = lsa
+            lists = ([], [], [])
+            for lsa in self._lsdb_lsas.values():
+                lists[min(lsa.type, 3) - 1].append(lsa)
+            self._lsdb_lists = lists
+            self._lists_version = self.lsdb.snapshot_version
+        return self._lsdb_lists
+
+    # 只读：工作进程中修改LSDB列表是错误，应通过add_lsa_to_area交给LSDB进程
+    router_lsa = property(lambda self: self._load_lsdb()[0])
+    network_lsa = property(lambda self: self._load_lsdb()[1])
+    summary_lsa = property(lambda self: self._load_lsdb()[2])
+
+    def lsdb_seq_index(self):
+        return self.lsdb.seq_index()
+
+    def lsdb_index(self):
+        self._load_lsdb()
+        return self._lsdb_lsas
+
+    def add_lsa_to_area(self, lsa: LSA, source_interface):
+        # source_interface为None时是本路由器产生的LSA（如DR接口上的Network LSA），由LSDB进程分配序号
+        if source_interface is None:
+            self.publish_queue.put(('lsa', None, bytes(lsa.gen_packet()), True))
+        else:
+            self.publish_queue.put(('lsa', source_interface.interface_name, bytes(lsa.gen_packet()), False))
+
+    def fresh_router_lsa(self):
+        for interface in self.interfaces:
+            self.publish_queue.put(('interface', InterfaceSnapshot(interface)))
+
+
+class LSDBArea(Area):
+    # LSDB进程中的Area：interfaces是各工作进程发来的InterfaceSnapshot
+    def __init__(self, id, router_id, lsdb: SharedLSDB):
+        super().__init__(id=id, router_id=router_id, as_external_lsa=[])
+        self.lsdb = lsdb
+        self.lsdb_changed = False
+        self.changed_lsas = {}  # 下次publish时写入共享内存的LSA
+        self.routes_changed = False
+        self.route_scheduler = self._mark_routes_changed
+
+    def _mark_routes_changed(self, area):
+        self.routes_changed = True
+
+    def update_interface(self, snapshot: InterfaceSnapshot):
+        self.interfaces = [x for x in self.interfaces if x.interface_name != snapshot.interface_name]
+        self.interfaces.append(snapshot)
+        self.fresh_router_lsa()
+
+    def get_interface(self, interface_name):
+        for interface in self.interfaces:
+            if interface.interface_name == interface_name:
+                return interface
+        return None
+
+    def install_packet(self, source_name, packet, local):
+        # local为True时是工作进程产生的LSA，统一由LSDB进程分配序号；其他LSA都是从网络上收到的
+        lsa = lsa_from_packet(packet)
+        if lsa is None:
+            return
+        if local:
+            lsa.seq = self.gen_lsa_seq()
+        elif not self.is_newer_lsa(lsa):
+            return  # 同一个LSA可能从多个接口收到
+        elif lsa.advertising_router == self.router_id:
+            self.receive_self_originated(lsa)
+            return
+        self.add_lsa_to_area(lsa, self.get_interface(source_name))
+
+    def receive_self_originated(self, lsa: LSA):
+        # 收到比LSDB中更新的本路由器产生的LSA（如重启之前发出的旧实例）：
+        # 序号跳过收到的实例，用当前的内容重新产生（RFC 2328 13.4）
+        self.lsa_seq = max(self.lsa_seq, lsa.seq + 1)
+        own = self.lsdb_index().get(lsa_key(lsa))
+        if own is None:
+            # 本路由器已经不再产生该LSA，应提前老化后泛洪删除，目前不支持MaxAge
+            logging.warning(f'[lsdb] receiving self-originated {lsa} not in lsdb, ignored')
+            return
+        self.info(f'receiving newer self-originated {lsa}, re-originating')
+        own.seq = self.gen_lsa_seq()
+        self.add_lsa_to_area(own, None)
+
+    def add_lsa_to_area(self, lsa: LSA, source_interface):
+        super().add_lsa_to_area(lsa, source_interface)
+        self.changed_lsas[lsa_key(lsa)] = lsa
+        self.lsdb_changed = True
+
+    def publish(self):
+        # 只写入上次publish之后变化的LSA
+        self.lsdb.publish([(lsa.type, ip_to_int(lsa.id), ip_to_int(lsa.advertising_router), lsa.seq,
+                            bytes(lsa.gen_packet())) for lsa in self.changed_lsas.values()])
+        self.changed_lsas = {}
+        self.lsdb_changed = False
+
+
+def run_worker(area_id, router_id, interface_name, lsdb, publish_queue, decode_handler, protocol_handler,
+               policing_limits, ack_delay):
+    area = ShardArea(area_id, router_id, lsdb, publish_queue)
+    runtime = IORuntime(decode_handler, protocol_handler)
+    sender.set_packet_writer(runtime.send)
+    area.add_interface(interface_name)
+    interface = area.interfaces[0]
+    interface.policer = Policer(policing_limits)
+    interface.delayed_acks = DelayedAcks(interface, ack_delay)
+    runtime.add_interface(area, interface)
+    interface.event_interface_up()
+    area.fresh_router_lsa()
+    runtime.run()
+
+
+def run_lsdb(area: LSDBArea, publish_queue, stop_event):
+    while not stop_event.is_set():
+        messages = []
+        try:
+            messages.append(publish_queue.get(timeout=1))
+        except queue.Empty:
+            pass  # 没有新消息时也重试上次失败的publish与路由计算
+        while True:  # 一次取走队列中的所有消息，SPF与共享内存的更新每批只做一次
+            try:
+                messages.append(publish_queue.get_nowait())
+            except queue.Empty:
+                break
+        for message in messages:
+            try:
+                if message[0] == 'lsa':
+                    area.install_packet(message[1], message[2], message[3])
+                elif message[0] == 'interface':
+                    area.update_interface(message[1])
+            except Exception:
+                logging.exception(f'[lsdb] error handling {message[0]} message')
+        # 失败时保留lsdb_changed/routes_changed，下一批重试，工作进程不会一直使用旧的LSDB
+        if area.lsdb_changed:
+            try:
+                area.publish()
+            except Exception:
+                logging.exception('[lsdb] error publishing lsdb to shared memory')
+        if area.routes_changed:
+            try:
+                refresh_routing_table(area.calculate_routes())
+                area.routes_changed = False
+            except Exception:
+                logging.exception('[lsdb] error calculating routes')
+
+
+def run_sharded(config, decode_handler, protocol_handler):
+    # 工作进程通过fork继承共享内存段与队列，不需要pickle处理函数
+    context = multiprocessing.get_context('fork')
+    lsdb = SharedLSDB()
+    publish_queue = context.Queue()
+    area = LSDBArea(config['area_id'], config['router_id'], lsdb)
+    workers = [context.Process(target=run_worker, name=f'ospf-{interface_name}',
+                               args=(config['area_id'], config['router_id'], interface_name, lsdb, publish_queue,
+                                     decode_handler, protocol_handler, parse_limits(config.get('policing')),
+                                     config.get('ack_delay_ms', ACK_DELAY * 1000) / 1000))
+               for interface_name in config['interfaces']]
+    for interface_name in config['interfaces']:
+        os.system(f'sysctl net.ipv4.conf.{interface_name}.forwarding=1')
+    for worker in workers:
+        worker.start()
+    stop_event = threading.Event()
+    lsdb_thread = threading.Thread(target=run_lsdb, args=(area, publish_queue, stop_event), daemon=True)
+    lsdb_thread.start()
+    try:
+        while True:
+            command = input()
+            if command == 'lsdb':
+                print(area.lsdb_text())
+            elif command == 'cal':
+                print(area.calculate_routes())
+            elif command == 'stats':
+                print(lsu_packer.stats_text())
+            elif command == 'workers':
+                for worker in workers:
+                    print(f'{worker.name}: pid {worker.pid}, alive {worker.is_alive()}')
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        lsdb.close()
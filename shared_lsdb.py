@@ -0,0 +1,161 @@
+import time
+from multiprocessing import shared_memory
+
+from Decoder import compile_fmt
+
+# 共享内存中的LSDB：LSDB/SPF进程是唯一的写者，各接口的工作进程只读。
+# 段中保存的是LSA的报文（与发送时相同的字节），读者按需解码，不需要在进程之间pickle Area或LSA对象。
+#   头部   version(写入过程中为奇数), count, data_len, index_capacity
+#   索引   index_capacity个槽位，前count个有效：(type, id, advertising_router, seq, offset, length)，
+#          id与advertising_router为32位整数；每个LSA占用固定的槽位，更新时原地改写
+#   数据   LSA报文；更新后的报文不超过原来的长度时原地改写，否则追加在data_len之后，空间不足时整体重写一次
+# 写者每次只写入变化的LSA，读者每次只拷贝序号变化的LSA报文。
+SEGMENT_HEADER_FMT = '!QIII'
+INDEX_ENTRY_FMT = '!BIIiII'
+DEFAULT_SEGMENT_SIZE = 4 << 20
+DEFAULT_MAX_LSAS = 16384
+
+
+class SharedLSDBFull(Exception):
+    pass
+
+
+class SharedLSDB:
+    def __init__(self, name=None, size=DEFAULT_SEGMENT_SIZE, max_lsas=DEFAULT_MAX_LSAS):
+        # name为None时创建新的段（写者），否则按名字连接已有的段（读者）
+        self.owner = name is None
+        self._header = compile_fmt(SEGMENT_HEADER_FMT)
+        self._entry = compile_fmt(INDEX_ENTRY_FMT)
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            if self._header.size + max_lsas * self._entry.size > len(self.shm.buf):
+                raise ValueError(f'index of {max_lsas} lsas does not fit in {size} bytes')
+            self._header.pack_into(self.shm.buf, 0, 0, 0, 0, max_lsas)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.index_capacity = self._header.unpack_from(self.shm.buf, 0)[3]
+        self.data_start = self._header.size + self.index_capacity * self._entry.size
+        # 写者：key -> (槽位, 数据偏移, 数据区中占用的长度)，以及整体重写时使用的报文副本
+        self._slots = {}
+        self._written = {}
+        self._data_len = 0
+        # 读者：最近一次refresh读到的版本与各LSA的(seq, 报文)，以及还没有被take_changes取走的变化
+        self._version = None
+        self._seqs = {}
+        self._images = {}
+        self._changes = set()
+
+    @property
+    def data_capacity(self):
+        return len(self.shm.buf) - self.data_start
+
+    def publish(self, images):
+        # images为变化的(type, id_int, advertising_router_int, seq, packet)，加入或替换段中的同一个LSA
+        updates = {(type, id, advertising_router): (seq, bytes(packet))
+                   for type, id, advertising_router, seq, packet in images}
+        if not updates:
+            return
+        new_keys = [key for key in updates if key not in self._slots]
+        if len(self._slots) + len(new_keys) > self.index_capacity:
+            raise SharedLSDBFull(f'{len(self._slots) + len(new_keys)} lsas exceed the index of {self.index_capacity}')
+        appended = sum(len(packet) for key, (seq, packet) in updates.items()
+                       if key not in self._slots or len(packet) > self._slots[key][2])
+        buf = self.shm.buf
+        header = self._header
+        version = header.unpack_from(buf, 0)[0]
+        rewrite = self._data_len + appended > self.data_capacity
+        if rewrite:
+            written = dict(self._written)
+            written.update(updates)
+            if sum(len(packet) for seq, packet in written.values()) > self.data_capacity:
+                raise SharedLSDBFull(f'{len(written)} lsas do not fit in {self.data_capacity} bytes')
+        header.pack_into(buf, 0, version + 1, len(self._slots), self._data_len, self.index_capacity)  # 奇数：读者需要重试
+        if rewrite:
+            self._rewrite(written)
+        else:
+            for key, (seq, packet) in updates.items():
+                self._write(key, seq, packet)
+        header.pack_into(buf, 0, version + 2, len(self._slots), self._data_len, self.index_capacity)
+
+    def _write(self, key, seq, packet):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = (len(self._slots), self._data_len, len(packet))
+            self._data_len += len(packet)
+        elif len(packet) > slot[2]:
+            slot = (slot[0], self._data_len, len(packet))
+            self._data_len += len(packet)
+        self._slots[key] = slot
+        self._written[key] = (seq, packet)
+        position, offset, _ = slot
+        data = self.data_start + offset
+        self.shm.buf[data:data + len(packet)] = packet
+        self._entry.pack_into(self.shm.buf, self._header.size + position * self._entry.size,
+                              *key, seq, offset, len(packet))
+
+    def _rewrite(self, written):
+        # 追加的空间用完时按原来的槽位顺序紧凑地重写所有LSA
+        order = sorted(written, key=lambda key: self._slots.get(key, (len(self._slots),))[0])
+        self._slots = {}
+        self._written = {}
+        self._data_len = 0
+        for key in order:
+            self._write(key, *written[key])
+
+    @property
+    def snapshot_version(self):
+        # 最近一次refresh读到的版本，读者用来判断自己的缓存是否过期
+        return self._version
+
+    def refresh(self) -> bool:
+        # 段内容有变化时更新本地快照，返回是否有变化；只拷贝序号变化的LSA报文，写入过程中读到的数据会被丢弃并重试
+        buf = self.shm.buf
+        header = self._header
+        while True:
+            version, count, data_len, _ = header.unpack_from(buf, 0)
+            if version == self._version:
+                return False
+            if version % 2:
+                time.sleep(0)
+                continue
+            entries = list(self._entry.iter_unpack(bytes(buf[header.size:header.size + count * self._entry.size])))
+            changed = {}
+            for type, id, advertising_router, seq, offset, length in entries:
+                key = (type, id, advertising_router)
+                if self._seqs.get(key) != seq:
+                    data = self.data_start + offset
+                    changed[key] = (seq, bytes(buf[data:data + length]))
+            if header.unpack_from(buf, 0)[0] != version:
+                continue
+            break
+        self._version = version
+        for key, (seq, packet) in changed.items():
+            self._seqs[key] = seq
+            self._images[key] = packet
+        self._changes.update(changed)
+        return True
+
+    def take_changes(self) -> set:
+        # 返回上次调用之后内容有变化的LSA的key
+        changes = self._changes
+        self._changes = set()
+        return changes
+
+    def seq_index(self):
+        # (type, id, advertising_router) -> seq，与Area.lsdb_seq_index相同的形式；返回的字典不能修改
+        self.refresh()
+        return self._seqs
+
+    def image(self, key):
+        self.refresh()
+        return self._images.get(key)
+
+    def images(self):
+        self.refresh()
+        return list(self._images.values())
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,94 @@
+import struct
+
+import pytest
+
+import runtime
+import sender
+from OSPFData import OSPFDDData, OSPFHelloData, OSPFLSAckDATA, OSPFLSRDATA, OSPFLSUDATA
+from OSPFRole.LSA import *
+from STATIC import ALLDRoutersIP, ALLSPFRouterIP, OSPFPacketType
+from capture import ETHERTYPE_IPV4, LINKTYPE_ETHERNET, PCAP_GLOBAL_HEADER, PCAP_MAGIC, PCAP_RECORD_HEADER, \
+    PCAP_SNAPLEN, PcapWriter, read_pcap
+from conftest import NEIGHBOUR_ID, NEIGHBOUR_IP, ROUTER_ID, make_lsa
+from dispatcher import decode_packet
+from replay import Replayer
+from sender import build_dd_packet, build_hello_packet, build_lsack_packet, build_lsr_packet, build_lsu_packet
+
+AREA_ID = '0.0.0.0'
+INTERFACE_IP = '10.0.0.1'
+DECODED_TYPES = {OSPFPacketType.HELLO: OSPFHelloData,
+                 OSPFPacketType.DD: OSPFDDData,
+                 OSPFPacketType.LSR: OSPFLSRDATA,
+                 OSPFPacketType.LSU: OSPFLSUDATA,
+                 OSPFPacketType.LSA: OSPFLSAckDATA}
+
+
+def wire(packet):
+    # 构造的报文IP总长度为0，由内核填写；抓到的报文中是实际长度
+    packet[2:4] = len(packet).to_bytes(2, 'big')
+    return bytes(packet)
+
+
+def neighbour_packets():
+    lsas = [make_lsa(i, link_num=i + 1) for i in range(3)]
+    network = Network_LSA(2, NEIGHBOUR_IP, NEIGHBOUR_ID, 1, '255.255.255.0', [ROUTER_ID, NEIGHBOUR_ID])
+    return [(OSPFPacketType.HELLO, wire(build_hello_packet(NEIGHBOUR_IP, ALLSPFRouterIP, NEIGHBOUR_ID, AREA_ID,
+                                                           '255.255.255.0', 10, 2, 1, 40, NEIGHBOUR_IP,
+                                                           '0.0.0.0', [ROUTER_ID]))),
+            (OSPFPacketType.DD, wire(build_dd_packet(NEIGHBOUR_IP, INTERFACE_IP, NEIGHBOUR_ID, AREA_ID, 1500, 2, 0,
+                                                     7, lsas))),
+            (OSPFPacketType.LSR, wire(build_lsr_packet(NEIGHBOUR_IP, INTERFACE_IP, NEIGHBOUR_ID, AREA_ID, lsas))),
+            (OSPFPacketType.LSU, wire(build_lsu_packet(NEIGHBOUR_IP, ALLDRoutersIP, NEIGHBOUR_ID, AREA_ID,
+                                                       lsas + [network]))),
+            (OSPFPacketType.LSA, wire(build_lsack_packet(NEIGHBOUR_IP, ALLDRoutersIP, NEIGHBOUR_ID, AREA_ID, lsas)))]
+
+
+@pytest.fixture
+def replayer(monkeypatch):
+    # Replayer创建运行时并替换发送函数，测试结束后恢复
+    monkeypatch.setattr(runtime, '_active_runtime', None)
+    monkeypatch.setattr(sender, 'packet_writer', None)
+    replayer = Replayer(AREA_ID, ROUTER_ID, [('eth0', INTERFACE_IP, '255.255.255.0')], 0)
+    yield replayer
+    replayer.runtime.fib_executor.shutdown(wait=True)
+    replayer.runtime.loop.close()
+
+
+def test_capture_replays_through_decode(tmp_path, replayer):
+    packets = neighbour_packets()
+    other = bytearray(packets[0][1])
+    other[12:16] = bytes([192, 168, 0, 2])  # 源地址不在任何接口的网段中
+    path = tmp_path / 'capture.pcap'
+    writer = PcapWriter(path)
+    for i, (_, packet) in enumerate(packets):
+        writer.write(packet, 1700000000 + i * 0.25)
+    writer.write(bytes(other), 1700000002)
+    writer.close()
+    assert writer.written == len(packets) + 1
+    replayer.load(path)
+    assert replayer.unmatched == 1
+    assert [(timestamp, packet) for timestamp, _, packet in replayer.records] == \
+        [(1700000000 + i * 0.25, packet) for i, (_, packet) in enumerate(packets)]
+    decoded_types = []
+    for _, source, packet in replayer.records:
+        assert source.interface.ip == INTERFACE_IP
+        ip_header, ospf_header, packet_data = decode_packet(source.area, source.interface, memoryview(packet))
+        assert (ip_header.sourceIP, ospf_header.router_id) == (NEIGHBOUR_IP, NEIGHBOUR_ID)
+        assert isinstance(packet_data, DECODED_TYPES[ospf_header.type])
+        decoded_types.append(ospf_header.type)
+    assert decoded_types == [type for type, _ in packets]
+    assert source.interface.validator.accepted == len(packets)
+
+
+def test_read_ethernet_capture(tmp_path):
+    # tcpdump在以太网接口上抓到的文件：去掉以太网头，跳过非IPv4帧
+    _, packet = neighbour_packets()[0]
+    frames = [b'\x01' * 12 + struct.pack('!H', ETHERTYPE_IPV4) + packet,
+              b'\x01' * 12 + struct.pack('!H', 0x86dd) + b'\x60' * 40]
+    path = tmp_path / 'ethernet.pcap'
+    with open(path, 'wb') as f:
+        f.write(PCAP_GLOBAL_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0, PCAP_SNAPLEN, LINKTYPE_ETHERNET))
+        for frame in frames:
+            f.write(PCAP_RECORD_HEADER.pack(1700000000, 500000, len(frame), len(frame)))
+            f.write(frame)
+    assert list(read_pcap(path)) == [(1700000000.5, packet)]
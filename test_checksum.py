@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+import checksum
+from checksum import LSA_CHECKSUM_POSITION, fletcher16, fletcher16_bytewise, fletcher16_verify, internet_checksum, \
+    internet_checksum_bytewise, internet_checksum_parts
+
+SIZES = list(range(0, 64)) + [100, 255, 256, 257, 1000, 1500, 4000]
+
+
+def random_data(rnd, size):
+    return bytes(rnd.getrandbits(8) for _ in range(size))
+
+
+def lsa_samples():
+    # 随机内容的“LSA”（去掉age之后），校验和字段清零
+    rnd = random.Random(89)
+    for size in SIZES:
+        if size <= LSA_CHECKSUM_POSITION:
+            continue
+        for _ in range(10):
+            lsa = bytearray(random_data(rnd, size))
+            lsa[14:16] = b'\x00\x00'
+            yield lsa
+
+
+def test_internet_checksum_matches_bytewise():
+    rnd = random.Random(89)
+    for size in SIZES:
+        for _ in range(10):
+            data = random_data(rnd, size)
+            assert internet_checksum(data) == internet_checksum_bytewise(data), size
+    assert internet_checksum(b'') == internet_checksum_bytewise(b'') == 0xffff
+    assert internet_checksum(b'\xff\xff') == internet_checksum_bytewise(b'\xff\xff') == 0
+
+
+def test_internet_checksum_parts_matches_full():
+    rnd = random.Random(1071)
+    for size in SIZES:
+        data = random_data(rnd, size)
+        for split in range(0, size + 1, 2):  # 除最后一段外长度都为偶数
+            assert internet_checksum_parts(data[:split], data[split:]) == internet_checksum(data), (size, split)
+        if size >= 24:
+            assert internet_checksum_parts(data[:16], memoryview(data)[16:24], data[24:]) == internet_checksum(data)
+
+
+def test_fletcher16_matches_bytewise():
+    for lsa in lsa_samples():
+        assert fletcher16(lsa) == fletcher16_bytewise(lsa), len(lsa)
+
+
+def test_fletcher16_verify():
+    for lsa in lsa_samples():
+        lsa[14:16] = fletcher16(lsa).to_bytes(2, 'big')
+        assert fletcher16_verify(lsa), len(lsa)
+        lsa[-1] ^= 1
+        assert not fletcher16_verify(lsa), len(lsa)
+
+
+def test_fletcher16_without_numpy(monkeypatch):
+    monkeypatch.setattr(checksum, 'numpy', None)
+    for lsa in lsa_samples():
+        assert fletcher16(lsa) == fletcher16_bytewise(lsa), len(lsa)
+
+
+def test_fletcher16_numpy_matches_pure_python(monkeypatch):
+    pytest.importorskip('numpy')
+    lsas = [lsa for lsa in lsa_samples() if len(lsa) >= checksum.NUMPY_MIN_LEN]
+    assert lsas
+    with_numpy = [fletcher16(lsa) for lsa in lsas]
+    monkeypatch.setattr(checksum, 'numpy', None)
+    assert with_numpy == [fletcher16(lsa) for lsa in lsas]
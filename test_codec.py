@@ -0,0 +1,165 @@
+import pytest
+
+from Decoder import compile_fmt
+from OSPFData import *
+from OSPFRole.LSA import *
+from conftest import make_lsa
+from dispatcher import PACKET_OPERATORS
+
+PREFIX = b'\xaa' * 7  # 解码时通过offset跳过前面的数据，不做切片
+
+
+def decode_at(operator, encoded, *args):
+    # args为LSA体解码需要的lsa_len
+    return operator.decode(PREFIX + encoded, *args, len(PREFIX))
+
+
+def test_every_operator_is_covered():
+    assert set(PACKET_OPERATORS) == set(PACKET_ROUND_TRIPS)
+    assert set(LSA_BODY_OPERATORS) == set(LSA_BODY_ROUND_TRIPS)
+
+
+def test_shared_operator_and_codec():
+    assert OSPFHelloOperator.shared() is OSPFHelloOperator.shared()
+    assert OSPFHelloOperator.shared() is not OSPFDDOperator.shared()
+    assert OSPFHelloOperator().codec is OSPFHelloOperator.shared().codec  # 同一个FMT只编译一次
+    assert compile_fmt('!I') is OSPFLSUOperator.shared().codec
+
+
+def test_ospf_header_round_trip():
+    operator = OSPFHeaderOperator.shared()
+    encoded = operator.encode(type=OSPFPacketType.LSU, packetLenth=100, router_id='1.2.3.4', area_id='0.0.0.1',
+                              checksum=0xbeef, autype=OSPFAuthType.NULL, authentication=0x0102030405060708)
+    header = decode_at(operator, encoded)
+    assert (header.version, header.type, header.length, header.router_id, header.area_id, header.checksum,
+            header.autype, header.authentication) == (2, OSPFPacketType.LSU, 100, '1.2.3.4', '0.0.0.1', 0xbeef,
+                                                      OSPFAuthType.NULL, 0x0102030405060708)
+
+
+def test_lsa_header_round_trip():
+    operator = OSPFLSAHeaderOperator.shared()
+    encoded = operator.encode(3600, 0x22, 2, '10.0.0.1', '1.1.1.1', -0x7fffffff, 0x1234, 32)
+    header = decode_at(operator, encoded)
+    assert (header.age, header.options, header.type, header.id, header.advertising_router, header.seq,
+            header.checksum, header.length) == (3600, 0x22, 2, '10.0.0.1', '1.1.1.1', -0x7fffffff, 0x1234, 32)
+
+
+def hello_round_trip():
+    operator = OSPFHelloOperator.shared()
+    for neighbours in ([], ['2.2.2.2'], [f'3.3.3.{i}' for i in range(50)]):
+        encoded = operator.encode('255.255.255.0', 10, 2, 1, 40, '10.0.0.1', '10.0.0.2', neighbours)
+        hello = decode_at(operator, encoded)
+        assert (hello.network_mask, hello.hello_interval, hello.options, hello.router_priority,
+                hello.router_dead_interval, hello.dr, hello.bdr) == ('255.255.255.0', 10, 2, 1, 40,
+                                                                     '10.0.0.1', '10.0.0.2')
+        assert hello.neighbours == neighbours
+
+
+def dd_round_trip():
+    operator = OSPFDDOperator.shared()
+    lsas = [make_lsa(i, seq=-0x7fffffff + i, link_num=i) for i in range(3)]
+    encoded = operator.encode(1500, 2, 7, 0xfedcba98) + b''.join(lsa.gen_packet_header() for lsa in lsas)
+    dd = decode_at(operator, encoded)
+    assert (dd.interface_mtu, dd.options, dd.DD_options, dd.DD_seq) == (1500, 2, 7, 0xfedcba98)
+    assert [(header.type, header.id, header.advertising_router, header.seq, header.length)
+            for header in dd.LSA_headers] == [(lsa.type, lsa.id, lsa.advertising_router, lsa.seq, len(lsa))
+                                              for lsa in lsas]
+
+
+def lsr_round_trip():
+    operator = OSPFLSROperator.shared()
+    lsas = [make_lsa(i) for i in range(3)] + [Network_LSA(2, '10.0.1.1', '1.1.1.1', 1, '255.255.255.0', [])]
+    lsr = decode_at(operator, operator.encode(lsas))
+    assert [(ident.type, ident.id, ident.advertising_router) for ident in lsr.lsa_idents] == \
+        [(lsa.type, lsa.id, lsa.advertising_router) for lsa in lsas]
+
+
+def lsu_round_trip():
+    operator = OSPFLSUOperator.shared()
+    router = make_lsa(1, link_num=3)
+    network = Network_LSA(2, '10.0.1.1', '1.1.1.1', 5, '255.255.255.0', ['1.1.1.1', '2.2.2.2'])
+    lsu = decode_at(operator, operator.encode(2) + bytes(router.packet) + bytes(network.packet))
+    assert lsu.lsa_num == 2
+    assert [bytes(lsa.raw) for lsa in lsu.lsas] == [bytes(router.packet), bytes(network.packet)]
+    assert [(header.type, header.id, header.seq, header.checksum) for header in lsu.lsa_headers] == \
+        [(1, router.id, router.seq, router.checksum), (2, network.id, network.seq, network.checksum)]
+    assert [(link.id, link.data, link.type, link.metric) for link in lsu.lsas[0].data.links] == \
+        [(link.id, link.data, link.type, link.metric) for link in router.links]
+    assert lsu.lsas[1].data.attached_routers == ['1.1.1.1', '2.2.2.2']
+
+
+def lsack_round_trip():
+    operator = OSPFLSAckOperator.shared()
+    lsas = [make_lsa(i, seq=i) for i in range(4)]
+    lsack = decode_at(operator, operator.encode(lsas))
+    assert [(header.type, header.id, header.advertising_router, header.seq, header.checksum)
+            for header in lsack.lsa_headers] == [(lsa.type, lsa.id, lsa.advertising_router, lsa.seq, lsa.checksum)
+                                                 for lsa in lsas]
+
+
+PACKET_ROUND_TRIPS = {OSPFPacketType.HELLO: hello_round_trip,
+                      OSPFPacketType.DD: dd_round_trip,
+                      OSPFPacketType.LSR: lsr_round_trip,
+                      OSPFPacketType.LSU: lsu_round_trip,
+                      OSPFPacketType.LSA: lsack_round_trip}
+
+
+@pytest.mark.parametrize('type', sorted(PACKET_ROUND_TRIPS))
+def test_packet_round_trip(type):
+    PACKET_ROUND_TRIPS[type]()
+
+
+def router_body_round_trip(operator):
+    links = [{'id': '10.0.0.0', 'data': '255.255.255.0', 'type': 3, 'metric': 10, 'toss': []},
+             {'id': '10.0.1.1', 'data': '10.0.1.2', 'type': 2, 'metric': 1,
+              'toss': [{'tos': 2, 'metric': 20}, {'tos': 4, 'metric': 0xffff}]},
+             {'id': '2.2.2.2', 'data': '10.0.2.1', 'type': 1, 'metric': 5, 'toss': []}]
+    encoded = operator.encode(0b101, links)
+    assert operator.get_len(PREFIX + encoded, len(PREFIX)) == len(encoded)
+    body = decode_at(operator, encoded, len(encoded) + 20)
+    assert (body.options, body.link_num) == (0b101, 3)
+    assert [(link.id, link.data, link.type, link.metric, [(tos.tos, tos.metric) for tos in link.toss])
+            for link in body.links] == [(link['id'], link['data'], link['type'], link['metric'],
+                                         [(tos['tos'], tos['metric']) for tos in link['toss']]) for link in links]
+
+
+def network_body_round_trip(operator):
+    for routers in ([], ['1.1.1.1'], ['1.1.1.1', '2.2.2.2', '3.3.3.3']):
+        encoded = operator.encode('255.255.0.0', routers)
+        body = decode_at(operator, encoded, 20 + len(encoded))
+        assert (body.network_mask, body.attached_routers) == ('255.255.0.0', routers)
+
+
+def summary_body_round_trip(operator):
+    body = decode_at(operator, operator.encode('255.255.255.0', 0xffffff), 28)
+    assert (body.network_mask, body.metric) == ('255.255.255.0', 0xffffff)
+
+
+def external_body_round_trip(operator):
+    encoded = operator.encode('255.0.0.0', 0x80, 20, '10.0.0.254', '0.0.0.7')
+    body = decode_at(operator, encoded, 20 + len(encoded))
+    assert (body.network_mask, body.options, body.metric, body.forwarding_address, body.external_routing_tag) == \
+        ('255.0.0.0', 0x80, 20, '10.0.0.254', '0.0.0.7')
+
+
+LSA_BODY_ROUND_TRIPS = {1: router_body_round_trip,
+                        2: network_body_round_trip,
+                        3: summary_body_round_trip,
+                        4: summary_body_round_trip,
+                        5: external_body_round_trip}
+
+
+@pytest.mark.parametrize('type', sorted(LSA_BODY_ROUND_TRIPS))
+def test_lsa_body_round_trip(type):
+    LSA_BODY_ROUND_TRIPS[type](LSA_BODY_OPERATORS[type])
+
+
+def test_lsa_object_round_trip():
+    # LSA对象一次写入的报文与按字段解码的结果一致
+    router = make_lsa(7, seq=-3, link_num=4)
+    router.add_trans_network('10.0.1.1', '10.0.1.2', 1, None)
+    header = OSPFLSAHeaderOperator.shared().decode(router.packet)
+    assert (header.type, header.id, header.seq, header.length) == (1, router.id, -3, len(router))
+    body = LSA_BODY_OPERATORS[1].decode(router.packet, len(router), OSPFLSAHeaderOperator.shared().size)
+    assert [(link.id, link.data, link.type, link.metric) for link in body.links] == \
+        [(link.id, link.data, link.type, link.metric) for link in router.links]
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from OSPFData import OSPFHeaderOperator, OSPFLSAckOperator
+from STATIC import OSPFInterfaceState, OSPFPacketType, ALLDRoutersIP, ALLSPFRouterIP
+from conftest import NEIGHBOUR_IP, lazy_lsas, make_interface, make_lsa
+from dispatcher import handle_lsu_packet
+from flooding import ACK_DELAY, DelayedAcks
+from sender import IP_HEADER_LEN
+
+
+def acked_headers(sent_packet):
+    assert sent_packet.type == OSPFPacketType.LSA
+    return list(OSPFLSAckOperator.shared().decode(sent_packet.packet,
+                                                  IP_HEADER_LEN + OSPFHeaderOperator.shared().size).lsa_headers)
+
+
+def test_acks_wait_for_timer(timers, sent):
+    interface = make_interface()
+    for lsa in lazy_lsas([make_lsa(i) for i in range(3)]):
+        interface.delayed_acks.add(lsa)
+    assert sent == []
+    assert [timer.interval for timer in timers.active()] == [ACK_DELAY]  # 一个窗口只启动一个定时器
+    timers.fire()
+    assert len(sent) == 1
+    assert sent[0].destination == ALLDRoutersIP
+    assert len(acked_headers(sent[0])) == 3
+    assert interface.delayed_acks.headers == []
+
+
+def test_acks_flush_when_packet_is_full(timers, sent):
+    interface = make_interface(mtu=IP_HEADER_LEN + 24 + 2 * 20)  # 一个LSAck报文只能装2个LSA头
+    acks = interface.delayed_acks
+    assert acks.capacity() == 2
+    lsas = lazy_lsas([make_lsa(i) for i in range(3)])
+    acks.add(lsas[0])
+    acks.add(lsas[1])
+    assert len(sent) == 1 and len(acked_headers(sent[0])) == 2
+    assert not timers.active()  # 装满后立即发送，并取消等待中的定时器
+    acks.add(lsas[2])
+    timers.fire()
+    assert len(sent) == 2 and len(acked_headers(sent[1])) == 1
+    assert acks.packets == 2 and acks.acks == 3
+
+
+def test_dr_acks_to_all_spf_routers(timers, sent):
+    interface = make_interface(state=OSPFInterfaceState.DR)
+    interface.delayed_acks.add(lazy_lsas([make_lsa(1)])[0])
+    timers.fire()
+    assert sent[0].destination == ALLSPFRouterIP
+
+
+def test_delay_is_per_interface(timers, sent):
+    fast = DelayedAcks(make_interface(), 0.05)
+    slow = DelayedAcks(make_interface(), 0.5)
+    lsa = lazy_lsas([make_lsa(1)])[0]
+    fast.add(lsa)
+    slow.add(lsa)
+    assert sorted(timer.interval for timer in timers.active()) == [0.05, 0.5]
+    assert make_interface().delayed_acks.delay == ACK_DELAY
+
+
+def test_direct_ack_is_sent_immediately(timers, sent):
+    interface = make_interface()
+    lsas = lazy_lsas([make_lsa(i) for i in range(2)])
+    interface.delayed_acks.direct(lsas, NEIGHBOUR_IP)
+    assert len(sent) == 1 and sent[0].destination == NEIGHBOUR_IP
+    assert [header.id for header in acked_headers(sent[0])] == ['2.2.0.0', '2.2.0.1']
+    assert not timers.active()
+
+
+def test_duplicate_lsas_are_acked_directly(timers, sent):
+    interface = make_interface()
+    area = interface.area
+    installed = make_lsa(1)
+    area.add_lsa_to_area(installed, None)
+    timers.fire()  # 泛洪窗口
+    sent.clear()
+    duplicate, new = lazy_lsas([installed, make_lsa(2)])
+    handle_lsu_packet(area, SimpleNamespace(sourceIP=NEIGHBOUR_IP), None, [duplicate, new], interface)
+    assert len(sent) == 1 and sent[0].destination == NEIGHBOUR_IP  # 重复的LSA立即直接确认
+    assert [header.id for header in acked_headers(sent[0])] == [installed.id]
+    assert len(interface.delayed_acks.headers) == 1  # 新的LSA延迟确认
+    assert area.get_lsa_by_ident(new.header) is not None
@@ -0,0 +1,65 @@
+from OSPFData import OSPFLSUOperator, OSPFHeaderOperator
+from STATIC import OSPFPacketType
+from conftest import make_lsa
+from flooding import LSUPacker, pack_lsas
+from sender import IP_HEADER_LEN
+
+SOURCE_IP = '10.0.0.1'
+DESTINATION_IP = '224.0.0.5'
+
+
+def sent_lsas(sent_packet):
+    return OSPFLSUOperator.shared().decode(sent_packet.packet, IP_HEADER_LEN + OSPFHeaderOperator.shared().size).lsas
+
+
+def queue_all(packer, lsas, mtu=1500):
+    for lsa in lsas:
+        packer.queue(SOURCE_IP, DESTINATION_IP, '1.1.1.1', '0.0.0.0', mtu, lsa)
+
+
+def test_pack_lsas_respects_mtu():
+    lsas = [make_lsa(i, link_num=i % 17) for i in range(200)]
+    batches = list(pack_lsas(lsas, 1500))
+    assert [lsa for batch in batches for lsa in batch] == lsas
+    for batch in batches:
+        assert 20 + 24 + 4 + sum(len(lsa) for lsa in batch) <= 1500
+
+
+def test_lsa_larger_than_mtu_is_sent_alone():
+    big = make_lsa(1, link_num=200)  # 2424字节
+    lsas = [make_lsa(0), big, make_lsa(2)]
+    assert list(pack_lsas(lsas, 1500)) == [[lsas[0]], [big], [lsas[2]]]
+
+
+def test_packer_waits_for_pacing_timer(timers, sent):
+    packer = LSUPacker()
+    lsas = [make_lsa(i, link_num=5) for i in range(40)]
+    queue_all(packer, lsas)
+    assert sent == []
+    assert len(timers.active(packer.flush)) == 1  # 同一目的地址只启动一个定时器
+    timers.fire(packer.flush)
+    assert not packer.pending
+    assert all(packet.type == OSPFPacketType.LSU for packet in sent)
+    assert all(len(packet.packet) <= 1500 for packet in sent)
+    assert sum(len(sent_lsas(packet)) for packet in sent) == 40
+    assert len(sent) == len(list(pack_lsas(lsas, 1500)))
+    assert packer.packets == len(sent) and packer.lsas == 40
+
+
+def test_duplicate_lsas_in_window_collapse(timers, sent):
+    packer = LSUPacker()
+    old = make_lsa(1, seq=1)
+    queue_all(packer, [old, make_lsa(2), old, make_lsa(1, seq=2)])
+    timers.fire(packer.flush)
+    lsas = [lsa for packet in sent for lsa in sent_lsas(packet)]
+    assert sorted((lsa.header.id, lsa.header.seq) for lsa in lsas) == [('2.2.0.1', 2), ('2.2.0.2', 1)]
+
+
+def test_destinations_are_packed_separately(timers, sent):
+    packer = LSUPacker()
+    packer.queue(SOURCE_IP, DESTINATION_IP, '1.1.1.1', '0.0.0.0', 1500, make_lsa(1))
+    packer.queue(SOURCE_IP, '10.0.0.2', '1.1.1.1', '0.0.0.0', 1500, make_lsa(1))
+    assert len(timers.active(packer.flush)) == 2
+    timers.fire(packer.flush)
+    assert sorted(packet.destination for packet in sent) == ['10.0.0.2', DESTINATION_IP]
+    assert 'pending destinations 0' in packer.stats_text()
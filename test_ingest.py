@@ -0,0 +1,120 @@
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+import ingest
+from ingest import BatchReceiver
+from runtime import InterfaceIO
+
+
+@pytest.fixture
+def pair():
+    # 数据报套接字对，recvmmsg与recv_into的用法与协议号89的原始套接字相同
+    receiver, sender = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    receiver.setblocking(False)
+    yield receiver, sender
+    receiver.close()
+    sender.close()
+
+
+@pytest.fixture(params=['recvmmsg', 'recv_into'])
+def receiver_of(request, monkeypatch):
+    if request.param == 'recvmmsg':
+        if ingest._recvmmsg is None:
+            pytest.skip('recvmmsg is not available')
+    else:
+        monkeypatch.setattr(ingest, '_recvmmsg', None)
+    return lambda sock: BatchReceiver(sock, batch_size=4, buffer_size=64)
+
+
+def receive_all(receiver):
+    packets = []
+    while True:
+        try:
+            packets += [bytes(view) for view in receiver.receive()]
+        except BlockingIOError:
+            return packets
+
+
+def test_batches_share_one_buffer(pair):
+    if ingest._recvmmsg is None:
+        pytest.skip('recvmmsg is not available')
+    sock, peer = pair
+    receiver = BatchReceiver(sock, batch_size=4, buffer_size=64)
+    for i in range(6):
+        peer.send(bytes([i]) * (i + 1))
+    first = receiver.receive()
+    assert [bytes(view) for view in first] == [bytes([i]) * (i + 1) for i in range(4)]  # 一次系统调用收取一批
+    assert all(view.obj is first[0].obj for view in first)
+    kept = [bytes(view) for view in first]
+    second = receiver.receive()
+    assert [bytes(view) for view in second] == [b'\x04' * 5, b'\x05' * 6]
+    # 缓冲区被下一批复用：之前返回的memoryview内容已经改变，拷贝出来的报文不受影响
+    assert bytes(first[0]) == b'\x04'
+    assert kept == [bytes([i]) * (i + 1) for i in range(4)]
+
+
+def test_receive_all_packets(pair, receiver_of):
+    sock, peer = pair
+    receiver = receiver_of(sock)
+    packets = [bytes([i]) * (10 + i) for i in range(10)]
+    for packet in packets:
+        peer.send(packet)
+    assert receive_all(receiver) == packets
+
+
+def test_empty_socket_raises_blocking_io_error(pair, receiver_of):
+    with pytest.raises(BlockingIOError):
+        receiver_of(pair[0]).receive()
+
+
+def test_fallback_receives_one_packet_per_call(pair, monkeypatch):
+    monkeypatch.setattr(ingest, '_recvmmsg', None)
+    sock, peer = pair
+    receiver = BatchReceiver(sock, batch_size=32, buffer_size=64)
+    assert receiver.batch_size == 1
+    peer.send(b'first')
+    peer.send(b'second')
+    assert [bytes(view) for view in receiver.receive()] == [b'first']
+    assert [bytes(view) for view in receiver.receive()] == [b'second']
+
+
+def test_oversized_packet_is_truncated_to_buffer(pair, receiver_of):
+    sock, peer = pair
+    peer.send(b'x' * 100)
+    assert receive_all(receiver_of(sock)) == [b'x' * 64]
+
+
+class RecordingStage:
+    def __init__(self):
+        self.items = []
+        self.capacity = 1024
+
+    @property
+    def depth(self):
+        return len(self.items)
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def test_queued_payloads_survive_next_batch(pair, receiver_of):
+    # 接收循环在报文进入解码队列前拷贝，下一批报文复用缓冲区后队列中的报文仍然有效
+    sock, peer = pair
+    io = InterfaceIO.__new__(InterfaceIO)
+    io.runtime = SimpleNamespace(decode_stage=RecordingStage(), capture=None)
+    io.receiver = receiver_of(sock)
+    io.received = 0
+    io.paused = False
+    packets = [bytes([i]) * (20 + i) for i in range(8)]
+    for packet in packets[:4]:
+        peer.send(packet)
+    while io.received < 4:
+        io.on_readable()
+    for packet in packets[4:]:
+        peer.send(packet)
+    while io.received < 8:
+        io.on_readable()
+    assert [data for _, data in io.runtime.decode_stage.items] == packets
+    assert all(isinstance(data, bytes) for _, data in io.runtime.decode_stage.items)
@@ -0,0 +1,65 @@
+import sender
+from OSPFRole.neighbour import Neighbor
+from OSPFData import OSPFHelloOperator, OSPFHeaderOperator
+from STATIC import OSPFNeighbourState
+from conftest import NEIGHBOUR_IP, make_interface
+from sender import IP_HEADER_LEN
+
+
+def hello_neighbours(sent_packet):
+    return list(OSPFHelloOperator.shared().decode(sent_packet.packet,
+                                                  IP_HEADER_LEN + OSPFHeaderOperator.shared().size).neighbours)
+
+
+def test_hello_template_is_copied_on_send(timers, monkeypatch):
+    handed = []
+    monkeypatch.setattr(sender, 'packet_writer', lambda packet, source, destination: handed.append(packet) or True)
+    interface = make_interface()
+    interface.hello_timer_callback()
+    template = interface.hello_template
+    interface.hello_timer_callback()
+    assert interface.hello_template is template  # 内容不变时复用模板
+    assert all(packet is not template for packet in handed)
+    first, second = handed
+    assert first[4:6] != second[4:6]  # 每次只有IP标识不同，之前发出的报文不会被改写
+    assert first[6:] == second[6:]
+
+
+def test_hello_lists_only_live_neighbours(timers, sent):
+    interface = make_interface()
+    neighbour = Neighbor('2.2.2.2', NEIGHBOUR_IP, interface, 2)
+    interface.neighbours.append(neighbour)
+    interface.hello_timer_callback()
+    assert hello_neighbours(sent[-1]) == []  # Down状态的邻居不列出
+    neighbour.STATE = OSPFNeighbourState.INIT
+    assert interface.hello_template is None
+    interface.hello_timer_callback()
+    assert hello_neighbours(sent[-1]) == ['2.2.2.2']
+    neighbour.inactive_timer_callback()  # RouterDeadInterval内没有收到hello
+    assert interface.hello_template is None
+    interface.hello_timer_callback()
+    assert hello_neighbours(sent[-1]) == []
+
+
+def test_neighbour_router_id_change_rebuilds_hello(timers, sent):
+    interface = make_interface()
+    neighbour = Neighbor('2.2.2.2', NEIGHBOUR_IP, interface, 2)
+    neighbour.STATE = OSPFNeighbourState.TWOWAY
+    interface.neighbours.append(neighbour)
+    interface.hello_timer_callback()
+    neighbour.router_id = '3.3.3.3'
+    interface.hello_timer_callback()
+    assert hello_neighbours(sent[-1]) == ['3.3.3.3']
+
+
+def test_address_change_rebuilds_hello(timers, sent):
+    interface = make_interface()
+    assert interface.hello_template is None
+    interface.hello_timer_callback()
+    assert sent[-1].source == interface.ip
+    interface.ip = '10.0.5.1'
+    interface.mask = '255.255.0.0'
+    assert interface.hello_template is None  # 接口地址变化后不再发送旧地址的hello
+    interface.hello_timer_callback()
+    hello = OSPFHelloOperator.shared().decode(sent[-1].packet, IP_HEADER_LEN + OSPFHeaderOperator.shared().size)
+    assert (sent[-1].ip_header.sourceIP, hello.network_mask) == ('10.0.5.1', '255.255.0.0')
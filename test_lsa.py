@@ -0,0 +1,56 @@
+import pytest
+
+from OSPFRole.LSA import *
+from checksum import fletcher16
+
+
+def make_router_lsa():
+    lsa = Router_LSA(0x02, '1.1.1.1', '1.1.1.1', -0x7fffffff, False, False, False)
+    lsa.add_stub_network('10.0.0.0', '255.255.255.0', 10, None)
+    lsa.add_trans_network('10.0.1.1', '10.0.1.2', 1, None)
+    return lsa
+
+
+def checksum_ok(packet):
+    # 把校验和字段清零后重新计算（不覆盖age），应与报文中的校验和相同
+    data = bytearray(packet)
+    OSPFLSAHeaderOperator.shared().pack_field_into(data, 0, 'checksum', 0)
+    header = OSPFLSAHeaderData(OSPFLSAHeaderOperator.shared().codec.unpack_from(packet))
+    return header.checksum == fletcher16(memoryview(data)[2:])
+
+
+def test_router_link_is_immutable():
+    lsa = make_router_lsa()
+    with pytest.raises(AttributeError):
+        lsa.links[0].metric = 20
+    with pytest.raises(AttributeError):
+        lsa.links[0].id = '10.0.2.0'
+
+
+def test_replacing_link_clears_cache():
+    lsa = make_router_lsa()
+    before = bytes(lsa.packet)
+    link = lsa.links[0]
+    lsa.links[0] = Router_link(link.type, link.data, link.id, 20, link.interface)
+    after = bytes(lsa.packet)
+    assert after != before
+    assert checksum_ok(after)
+
+
+def test_seq_change_reencodes_with_valid_checksum():
+    lsa = make_router_lsa()
+    lsa.packet
+    lsa.seq = -0x7ffffffe
+    packet = lsa.packet
+    header = OSPFLSAHeaderData(OSPFLSAHeaderOperator.shared().codec.unpack_from(packet))
+    assert header.seq == -0x7ffffffe
+    assert checksum_ok(packet)
+
+
+def test_cached_packet_matches_fresh_encode():
+    lsa = make_router_lsa()
+    lsa.packet
+    lsa.add_link(1, '10.0.3.1', '3.3.3.3', 5)
+    fresh = bytearray(len(lsa))
+    lsa.encode_into(fresh, 0)
+    assert bytes(lsa.packet)[2:] == bytes(fresh)[2:]
@@ -0,0 +1,82 @@
+import pytest
+
+import OSPFData
+from OSPFData import *
+from OSPFRole.LSA import *
+from OSPFRole.area import LSA_SEQ_UNKNOWN
+from conftest import lazy_lsas, make_lsa
+
+HEADER_SIZE = 20
+
+
+@pytest.fixture(params=['struct', 'numpy'])
+def columns(request, monkeypatch):
+    # 同一组用例分别在没有numpy（struct.iter_unpack）与有numpy（结构化数组）时运行
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(OSPFData, 'numpy', None)
+    return OSPFLSAHeaderColumns
+
+
+def header_bytes(lsas):
+    return b''.join(lsa.gen_packet_header() for lsa in lsas)
+
+
+def fields(header):
+    return header.type, header.id, header.advertising_router, header.seq, header.checksum, header.length
+
+
+def test_no_headers(columns):
+    headers = columns(b'', 0, 0)
+    assert len(headers) == 0
+    assert list(headers) == [] and headers.keys() == []
+    assert headers.newer_than([]) == []
+    dd = OSPFDDOperator.shared().decode(OSPFDDOperator.shared().encode(1500, 2, 7, 1))
+    assert len(dd.LSA_headers) == 0
+    assert len(OSPFLSAckOperator.shared().decode(b'').lsa_headers) == 0
+
+
+def test_trailing_partial_header_is_ignored(columns):
+    lsas = [make_lsa(i) for i in range(2)]
+    for extra in (1, HEADER_SIZE - 1):
+        data = OSPFDDOperator.shared().encode(1500, 2, 7, 1) + header_bytes(lsas) + b'\x01' * extra
+        headers = OSPFDDOperator.shared().decode(data).LSA_headers
+        assert len(headers) == 2
+        assert headers.keys() == [lsa_key(lsa) for lsa in lsas]
+        with pytest.raises(IndexError):
+            headers[2]
+        lsack = OSPFLSAckOperator.shared().decode(header_bytes(lsas) + b'\x01' * extra)
+        assert [fields(header) for header in lsack.lsa_headers] == [fields(header) for header in headers]
+
+
+@pytest.mark.parametrize('offset', [1, 3, 7, 21])
+def test_odd_offsets(columns, offset):
+    lsas = [make_lsa(i, seq=-0x7fffffff + i, link_num=i) for i in range(5)]
+    data = memoryview(b'\xff' * offset + header_bytes(lsas) + b'\xff' * 3)
+    headers = columns(data, offset, len(lsas))
+    assert headers.keys() == [lsa_key(lsa) for lsa in lsas]
+    assert [fields(header) for header in headers.headers([4, 0])] == \
+        [(lsa.type, lsa.id, lsa.advertising_router, lsa.seq, lsa.checksum, len(lsa)) for lsa in (lsas[4], lsas[0])]
+    assert list(headers.seq) == [lsa.seq for lsa in lsas]
+
+
+def test_newer_than(columns):
+    lsas = [make_lsa(i, seq=seq) for i, seq in enumerate((-0x7fffffff, 5, 5, 5, 0x7fffffff))]
+    headers = columns(header_bytes(lsas), 0, len(lsas))
+    assert headers.newer_than([LSA_SEQ_UNKNOWN] * len(lsas)) == [0, 1, 2, 3, 4]  # LSDB中没有的LSA总是更新
+    assert headers.newer_than([-0x7fffffff, 4, 5, 6, LSA_SEQ_UNKNOWN]) == [1, 4]
+    assert headers.newer_than([seq for seq in headers.seq]) == []
+
+
+def test_lazy_data_matches_eager_decode():
+    router = make_lsa(1, link_num=4)
+    router.add_trans_network('10.0.1.1', '10.0.1.2', 1, None)
+    network = Network_LSA(2, '10.0.1.1', '1.1.1.1', 5, '255.255.255.0', ['1.1.1.1', '2.2.2.2', '3.3.3.3'])
+    for lsa, lazy in zip((router, network), lazy_lsas([router, network])):
+        assert lazy._data is None  # 解码LSU时只解码LSA头
+        eager = LSA_BODY_OPERATORS[lsa.type].decode(bytes(lsa.packet), len(lsa), HEADER_SIZE)
+        assert repr(lazy.data) == repr(eager)
+        assert lazy.data is lazy.data  # 只解码一次
+        assert bytes(lazy.raw) == bytes(lsa.packet)
+        assert bytes(decode_lsa(lazy).packet)[2:] == bytes(lsa.packet)[2:]
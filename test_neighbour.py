@@ -0,0 +1,171 @@
+from types import SimpleNamespace
+
+from OSPFData import OSPFDDOperator, OSPFHeaderOperator, OSPFLSRLSAIdentOperator, OSPFLSROperator, OSPFLSUOperator, lsa_key
+from OSPFRole.neighbour import LSR_WINDOW, Neighbor
+from STATIC import ALLSPFRouterIP, OSPFDDOptionMask, OSPFInterfaceState, OSPFNeighbourState, OSPFPacketType, \
+    OSPFRejectReason
+from conftest import NEIGHBOUR_ID, NEIGHBOUR_IP, lazy_lsas, make_interface, make_lsa
+from dispatcher import handle_lsu_packet
+from sender import IP_HEADER_LEN, OSPF_BODY_OFFSET, build_dd_packet, build_lsu_packet
+
+
+def make_neighbour(timers, mtu=1500, lsas=()):
+    interface = make_interface(mtu=mtu, state=OSPFInterfaceState.DR)
+    interface.area.router_lsa.extend(lsas)
+    neighbour = Neighbor(NEIGHBOUR_ID, NEIGHBOUR_IP, interface, 2)
+    interface.neighbours.append(neighbour)
+    neighbour.retrans_timer = timers(interface.retrans_interval, lambda: None)
+    return neighbour
+
+
+def dd_of(sent_packet):
+    assert sent_packet.type == OSPFPacketType.DD
+    return OSPFDDOperator.shared().decode(sent_packet.packet, IP_HEADER_LEN + OSPFHeaderOperator.shared().size)
+
+
+def requested_ids(sent_packet):
+    assert sent_packet.type == OSPFPacketType.LSR
+    idents = OSPFLSROperator.shared().decode(sent_packet.packet, IP_HEADER_LEN + OSPFHeaderOperator.shared().size).lsa_idents
+    return [ident.id for ident in idents]
+
+
+def dd_headers(lsas):
+    # 与接收路径相同：邻居DD报文中按列解码的LSA头
+    packet = build_dd_packet(NEIGHBOUR_IP, '10.0.0.1', NEIGHBOUR_ID, '0.0.0.0', 1500, 2, 0, 1, lsas)
+    return OSPFDDOperator.shared().decode(bytes(packet), IP_HEADER_LEN + OSPFHeaderOperator.shared().size).LSA_headers
+
+
+def start_loading(timers, lsas, lsr_capacity=2):
+    mtu = OSPF_BODY_OFFSET + lsr_capacity * OSPFLSRLSAIdentOperator.shared().size
+    neighbour = make_neighbour(timers, mtu=mtu)
+    assert neighbour.lsr_capacity() == lsr_capacity
+    neighbour.event_negotiation_done()
+    neighbour.add_requests(dd_headers(lsas))
+    neighbour.event_exchange_done()
+    return neighbour
+
+
+def test_dd_summary_is_a_snapshot(timers, sent):
+    mtu = OSPF_BODY_OFFSET + OSPFDDOperator.shared().size + 2 * 20  # 每个DD装2个LSA头
+    neighbour = make_neighbour(timers, mtu=mtu, lsas=[make_lsa(i) for i in range(5)])
+    assert neighbour.dd_capacity() == 2
+    neighbour.isMaster = False
+    neighbour.event_negotiation_done()
+    neighbour.interface.area.router_lsa.append(make_lsa(9))  # Exchange过程中LSDB列表被原地修改
+    dds = []
+    while not dds or dds[-1].DD_options & OSPFDDOptionMask.M:
+        neighbour.send_dd_in_exchange()
+        dds.append(dd_of(sent[-1]))
+        assert len(dds) <= 3
+    assert [len(dd.LSA_headers) for dd in dds] == [2, 2, 1]
+    assert neighbour.database_summary_remaining == 0
+
+
+def test_lsr_window_refills_after_half_is_answered(timers, sent):
+    lsas = [make_lsa(i) for i in range(20)]
+    neighbour = start_loading(timers, lsas)
+    assert neighbour.STATE == OSPFNeighbourState.LOADING
+    window = LSR_WINDOW * neighbour.lsr_capacity()
+    assert len(sent) == LSR_WINDOW  # 每个LSR报文按MTU装满，窗口内的报文一次发出
+    assert [i for packet in sent for i in requested_ids(packet)] == [lsa.id for lsa in lsas[:window]]
+    sent.clear()
+    neighbour.receive_lsu_headers(lsas[:window // 2 - 1])
+    assert sent == []  # 未达到一半，不继续请求
+    neighbour.receive_lsu_headers(lsas[window // 2 - 1:window // 2])
+    assert [i for packet in sent for i in requested_ids(packet)] == [lsa.id for lsa in lsas[window:window + window // 2]]
+    assert len(neighbour.lsr_outstanding) == window
+
+
+def test_flooded_lsas_are_not_requested(timers, sent):
+    lsas = [make_lsa(i) for i in range(12)]
+    neighbour = start_loading(timers, lsas)
+    window = LSR_WINDOW * neighbour.lsr_capacity()
+    sent.clear()
+    neighbour.receive_lsu_headers(lsas[window:])  # 还没请求的LSA先通过泛洪收到
+    neighbour.receive_lsu_headers(lsas[:window // 2])
+    assert sent == []
+    assert neighbour.STATE == OSPFNeighbourState.LOADING
+
+
+def test_loading_done_when_request_list_empties(timers, sent):
+    lsas = [make_lsa(i) for i in range(3)]
+    neighbour = start_loading(timers, lsas)
+    assert len(timers.active(neighbour.lsr_resend_callback)) == 1
+    neighbour.receive_lsu_headers([make_lsa(0, seq=0)])  # 比请求的实例旧，不能从列表中删除
+    assert neighbour.STATE == OSPFNeighbourState.LOADING
+    neighbour.receive_lsu_headers(lsas)
+    assert neighbour.STATE == OSPFNeighbourState.FULL
+    assert not neighbour.request_needed_lsas and not neighbour.lsr_outstanding
+    assert not timers.active(neighbour.lsr_resend_callback)
+
+
+def test_exchange_done_without_requests_goes_full(timers, sent):
+    neighbour = start_loading(timers, [])
+    assert neighbour.STATE == OSPFNeighbourState.FULL
+    assert not [packet for packet in sent if packet.type == OSPFPacketType.LSR]
+    assert not timers.active(neighbour.lsr_resend_callback)
+
+
+def test_lsr_retransmitted_on_timer_expiry(timers, sent):
+    lsas = [make_lsa(i) for i in range(5)]
+    neighbour = start_loading(timers, lsas)
+    neighbour.receive_lsu_headers(lsas[:2])
+    assert neighbour.STATE == OSPFNeighbourState.LOADING
+    sent.clear()
+    [timer] = timers.active(neighbour.lsr_resend_callback)
+    assert timer.interval == neighbour.interface.retrans_interval
+    timer.fire()
+    assert [i for packet in sent for i in requested_ids(packet)] == [lsa.id for lsa in lsas[2:]]  # 只重传未应答的请求
+    assert len(timers.active(neighbour.lsr_resend_callback)) == 1
+    neighbour.receive_lsu_headers(lsas[2:])
+    assert neighbour.STATE == OSPFNeighbourState.FULL
+    sent.clear()
+    assert timers.fire(neighbour.lsr_resend_callback) == 0
+    assert sent == []
+
+
+def receive_lsu(neighbour, lsas):
+    interface = neighbour.interface
+    handle_lsu_packet(interface.area, SimpleNamespace(sourceIP=NEIGHBOUR_IP), None, lsas, interface)
+
+
+def test_bad_checksum_lsa_does_not_answer_request(timers, sent):
+    lsas = [make_lsa(i) for i in range(2)]
+    neighbour = start_loading(timers, lsas)
+    receive_lsu(neighbour, lazy_lsas(lsas[:1]))
+    packet = build_lsu_packet(NEIGHBOUR_IP, ALLSPFRouterIP, NEIGHBOUR_ID, '0.0.0.0', lsas[1:])
+    packet[-1] ^= 0xff  # 损坏LSA体，LSA头（类型、ID、序号）仍与请求的实例相同
+    [corrupted] = OSPFLSUOperator.shared().decode(memoryview(bytes(packet)),
+                                                  IP_HEADER_LEN + OSPFHeaderOperator.shared().size).lsas
+    assert corrupted.header.seq == lsas[1].seq
+    receive_lsu(neighbour, [corrupted])
+    assert neighbour.STATE == OSPFNeighbourState.LOADING
+    assert list(neighbour.request_needed_lsas) == [lsa_key(lsas[1])]
+    assert neighbour.interface.area.get_lsa_by_ident(corrupted.header) is None
+    receive_lsu(neighbour, lazy_lsas(lsas[1:]))
+    assert neighbour.STATE == OSPFNeighbourState.FULL
+
+
+def receive_dd(neighbour, mtu, dd_options, seq):
+    dd = OSPFDDOperator.shared().decode(OSPFDDOperator.shared().encode(mtu, 2, dd_options, seq))
+    neighbour.receive_dd_packet(None, None, dd, dd.LSA_headers)
+
+
+def test_larger_mtu_rejected_in_exstart(timers, sent):
+    neighbour = make_neighbour(timers)
+    neighbour.STATE = OSPFNeighbourState.EXSTART
+    initial = OSPFDDOptionMask.I | OSPFDDOptionMask.M | OSPFDDOptionMask.MS
+    receive_dd(neighbour, 9000, initial, 77)
+    assert neighbour.interface.validator.rejected[OSPFRejectReason.MTU_MISMATCH] == 1
+    assert neighbour.STATE == OSPFNeighbourState.EXSTART
+    receive_dd(neighbour, 1500, initial, 77)
+    assert neighbour.STATE == OSPFNeighbourState.EXCHANGE and neighbour.isMaster
+
+
+def test_mtu_not_checked_after_exchange(timers, sent):
+    neighbour = start_loading(timers, [])
+    assert neighbour.STATE == OSPFNeighbourState.FULL
+    neighbour.isMaster = False
+    receive_dd(neighbour, 9000, 0, neighbour.dd_seq)  # 从路由器重复的最后一个DD
+    assert neighbour.interface.validator.rejected[OSPFRejectReason.MTU_MISMATCH] == 0
+    assert neighbour.STATE == OSPFNeighbourState.FULL
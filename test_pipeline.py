@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import Stage, PriorityStage
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+class ManualLoop:
+    # 只实现call_soon，由测试逐轮执行回调，便于检查每一批处理了哪些项
+    def __init__(self):
+        self.ready = []
+
+    def call_soon(self, callback, *args):
+        self.ready.append((callback, args))
+
+    def run_once(self):
+        ready, self.ready = self.ready, []
+        for callback, args in ready:
+            callback(*args)
+
+    def run_all(self):
+        while self.ready:
+            self.run_once()
+
+
+def run_once(loop):
+    # 执行一轮事件循环中已经就绪的回调
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def drain(loop, stage, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not stage.idle:
+        assert time.monotonic() < deadline, 'stage did not become idle'
+        loop.run_until_complete(asyncio.sleep(0.001))
+
+
+def test_bounded_queue_drops_when_full(loop):
+    handled = []
+    stage = Stage('test', handled.append, loop, capacity=2)
+    assert stage.put(1)
+    assert stage.put(2)
+    assert not stage.put(3)
+    assert stage.dropped == 1 and stage.depth == 2
+    drain(loop, stage)
+    assert handled == [1, 2]
+    assert stage.put(4)  # 处理之后又有空间
+    drain(loop, stage)
+    assert handled == [1, 2, 4] and stage.processed == 3
+
+
+def test_coalesce_keeps_only_newest(loop):
+    handled = []
+    stage = Stage('route', handled.append, loop, coalesce=True)
+    for item in range(5):
+        assert stage.put(item)
+    assert stage.depth == 1 and stage.coalesced == 4
+    drain(loop, stage)
+    assert handled == [4]
+
+
+def test_batches_keep_order_and_yield_between_batches():
+    loop = ManualLoop()
+    handled = []
+    depths = []
+    stage = Stage('decode', handled.append, loop, batch_size=2)
+    stage.listeners.append(lambda s: depths.append(s.depth))
+    for item in range(5):
+        stage.put(item)
+    assert len(loop.ready) == 1  # 多次put只调度一次
+    loop.run_once()
+    assert handled == [0, 1]  # 每批最多batch_size项，之后让出事件循环
+    loop.run_all()
+    assert stage.idle
+    assert handled == [0, 1, 2, 3, 4]
+    assert depths == [3, 1, 0]  # 每批之后通知上游（反压）
+
+
+def test_handler_error_does_not_stop_stage(loop):
+    handled = []
+
+    def handler(item):
+        if item == 1:
+            raise ValueError('bad item')
+        handled.append(item)
+    stage = Stage('protocol', handler, loop)
+    for item in range(3):
+        stage.put(item)
+    drain(loop, stage)
+    assert handled == [0, 2]
+    assert stage.errors == 1 and stage.processed == 3
+
+
+def test_executor_handoff_runs_one_item_at_a_time_off_loop(loop):
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+    handled = []
+    threads = set()
+
+    def handler(item):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.005)
+        threads.add(threading.get_ident())
+        handled.append(item)
+        with lock:
+            running[0] -= 1
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        stage = Stage('fib', handler, loop, executor=executor)
+        for item in range(4):
+            stage.put(item)
+        run_once(loop)
+        assert not stage.idle  # 处理函数在线程池中执行时stage仍然忙
+        drain(loop, stage)
+    assert handled == [0, 1, 2, 3]
+    assert max_running[0] == 1
+    assert threading.get_ident() not in threads
+
+
+def test_executor_stage_with_coalesce_skips_stale_items(loop):
+    handled = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(item):
+        started.set()
+        release.wait(1)
+        handled.append(item)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stage = Stage('fib', handler, loop, coalesce=True, executor=executor)
+        stage.put(0)
+        run_once(loop)
+        assert started.wait(1)
+        for item in range(1, 4):  # 处理第一项时到达的路由表只保留最新的
+            stage.put(item)
+        release.set()
+        drain(loop, stage)
+    assert handled == [0, 3]
+
+
+def test_priority_stage_weighted_order(loop):
+    handled = []
+    classes = [('high', 2, 8), ('low', 1, 8)]
+    stage = PriorityStage('protocol', handled.append, loop, classes, lambda item: 0 if item[0] == 'h' else 1)
+    for item in ('l1', 'l2', 'l3', 'h1', 'h2', 'h3'):
+        stage.put(item)
+    drain(loop, stage)
+    assert handled == ['h1', 'h2', 'l1', 'h3', 'l2', 'l3']
+    assert stage.class_processed == [3, 3]
+
+
+def test_priority_stage_drops_per_class(loop):
+    stage = PriorityStage('protocol', lambda item: None, loop, [('high', 1, 1), ('low', 1, 2)],
+                          lambda item: item)
+    assert stage.put(0)
+    assert not stage.put(0)
+    assert stage.put(1) and stage.put(1)
+    assert not stage.put(1)
+    assert stage.class_dropped == [1, 1] and stage.dropped == 2
+    drain(loop, stage)
+    assert stage.class_processed == [1, 2]
+
+
+def test_priority_stage_batch_budget():
+    loop = ManualLoop()
+    handled = []
+    stage = PriorityStage('protocol', handled.append, loop, [('high', 2, 16), ('low', 1, 16)],
+                          lambda item: item % 2, batch_size=4)
+    for item in range(8):
+        stage.put(item)
+    loop.run_once()
+    assert handled == [0, 2, 1, 4]  # 一批最多batch_size项，按权重轮流取
+    loop.run_all()
+    assert handled == [0, 2, 1, 4, 6, 3, 5, 7]
+    assert stage.idle
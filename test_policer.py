@@ -0,0 +1,137 @@
+import pytest
+
+import policer
+from OSPFRole.neighbour import Neighbor
+from STATIC import OSPFNeighbourState, OSPFPacketType
+from conftest import NEIGHBOUR_ID, NEIGHBOUR_IP, make_interface
+from dispatcher import decode_packet
+from policer import DEFAULT_LIMITS, Policer, TokenBucket, parse_limits
+from sender import build_hello_packet
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(policer.time, 'monotonic', clock)
+    return clock
+
+
+def allowed(p, source, type, count):
+    return sum(p.allow(source, type) for _ in range(count))
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=5, burst=10, now=0.0)
+    assert sum(bucket.consume(0.0) for _ in range(15)) == 10
+    assert bucket.dropped == 5
+    assert sum(bucket.consume(1.0) for _ in range(10)) == 5  # 1秒补充5个令牌
+    assert sum(bucket.consume(100.0) for _ in range(20)) == 10  # 不超过burst
+
+
+def test_per_source_limit(clock):
+    p = Policer({OSPFPacketType.HELLO: (5, 10)})
+    assert allowed(p, '10.0.0.2', OSPFPacketType.HELLO, 20) == 10
+    assert allowed(p, '10.0.0.3', OSPFPacketType.HELLO, 10) == 10  # 其他来源不受影响
+    clock.now += 1
+    assert allowed(p, '10.0.0.2', OSPFPacketType.HELLO, 20) == 5
+    assert p.dropped[OSPFPacketType.HELLO] == 25
+
+
+def test_default_hello_limit_tolerates_flapping_neighbour(clock):
+    # 邻居反复重启时hello间隔可能缩短到1秒以内，默认值仍然留有余量
+    p = Policer()
+    for _ in range(60):
+        assert allowed(p, '10.0.0.2', OSPFPacketType.HELLO, 4) == 4
+        clock.now += 1
+
+
+def test_aggregate_limit_across_sources(clock):
+    p = Policer({OSPFPacketType.LSR: (10, 10)})
+    passed = sum(allowed(p, f'10.0.{i >> 8}.{i & 0xff}', OSPFPacketType.LSR, 10) for i in range(20))
+    assert passed == 10 * policer.AGGREGATE_FACTOR  # 每个来源都未超速，但总数受共用令牌桶限制
+    bucket = p.buckets[('10.0.0.19', OSPFPacketType.LSR)]
+    assert bucket.passed == 0 and bucket.dropped == 10
+
+
+def test_known_source_bypasses_aggregate(clock):
+    p = Policer({OSPFPacketType.HELLO: (5, 10)})
+    known = {'10.0.0.2'}.__contains__
+    flood = sum(allowed(p, f'10.1.{i >> 8}.{i & 0xff}', OSPFPacketType.HELLO, 10) for i in range(100))
+    assert flood == 10 * policer.AGGREGATE_FACTOR
+    assert not p.allow('10.0.0.3', OSPFPacketType.HELLO, known)  # 共用令牌桶已经耗尽
+    assert sum(p.allow('10.0.0.2', OSPFPacketType.HELLO, known) for _ in range(20)) == 10  # 仍受自己的令牌桶限制
+    assert p.aggregate[OSPFPacketType.HELLO].passed == 10 * policer.AGGREGATE_FACTOR
+
+
+def hello_from(source, router_id):
+    packet = build_hello_packet(source, '224.0.0.5', router_id, '0.0.0.0', '255.255.255.0', 10, 2, 1, 40,
+                                '0.0.0.0', '0.0.0.0', [])
+    packet[2:4] = len(packet).to_bytes(2, 'big')  # IP总长度由内核在发送时填写
+    return memoryview(bytes(packet))
+
+
+def test_spoofed_hello_flood_does_not_drop_neighbour_hellos(clock, timers):
+    interface = make_interface()
+    neighbour = Neighbor(NEIGHBOUR_ID, NEIGHBOUR_IP, interface, 2)
+    interface.neighbours.append(neighbour)
+    neighbour.STATE = OSPFNeighbourState.TWOWAY
+    area = interface.area
+    for i in range(200):
+        for _ in range(5):
+            decode_packet(area, interface, hello_from(f'10.0.{1 + (i >> 8)}.{i & 0xff}', f'3.3.3.{i & 0xff}'))
+    assert interface.policer.aggregate[OSPFPacketType.HELLO].tokens < 1
+    assert decode_packet(area, interface, hello_from('10.0.0.99', '3.3.3.99')) is None  # 新的来源被共用令牌桶限制
+    for _ in range(3):
+        clock.now += 10
+        assert decode_packet(area, interface, hello_from(NEIGHBOUR_IP, NEIGHBOUR_ID)) is not None
+    neighbour.STATE = OSPFNeighbourState.INIT  # 还没有建立双向通信的邻居与未知来源相同
+    clock.now += 10
+    for i in range(200):
+        decode_packet(area, interface, hello_from(f'10.0.{1 + (i >> 8)}.{i & 0xff}', f'3.3.3.{i & 0xff}'))
+    assert decode_packet(area, interface, hello_from(NEIGHBOUR_IP, NEIGHBOUR_ID)) is None
+
+
+def test_unlimited_type_is_allowed(clock):
+    p = Policer({OSPFPacketType.HELLO: (1, 1)})
+    assert allowed(p, '10.0.0.2', OSPFPacketType.LSU, 100) == 100
+
+
+def test_lru_eviction(clock):
+    p = Policer({OSPFPacketType.HELLO: (1, 1)}, max_sources=3)
+    for source in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        assert p.allow(source, OSPFPacketType.HELLO)
+    assert not p.allow('10.0.0.1', OSPFPacketType.HELLO)  # 10.0.0.1变为最近使用
+    assert p.allow('10.0.0.4', OSPFPacketType.HELLO)  # 淘汰最久没有报文的10.0.0.2
+    assert len(p.buckets) == 3
+    assert ('10.0.0.2', OSPFPacketType.HELLO) not in p.buckets
+    assert ('10.0.0.1', OSPFPacketType.HELLO) in p.buckets
+    assert p.allow('10.0.0.2', OSPFPacketType.HELLO)  # 被淘汰的来源重新得到一个满的令牌桶
+
+
+def test_default_lru_capacity(clock):
+    p = Policer()
+    for i in range(policer.MAX_SOURCES + 10):
+        p.allow(f'10.{i >> 16}.{(i >> 8) & 0xff}.{i & 0xff}', OSPFPacketType.HELLO)
+    assert len(p.buckets) == policer.MAX_SOURCES == 4096
+
+
+def test_parse_limits_defaults_and_overrides():
+    assert parse_limits(None) == DEFAULT_LIMITS
+    limits = parse_limits({'hello': [20, 40], 'lsack': (1, 2)})
+    assert limits[OSPFPacketType.HELLO] == (20, 40)
+    assert limits[OSPFPacketType.LSA] == (1, 2)
+    assert limits[OSPFPacketType.LSU] == DEFAULT_LIMITS[OSPFPacketType.LSU]
+    assert parse_limits({}) is not DEFAULT_LIMITS
+
+
+def test_parse_limits_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        parse_limits({'ospf': [1, 1]})
@@ -0,0 +1,174 @@
+import asyncio
+import errno
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import runtime
+from runtime import InterfaceIO, IORuntime, LoopTimer, Timer
+
+
+@pytest.fixture
+def rt(monkeypatch):
+    monkeypatch.setattr(runtime, '_active_runtime', None)  # IORuntime把自己登记为当前运行时，测试结束后恢复
+    rt = IORuntime(decode_handler=None, protocol_handler=None)
+    yield rt
+    rt.fib_executor.shutdown(wait=True)
+    rt.loop.close()
+
+
+def run_for(rt, seconds):
+    rt.loop.run_until_complete(asyncio.sleep(seconds))
+
+
+def in_thread(func):
+    thread = threading.Thread(target=func)
+    thread.start()
+    thread.join()
+
+
+def test_timer_uses_active_runtime(rt, monkeypatch):
+    assert isinstance(Timer(1, print), LoopTimer)
+    monkeypatch.setattr(runtime, '_active_runtime', None)
+    assert isinstance(Timer(1, print), threading.Timer)
+
+
+def test_loop_timer_fires_in_loop(rt):
+    fired = []
+    timer = LoopTimer(rt, 0.01, lambda *args, **kwargs: fired.append((args, kwargs, threading.get_ident())),
+                      args=[1, 2], kwargs={'k': 3})
+    timer.start()
+    run_for(rt, 0.05)
+    assert fired == [((1, 2), {'k': 3}, threading.get_ident())]
+
+
+def test_loop_timer_cancel_before_scheduled(rt):
+    fired = []
+    timer = LoopTimer(rt, 0.01, lambda: fired.append(1))
+    in_thread(timer.start)  # 其他线程启动：排队到事件循环中才真正调度
+    timer.cancel()
+    run_for(rt, 0.05)
+    assert fired == [] and timer._handle is None
+
+
+def test_loop_timer_cancel_after_scheduled(rt):
+    fired = []
+    timer = LoopTimer(rt, 0.02, lambda: fired.append(1))
+    timer.start()
+    assert timer._handle is not None
+    in_thread(timer.cancel)  # 其他线程取消：handle.cancel排队到事件循环中执行
+    run_for(rt, 0.05)
+    assert fired == [] and timer._handle.cancelled()
+
+
+def test_call_soon_from_loop_thread_runs_inline(rt):
+    calls = []
+    rt.call_soon(calls.append, 1)
+    assert calls == [1]
+
+
+def test_call_soon_from_other_thread_runs_in_loop(rt):
+    calls = []
+    in_thread(lambda: rt.call_soon(lambda value: calls.append((value, threading.get_ident())), 1))
+    assert calls == []
+    run_for(rt, 0)
+    assert calls == [(1, threading.get_ident())]
+
+
+class FakeLoop:
+    def __init__(self):
+        self.writers = {}
+
+    def add_writer(self, sock, callback):
+        self.writers[sock] = callback
+
+    def remove_writer(self, sock):
+        self.writers.pop(sock, None)
+
+
+class FakeSendSocket:
+    # sendto按脚本依次抛出异常；None表示发送成功
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.sent = []
+        self.closed = False
+
+    def sendto(self, packet, address):
+        error = self.script.pop(0) if self.script else None
+        if error is not None:
+            raise error
+        self.sent.append((packet, address[0]))
+        return len(packet)
+
+    def fileno(self):
+        return -1 if self.closed else 100
+
+    def setblocking(self, flag):
+        pass
+
+
+def make_io(sock):
+    io = InterfaceIO.__new__(InterfaceIO)
+    io.runtime = SimpleNamespace(loop=FakeLoop())
+    io.interface = SimpleNamespace(interface_name='eth0', ip='10.0.0.1')
+    io.send_sock = sock
+    io.write_queue = runtime.collections.deque()
+    io.sent = io.dropped = 0
+    return io
+
+
+def test_send_goes_straight_to_socket():
+    sock = FakeSendSocket()
+    io = make_io(sock)
+    io.send(b'a', '224.0.0.5')
+    assert sock.sent == [(b'a', '224.0.0.5')] and io.sent == 1
+    assert not io.write_queue and not io.runtime.loop.writers
+
+
+def test_blocked_send_is_queued_and_drained_in_order():
+    sock = FakeSendSocket([BlockingIOError()])
+    io = make_io(sock)
+    io.send(b'a', '224.0.0.5')
+    assert io.runtime.loop.writers == {sock: io.on_writable}  # 套接字缓冲区满，等待可写
+    io.send(b'b', '224.0.0.6')  # 写队列不空时不直接发送，保持顺序
+    assert sock.sent == [] and list(io.write_queue) == [(b'a', '224.0.0.5'), (b'b', '224.0.0.6')]
+    sock.script = [None, BlockingIOError()]
+    io.on_writable()
+    assert sock.sent == [(b'a', '224.0.0.5')]
+    assert list(io.write_queue) == [(b'b', '224.0.0.6')] and sock in io.runtime.loop.writers
+    io.on_writable()
+    assert sock.sent == [(b'a', '224.0.0.5'), (b'b', '224.0.0.6')]
+    assert not io.write_queue and not io.runtime.loop.writers
+    assert io.sent == 2 and io.dropped == 0
+
+
+def test_failed_send_is_dropped_and_queue_continues():
+    sock = FakeSendSocket([BlockingIOError(), OSError(errno.EMSGSIZE, 'too long')])
+    io = make_io(sock)
+    io.send(b'big', '224.0.0.5')
+    io.send(b'small', '224.0.0.5')
+    io.on_writable()
+    assert sock.sent == [(b'small', '224.0.0.5')]
+    assert io.dropped == 1 and io.sent == 1 and not io.runtime.loop.writers
+
+
+def test_stale_socket_is_rebuilt_and_resent(monkeypatch):
+    old = FakeSendSocket([OSError(errno.EADDRNOTAVAIL, 'address changed')] * 2)  # 失效的套接字每次发送都失败
+    new = FakeSendSocket()
+    rebuilt = []
+    monkeypatch.setattr(runtime, 'send_sockets',
+                        SimpleNamespace(rebuild=lambda source, sock: rebuilt.append((source, sock)) or new))
+    io = make_io(old)
+    io.send(b'a', '224.0.0.5')
+    assert rebuilt == [('10.0.0.1', old)]
+    assert io.send_sock is new and new.sent == [(b'a', '224.0.0.5')]
+    assert not io.write_queue and not io.runtime.loop.writers
+
+
+def test_runtime_send_routes_by_source(rt):
+    sent = []
+    rt.interfaces['10.0.0.1'] = SimpleNamespace(send=lambda packet, destination: sent.append((packet, destination)))
+    assert not rt.send(b'a', '10.0.0.9', '224.0.0.5')  # 不属于已注册接口，由调用者直接发送
+    assert rt.send(b'a', '10.0.0.1', '224.0.0.5')
+    assert sent == [(b'a', '224.0.0.5')]
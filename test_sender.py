@@ -0,0 +1,194 @@
+import errno
+import time
+
+import pytest
+
+import STATIC
+from OSPFRole.LSA import *
+from checksum import fletcher16_verify
+from sender import IP_HEADER_LEN, OSPF_BODY_OFFSET, SendSocketPool, build_dd_packet, build_hello_packet, \
+    build_lsack_packet, build_lsr_packet, build_lsu_packet
+
+# 原来用gen_packet拼接各段的发送函数生成的报文（IP标识为0x1001，LSA的age为37秒），
+# 一次写入预分配缓冲区的编码结果必须与之逐字节相同
+NOW = 1700000000
+SOURCE_IP = '10.0.0.1'
+ROUTER_ID = '1.1.1.1'
+AREA_ID = '0.0.0.0'
+HELLO_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a000001e0000005'
+    '020100340101010100000000dc8700000000000000000000'
+    'ffffff00000a0201000000280a0000010a0000020202020203030303')
+DD_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a0000010a000002'
+    '020200480101010100000000540000000000000000000000'
+    '05dc0207000030390025020101010101010101018000000508ff0030002502020a00010101010101'
+    '8000000250ec0020')
+LSR_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a0000010a000002'
+    '020300300101010100000000eac000000000000000000000'
+    '000000010101010101010101000000020a00010101010101')
+LSU_ROUTER_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a000001e0000005'
+    '0204004c0101010100000000463d00000000000000000000'
+    '000000010025020101010101010101018000000508ff0030020000020a000000ffffff000300000a'
+    '0a0001010a00010202000001')
+LSU_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a000001e0000005'
+    '0204006c010101010000000060dc00000000000000000000'
+    '000000020025020101010101010101018000000508ff0030020000020a000000ffffff000300000a'
+    '0a0001010a00010202000001002502020a000101010101018000000250ec0020ffffff0001010101'
+    '02020202')
+LSACK_IMAGE = bytes.fromhex(
+    '45c0000010010000015900000a000001e0000005'
+    '0205004001010101000000008c2100000000000000000000'
+    '0025020101010101010101018000000508ff0030002502020a000101010101018000000250ec0020')
+LSU_LSAS_OFFSET = OSPF_BODY_OFFSET + 4  # LSU报文体以LSA数量开始
+ROUTER_LSA_LEN = 48
+
+
+class Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    monkeypatch.setattr(STATIC, 'identification', 0x1000)
+    return clock
+
+
+@pytest.fixture
+def lsas(clock):
+    router = Router_LSA(2, ROUTER_ID, ROUTER_ID, -0x7ffffffb, False, True, False)
+    router.add_stub_network('10.0.0.0', '255.255.255.0', 10, None)
+    router.add_trans_network('10.0.1.1', '10.0.1.2', 1, None)
+    network = Network_LSA(2, '10.0.1.1', ROUTER_ID, -0x7ffffffe, '255.255.255.0', [ROUTER_ID, '2.2.2.2'])
+    clock.now += 37
+    return router, network
+
+
+def test_hello_wire_image(clock):
+    packet = build_hello_packet(SOURCE_IP, '224.0.0.5', ROUTER_ID, AREA_ID, '255.255.255.0', 10, 2, 1, 40,
+                                '10.0.0.1', '10.0.0.2', ['2.2.2.2', '3.3.3.3'])
+    assert bytes(packet) == HELLO_IMAGE
+
+
+def test_dd_wire_image(lsas):
+    packet = build_dd_packet(SOURCE_IP, '10.0.0.2', ROUTER_ID, AREA_ID, 1500, 2, 7, 12345, lsas)
+    assert bytes(packet) == DD_IMAGE
+
+
+def test_lsr_wire_image(lsas):
+    assert bytes(build_lsr_packet(SOURCE_IP, '10.0.0.2', ROUTER_ID, AREA_ID, lsas)) == LSR_IMAGE
+
+
+def test_lsack_wire_image(lsas):
+    assert bytes(build_lsack_packet(SOURCE_IP, '224.0.0.5', ROUTER_ID, AREA_ID, lsas)) == LSACK_IMAGE
+
+
+def test_lsu_wire_image(lsas):
+    router, network = lsas
+    assert bytes(build_lsu_packet(SOURCE_IP, '224.0.0.5', ROUTER_ID, AREA_ID, [router])) == LSU_ROUTER_IMAGE
+    STATIC.identification = 0x1000
+    packet = bytes(build_lsu_packet(SOURCE_IP, '224.0.0.5', ROUTER_ID, AREA_ID, [router, network]))
+    assert packet == LSU_IMAGE
+    router_lsa = packet[LSU_LSAS_OFFSET:LSU_LSAS_OFFSET + ROUTER_LSA_LEN]
+    network_lsa = packet[LSU_LSAS_OFFSET + ROUTER_LSA_LEN:]
+    assert router_lsa[16:18] == bytes.fromhex('08ff')  # Fletcher校验和
+    assert network_lsa[16:18] == bytes.fromhex('50ec')
+    assert fletcher16_verify(router_lsa[2:]) and fletcher16_verify(network_lsa[2:])
+
+
+def test_age_change_does_not_reencode(lsas, clock, monkeypatch):
+    router, network = lsas
+    cached = router.packet, network.packet
+    encoded = []
+    for cls in (Router_LSA, Network_LSA):
+        monkeypatch.setattr(cls, 'encode_into', lambda self, buf, offset: encoded.append(self))
+    clock.now += 1
+    packet = build_lsu_packet(SOURCE_IP, '224.0.0.5', ROUTER_ID, AREA_ID, [router, network])
+    assert encoded == []  # 只有age变化，使用缓存的LSA报文，不重新编码也不重新计算Fletcher校验和
+    assert router.packet is cached[0] and network.packet is cached[1]
+    for offset in (LSU_LSAS_OFFSET, LSU_LSAS_OFFSET + ROUTER_LSA_LEN):
+        assert OSPFLSAHeaderOperator.shared().decode(packet, offset).age == 38
+        packet[offset:offset + 2] = (37).to_bytes(2, 'big')
+    # 除了age与OSPF头中的校验和，报文与age为37秒时相同
+    checksum = slice(IP_HEADER_LEN + 12, IP_HEADER_LEN + 14)
+    assert packet[checksum] != LSU_IMAGE[checksum]
+    packet[checksum] = LSU_IMAGE[checksum]
+    assert bytes(packet) == LSU_IMAGE
+
+
+class FakeRawSocket:
+    # 代替原始套接字：errors中的错误在sendto时依次抛出
+    def __init__(self, *args):
+        self.args = args
+        self.bound = None
+        self.errors = []
+        self.sent = []
+        self.closed = False
+
+    def bind(self, address):
+        self.bound = address[0]
+
+    def setsockopt(self, *args):
+        pass
+
+    def sendto(self, packet, address):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((packet, address[0]))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    opened = []
+    pool = SendSocketPool(socket_factory=lambda *args: opened.append(FakeRawSocket(*args)) or opened[-1])
+    pool.opened_sockets = opened
+    return pool
+
+
+def test_pool_reuses_socket_per_source(pool):
+    pool.send(b'a', '10.0.0.1', '224.0.0.5')
+    pool.send(b'b', '10.0.0.1', '10.0.0.2')
+    pool.send(b'c', '10.0.1.1', '224.0.0.5')
+    first, second = pool.opened_sockets
+    assert (first.bound, second.bound) == ('10.0.0.1', '10.0.1.1')
+    assert first.sent == [(b'a', '224.0.0.5'), (b'b', '10.0.0.2')] and second.sent == [(b'c', '224.0.0.5')]
+    assert (pool.opened, pool.rebuilt, pool.sent) == (2, 0, 3)
+
+
+def test_pool_rebuilds_stale_socket(pool):
+    stale = pool.get('10.0.0.1')
+    stale.errors = [OSError(errno.EADDRNOTAVAIL, 'address changed')]
+    pool.send(b'a', '10.0.0.1', '224.0.0.5')
+    _, fresh = pool.opened_sockets
+    assert stale.closed and stale.sent == []
+    assert fresh.sent == [(b'a', '224.0.0.5')] and pool.get('10.0.0.1') is fresh
+    assert (pool.opened, pool.rebuilt, pool.sent) == (2, 1, 1)
+    assert pool.rebuild('10.0.0.1', stale) is fresh  # 已经被其他线程重新创建，不再创建
+
+
+def test_pool_raises_other_send_errors(pool):
+    sock = pool.get('10.0.0.1')
+    sock.errors = [OSError(errno.EMSGSIZE, 'too long')]
+    with pytest.raises(OSError):
+        pool.send(b'a', '10.0.0.1', '224.0.0.5')
+    assert not sock.closed and pool.rebuilt == 0 and pool.get('10.0.0.1') is sock
+
+
+def test_pool_close(pool):
+    sock = pool.get('10.0.0.1')
+    pool.close('10.0.0.1')
+    pool.close('10.0.0.9')  # 没有打开过的源地址忽略
+    assert sock.closed and pool.sockets == {}
+    assert pool.get('10.0.0.1') is not sock and pool.opened == 2
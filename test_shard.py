@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import shard
+from OSPFRole.LSA import *
+from address import ip_to_int
+from shard import LSDBArea, ShardArea, lsa_from_packet
+from shared_lsdb import SharedLSDB, SharedLSDBFull
+
+ROUTER_ID = '1.1.1.1'
+
+
+def make_lsa(router_id, seq, link_num=1):
+    lsa = Router_LSA(2, router_id, router_id, seq, False, False, False)
+    for k in range(link_num):
+        lsa.add_stub_network(f'172.16.{k}.0', '255.255.255.0', 10, None)
+    return lsa
+
+
+def image_of(lsa):
+    return lsa.type, ip_to_int(lsa.id), ip_to_int(lsa.advertising_router), lsa.seq, bytes(lsa.gen_packet())
+
+
+@pytest.fixture
+def lsdb():
+    lsdb = SharedLSDB()
+    yield lsdb
+    lsdb.close()
+
+
+def reader_of(lsdb):
+    return SharedLSDB(lsdb.name)
+
+
+def test_reader_sees_published_lsas(lsdb):
+    lsas = [make_lsa(f'2.2.2.{i}', 1) for i in range(3)]
+    lsdb.publish([image_of(lsa) for lsa in lsas])
+    reader = reader_of(lsdb)
+    assert reader.seq_index() == {lsa_key(lsa): 1 for lsa in lsas}
+    assert sorted(reader.images()) == sorted(bytes(lsa.gen_packet()) for lsa in lsas)
+    reader.shm.close()
+
+
+def test_reader_copies_only_changed_lsas(lsdb):
+    lsas = [make_lsa(f'2.2.2.{i}', 1) for i in range(3)]
+    lsdb.publish([image_of(lsa) for lsa in lsas])
+    reader = reader_of(lsdb)
+    reader.refresh()
+    assert reader.take_changes() == {lsa_key(lsa) for lsa in lsas}
+    lsas[1].seq = 2
+    lsas[1].add_stub_network('172.17.0.0', '255.255.0.0', 1, None)  # 变长，追加在数据区末尾
+    lsdb.publish([image_of(lsas[1])])
+    assert reader.refresh()
+    assert reader.take_changes() == {lsa_key(lsas[1])}
+    assert lsa_from_packet(reader.image(lsa_key(lsas[1]))).seq == 2
+    assert len(lsa_from_packet(reader.image(lsa_key(lsas[1]))).links) == 2
+    assert not reader.refresh()
+    reader.shm.close()
+
+
+def test_rewrite_when_data_area_is_used_up():
+    lsdb = SharedLSDB(size=4096, max_lsas=8)
+    try:
+        lsa = make_lsa('2.2.2.2', 1, link_num=10)
+        other = make_lsa('3.3.3.3', 1)
+        lsdb.publish([image_of(lsa), image_of(other)])
+        rewrites = 0
+        for seq in range(2, 40):
+            lsa.seq = seq
+            lsa.add_stub_network(f'172.18.{seq}.0', '255.255.255.0', 1, None)  # 每次都变长，追加到数据区末尾
+            data_len = lsdb._data_len
+            lsdb.publish([image_of(lsa)])
+            rewrites += lsdb._data_len < data_len
+        assert rewrites
+        reader = reader_of(lsdb)
+        assert lsa_from_packet(reader.image(lsa_key(lsa))).seq == 39
+        assert reader.image(lsa_key(other)) == bytes(other.gen_packet())
+        reader.shm.close()
+    finally:
+        lsdb.close()
+
+
+def test_full_index_raises():
+    lsdb = SharedLSDB(size=4096, max_lsas=2)
+    try:
+        with pytest.raises(SharedLSDBFull):
+            lsdb.publish([image_of(make_lsa(f'2.2.2.{i}', 1)) for i in range(3)])
+    finally:
+        lsdb.close()
+
+
+def test_shard_area_decodes_only_changed_lsas(lsdb):
+    lsas = [make_lsa(f'2.2.2.{i}', 1) for i in range(3)]
+    lsdb.publish([image_of(lsa) for lsa in lsas])
+    area = ShardArea('0.0.0.0', ROUTER_ID, reader_of(lsdb), queue.Queue())
+    before = {lsa_key(lsa): lsa for lsa in area.router_lsa}
+    assert len(before) == 3
+    lsas[0].seq = 2
+    lsdb.publish([image_of(lsas[0])])
+    after = {lsa_key(lsa): lsa for lsa in area.router_lsa}
+    assert after[lsa_key(lsas[0])].seq == 2
+    assert after[lsa_key(lsas[1])] is before[lsa_key(lsas[1])]
+    assert after[lsa_key(lsas[2])] is before[lsa_key(lsas[2])]
+    assert area.get_lsa_by_ident(lsas[0]) is after[lsa_key(lsas[0])]
+    assert not area.is_newer_lsa(lsas[0])
+    area.lsdb.shm.close()
+
+
+def test_shard_area_lsdb_is_read_only(lsdb):
+    area = ShardArea('0.0.0.0', ROUTER_ID, reader_of(lsdb), queue.Queue())
+    with pytest.raises(AttributeError):
+        area.router_lsa = []
+    area.lsdb.shm.close()
+
+
+def test_shard_area_marks_local_lsas(lsdb):
+    publish_queue = queue.Queue()
+    area = ShardArea('0.0.0.0', ROUTER_ID, reader_of(lsdb), publish_queue)
+    lsa = make_lsa('2.2.2.2', 1)
+
+    class Interface:
+        interface_name = 'eth0'
+    area.add_lsa_to_area(lsa, None)
+    area.add_lsa_to_area(lsa, Interface())
+    assert publish_queue.get_nowait()[::3] == ('lsa', True)
+    assert publish_queue.get_nowait()[::3] == ('lsa', False)
+    area.lsdb.shm.close()
+
+
+def make_lsdb_area(lsdb):
+    area = LSDBArea('0.0.0.0', ROUTER_ID, lsdb)
+    area.fresh_router_lsa()
+    area.publish()
+    return area
+
+
+def test_local_lsa_is_restamped(lsdb):
+    area = make_lsdb_area(lsdb)
+    network_lsa = Network_LSA(2, '10.0.0.1', ROUTER_ID, 1, '255.255.255.0', [ROUTER_ID, '2.2.2.2'])
+    area.install_packet('eth0', bytes(network_lsa.gen_packet()), True)
+    installed = area.get_lsa_by_ident(network_lsa)
+    assert installed is not None and installed.seq >= area.get_mine_router_lsa().seq
+
+
+def test_stale_self_originated_lsa_is_reoriginated(lsdb):
+    area = make_lsdb_area(lsdb)
+    own = area.get_mine_router_lsa()
+    stale = make_lsa(ROUTER_ID, own.seq + 100, link_num=3)  # 重启之前发出的实例，序号比当前的大
+    area.install_packet('eth0', bytes(stale.gen_packet()), False)
+    current = area.get_mine_router_lsa()
+    assert current is own and current.seq > stale.seq
+    assert len(current.links) == 0  # 内容仍然是本路由器当前的，而不是收到的旧实例
+    area.publish()
+    assert reader_seq(lsdb, own) == current.seq
+
+
+def test_older_self_originated_lsa_is_ignored(lsdb):
+    area = make_lsdb_area(lsdb)
+    own = area.get_mine_router_lsa()
+    seq = own.seq
+    area.install_packet('eth0', bytes(make_lsa(ROUTER_ID, seq - 1).gen_packet()), False)
+    assert area.get_mine_router_lsa().seq == seq and not area.lsdb_changed
+
+
+def reader_seq(lsdb, lsa):
+    reader = reader_of(lsdb)
+    seq = reader.seq_index().get(lsa_key(lsa))
+    reader.shm.close()
+    return seq
+
+
+def test_run_lsdb_retries_failed_publish(lsdb, monkeypatch):
+    area = make_lsdb_area(lsdb)
+    routes = []
+    monkeypatch.setattr(shard, 'refresh_routing_table', routes.append)
+    publish = lsdb.publish
+    failures = [1]
+
+    def failing_publish(images):
+        if failures[0]:
+            failures[0] -= 1
+            raise SharedLSDBFull('test')
+        publish(images)
+    monkeypatch.setattr(lsdb, 'publish', failing_publish)
+    publish_queue = queue.Queue()
+    stop_event = threading.Event()
+    thread = threading.Thread(target=shard.run_lsdb, args=(area, publish_queue, stop_event), daemon=True)
+    thread.start()
+    lsa = make_lsa('2.2.2.2', 5)
+    publish_queue.put(('lsa', 'eth0', bytes(lsa.gen_packet()), False))
+    deadline = time.monotonic() + 5
+    while reader_seq(lsdb, lsa) != 5:
+        assert time.monotonic() < deadline, 'lsdb was not published after a failure'
+        assert thread.is_alive()
+        time.sleep(0.05)
+    stop_event.set()
+    thread.join(2)
+    assert not failures[0] and routes
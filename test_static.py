@@ -0,0 +1,15 @@
+import STATIC
+from sender import build_hello_packet
+
+
+def test_identification_wraps_at_16_bits(monkeypatch):
+    monkeypatch.setattr(STATIC, 'identification', 0xfffe)
+    assert STATIC.get_identification() == 0xffff
+    assert STATIC.get_identification() == 0
+
+
+def test_packets_build_after_identification_wrap(monkeypatch):
+    monkeypatch.setattr(STATIC, 'identification', 0xffff)
+    packet = build_hello_packet('10.0.0.2', '224.0.0.5', '1.1.1.1', '0.0.0.0', '255.255.255.0', 10, 2, 1, 40,
+                                '10.0.0.1', '10.0.0.2', [])
+    assert int.from_bytes(packet[4:6], 'big') == 0
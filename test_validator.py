@@ -0,0 +1,150 @@
+import struct
+
+from OSPFRole.LSA import *
+from checksum import internet_checksum
+from sender import IP_HEADER_LEN, build_hello_packet, build_lsack_packet, build_lsu_packet
+from validator import PacketValidator, OSPF_AUTH_OFFSET, OSPF_HEADER_LEN
+
+AREA_ID = '0.0.0.0'
+
+
+def make_lsa(seq=1):
+    lsa = Router_LSA(2, '1.1.1.1', '1.1.1.1', seq, False, False, False)
+    lsa.add_stub_network('10.0.0.0', '255.255.255.0', 10, None)
+    return lsa
+
+
+def ospf_of(packet) -> bytearray:
+    # 去掉IP头，只保留OSPF报文
+    return bytearray(packet[IP_HEADER_LEN:])
+
+
+def hello():
+    return ospf_of(build_hello_packet('10.0.0.2', '224.0.0.5', '1.1.1.1', AREA_ID, '255.255.255.0', 10, 2, 1, 40,
+                                      '10.0.0.1', '10.0.0.2', ['2.2.2.2']))
+
+
+def fix_checksum(ospf):
+    # 修改了OSPF头之后重新计算校验和（不覆盖8字节认证数据）
+    struct.pack_into('!H', ospf, 12, 0)
+    struct.pack_into('!H', ospf, 12, internet_checksum(bytes(ospf[:OSPF_AUTH_OFFSET] + ospf[OSPF_HEADER_LEN:])))
+    return ospf
+
+
+def check(ospf, validator=None):
+    validator = validator or PacketValidator(AREA_ID)
+    return validator.check_packet(ospf, 0, len(ospf)), validator
+
+
+def only_reason(validator):
+    assert validator.accepted == 0
+    assert len(validator.rejected) == 1
+    return next(iter(validator.rejected))
+
+
+def lazy_lsa(raw):
+    raw = memoryview(raw)
+    return OSPFLazyLSAData(OSPFLSAHeaderOperator.shared().decode(raw), raw)
+
+
+def test_valid_packets_are_accepted():
+    for ospf in (hello(),
+                 ospf_of(build_lsu_packet('10.0.0.2', '224.0.0.5', '1.1.1.1', AREA_ID, [make_lsa()])),
+                 ospf_of(build_lsack_packet('10.0.0.2', '224.0.0.5', '1.1.1.1', AREA_ID, [make_lsa(), make_lsa(2)]))):
+        ok, validator = check(ospf)
+        assert ok, validator.rejected
+        assert validator.accepted == 1
+
+
+def test_truncated():
+    ok, validator = check(hello()[:OSPF_HEADER_LEN - 1])
+    assert not ok and only_reason(validator) == OSPFRejectReason.TRUNCATED
+
+
+def test_bad_version():
+    ospf = hello()
+    ospf[0] = 3
+    ok, validator = check(fix_checksum(ospf))
+    assert not ok and only_reason(validator) == OSPFRejectReason.BAD_VERSION
+
+
+def test_bad_type():
+    ospf = hello()
+    ospf[1] = 6
+    ok, validator = check(fix_checksum(ospf))
+    assert not ok and only_reason(validator) == OSPFRejectReason.BAD_TYPE
+
+
+def test_length_beyond_ip_payload():
+    ospf = hello()
+    validator = PacketValidator(AREA_ID)
+    assert not validator.check_packet(ospf, 0, len(ospf) - 4)
+    assert only_reason(validator) == OSPFRejectReason.BAD_LENGTH
+
+
+def test_length_not_a_multiple_of_lsa_header():
+    ospf = ospf_of(build_lsack_packet('10.0.0.2', '224.0.0.5', '1.1.1.1', AREA_ID, [make_lsa()]))
+    ospf = ospf[:-4]
+    struct.pack_into('!H', ospf, 2, len(ospf))
+    ok, validator = check(fix_checksum(ospf))
+    assert not ok and only_reason(validator) == OSPFRejectReason.BAD_LENGTH
+
+
+def test_area_mismatch():
+    ok, validator = check(hello(), PacketValidator('0.0.0.1'))
+    assert not ok and only_reason(validator) == OSPFRejectReason.AREA_MISMATCH
+
+
+def test_autype_mismatch():
+    ok, validator = check(hello(), PacketValidator(AREA_ID, OSPFAuthType.SIMPLE))
+    assert not ok and only_reason(validator) == OSPFRejectReason.AUTH_MISMATCH
+
+
+def test_bad_checksum():
+    ospf = hello()
+    ospf[-1] ^= 0xff
+    ok, validator = check(ospf)
+    assert not ok and only_reason(validator) == OSPFRejectReason.BAD_CHECKSUM
+
+
+def test_checksum_skips_authentication_field():
+    ospf = hello()
+    ospf[OSPF_AUTH_OFFSET:OSPF_HEADER_LEN] = b'password'
+    ok, validator = check(ospf)
+    assert ok, validator.rejected
+
+
+def test_cryptographic_autype_skips_checksum():
+    ospf = hello()
+    struct.pack_into('!H', ospf, 14, OSPFAuthType.PASSWORD)
+    struct.pack_into('!H', ospf, 12, 0xdead)
+    ok, validator = check(ospf, PacketValidator(AREA_ID, OSPFAuthType.PASSWORD))
+    assert ok, validator.rejected
+
+
+def test_valid_lsa_is_accepted():
+    validator = PacketValidator(AREA_ID)
+    assert validator.check_lsa(lazy_lsa(make_lsa().gen_packet()))
+    assert not validator.rejected
+
+
+def test_lsa_age_is_not_covered_by_checksum():
+    raw = make_lsa().gen_packet()
+    struct.pack_into('!H', raw, 0, 3600)
+    assert PacketValidator(AREA_ID).check_lsa(lazy_lsa(raw))
+
+
+def test_bad_lsa_checksum():
+    raw = make_lsa().gen_packet()
+    raw[-1] ^= 0xff
+    validator = PacketValidator(AREA_ID)
+    assert not validator.check_lsa(lazy_lsa(raw))
+    assert only_reason(validator) == OSPFRejectReason.BAD_LSA_CHECKSUM
+
+
+def test_bad_lsa_type():
+    raw = make_lsa().gen_packet()
+    raw[3] = 9
+    validator = PacketValidator(AREA_ID)
+    assert not validator.check_lsa(lazy_lsa(raw))
+    assert only_reason(validator) == OSPFRejectReason.BAD_LSA_TYPE
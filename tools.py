@@ -6,6 +6,8 @@ import pydantic
 from typing import List
 
 from STATIC import OSPFOptionMask
+from checksum import internet_checksum as cal_checksum, fletcher16  # 兼容原来的调用名
+from address import ip_to_int, int_to_ip, mask_len, net_address, in_net
 
 logging.basicConfig(level=logging.DEBUG  # 设置日志输出格式
                     # ,filename="runlog.log" #log日志输出的文件位置和文件名
@@ -17,17 +19,6 @@ logging.basicConfig(level=logging.DEBUG  # 设置日志输出格式
                     )
 
 
-def cal_checksum(data):  # 校验和不计算验证信息field，故首先跳过。 此处传入整个OSPF包，但是不包括IP部分。
-    if len(data) % 2:
-        data += b'\x00'
-    res = 0
-    for i in range(len(data) >> 1):
-        res += ((data[i * 2] << 8) + data[i * 2 + 1])
-        while res > 0xffff:
-            res = (res & 0xffff) + (res >> 16)
-    return (~res) & 0xffff
-
-
 import socket
 import struct
 import fcntl
@@ -43,19 +34,7 @@ class Route_item(pydantic.BaseModel):
 
 
 def mask_to_mask_len(mask):
-    mask = ip_to_list(mask)
-    ret = 0
-    for n in mask:
-        if n == 255:
-            ret += 8
-        else:
-            n1 = n
-            while n1 > 0 and n1 % 2 == 0:
-                n1 >>= 1
-            while n1:
-                ret += 1
-                n1 >>= 1
-    return ret
+    return mask_len(mask)
 
 
 def get_ip_address(interface_name):
@@ -88,6 +67,20 @@ def get_netmask(interface_name):
         return None
 
 
+def get_mtu(interface_name, default=1500):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packed_interface_name = struct.pack('256s', interface_name[:15].encode('utf-8'))
+    try:
+        return struct.unpack('i', fcntl.ioctl(
+            sock.fileno(),
+            0x8921,  # SIOCGIFMTU
+            packed_interface_name
+        )[16:20])[0]
+    except IOError as e:
+        print(f"Error retrieving mtu for interface {interface_name}: {e}")
+        return default
+
+
 def get_all_routes(priority=123) -> List[Route_item]:
     ip = pyroute2.IPRoute()
     routes = ip.get_routes()
@@ -151,31 +144,17 @@ def list_to_ip(ip_list):
 
 
 def ip_mask_to_net(ip, mask):
-    ip = ip_to_list(ip)
-    mask = ip_to_list(mask)
-    net = [ip[i] & mask[i] for i in range(4)]
-    return list_to_ip(net)
+    return net_address(ip, mask)
 
 
 def ip_in_net(ip, net, mask):
-    ip = ip_to_list(ip)
-    net = ip_to_list(net)
-    mask = ip_to_list(mask)
-    for i in range(4):
-        if (ip[i] & mask[i]) != (net[i] & mask[i]):
-            return False
-    return True
+    return in_net(ip, net, mask)
 
 
 def compare_router_id_bigger(routerid1, routerid2):
-    routerid1 = ip_to_list(routerid1)
-    routerid2 = ip_to_list(routerid2)
-    for i in range(4):
-        if routerid1[i] > routerid2[i]:
-            return 1
-        if routerid1[i] < routerid2[i]:
-            return -1
-    return 0
+    routerid1 = ip_to_int(routerid1)
+    routerid2 = ip_to_int(routerid2)
+    return (routerid1 > routerid2) - (routerid1 < routerid2)
 
 
 def gen_options(E, MC, NP, EA, DC):
@@ -189,34 +168,6 @@ def gen_DD_options(I: bool, M: bool, MS: bool):
     return (I << 2) + (M << 1) + MS
 
 
-def c_style_mod(a, b):
-    result = a % b
-    if (result != 0 and (a < 0) != (b < 0) and b < 0):
-        result += b
-    return result
-
-
-def fletcher16(data):
-    L = len(data)
-    n = 15  # 假设校验和字段最初设为0，并用0表示位置
-    C0, C1 = 0, 0
-
-    for i in range(L):
-        C0 = (C0 + data[i]) % 255
-        C1 = (C1 + C0) % 255
-    X = - C1 + (L - n) * C0
-    Y = C1 - (L - n + 1) * C0
-
-    X = c_style_mod(X, 255)
-    Y = c_style_mod(Y, 255)
-    if X == 0:
-        X = 255
-    if Y == 0:
-        Y = 255
-
-    return (X << 8) + Y
-
-
 if __name__ == '__main__':
     # 测试能否获取网卡对应的ip和mask
     # interface = 'ens33'
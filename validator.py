@@ -0,0 +1,76 @@
+import collections
+import logging
+import socket
+
+from Decoder import compile_fmt
+from STATIC import *
+from checksum import internet_checksum_parts, fletcher16_verify
+
+# OSPF头中用于校验的字段：version, type, length, router_id, area_id, checksum, autype（认证数据不读取）
+OSPF_CHECK_FMT = '!BBH4s4sHH'
+OSPF_HEADER_LEN = 24
+OSPF_AUTH_OFFSET = 16  # 校验和不覆盖从此处开始的8字节认证数据
+LSA_HEADER_LEN = 20
+LSA_TYPES = (1, 2, 3, 4, 5)
+
+# 各类报文在OSPF头之后的最小长度，以及重复元素的长度（LSR请求与LSAck中的LSA头）
+MIN_BODY_LEN = {OSPFPacketType.HELLO: 20,
+                OSPFPacketType.DD: 8,
+                OSPFPacketType.LSR: 0,
+                OSPFPacketType.LSU: 4,
+                OSPFPacketType.LSA: 0}
+BODY_ITEM_LEN = {OSPFPacketType.LSR: 12,
+                 OSPFPacketType.LSA: LSA_HEADER_LEN}
+
+
+class PacketValidator:
+    # 在完整解码之前，用一次定长读取检查OSPF头，错误或不属于本接口的报文只花费几微秒就被丢弃。
+    # 每个接口一个实例，只在该接口的接收线程中使用；丢弃原因记录在rejected中。
+    def __init__(self, area_id, auth_type=OSPFAuthType.NULL):
+        self.area_id = socket.inet_aton(area_id)
+        self.auth_type = auth_type
+        self.accepted = 0
+        self.rejected = collections.Counter()
+        self._codec = compile_fmt(OSPF_CHECK_FMT)
+
+    def reject(self, reason, detail='') -> bool:
+        self.rejected[reason] += 1
+        logging.debug(f'[validator] drop packet: {reason} {detail}')
+        return False
+
+    def check_packet(self, data, offset, ip_payload_len) -> bool:
+        # data从offset开始为OSPF报文，ip_payload_len为IP头中总长度减去IP头长度
+        if len(data) - offset < OSPF_HEADER_LEN:
+            return self.reject(OSPFRejectReason.TRUNCATED, len(data) - offset)
+        version, type, length, _, area_id, checksum, autype = self._codec.unpack_from(data, offset)
+        if version != 2:
+            return self.reject(OSPFRejectReason.BAD_VERSION, version)
+        if type not in MIN_BODY_LEN:
+            return self.reject(OSPFRejectReason.BAD_TYPE, type)
+        body_len = length - OSPF_HEADER_LEN
+        if (body_len < MIN_BODY_LEN[type] or length > ip_payload_len or offset + length > len(data)
+                or body_len % BODY_ITEM_LEN.get(type, 1)):
+            return self.reject(OSPFRejectReason.BAD_LENGTH, length)
+        if area_id != self.area_id:
+            return self.reject(OSPFRejectReason.AREA_MISMATCH, socket.inet_ntoa(area_id))
+        if autype != self.auth_type:
+            return self.reject(OSPFRejectReason.AUTH_MISMATCH, autype)
+        if autype != OSPFAuthType.PASSWORD:  # 密码学认证时不使用校验和
+            end = offset + length
+            if internet_checksum_parts(data[offset:offset + OSPF_AUTH_OFFSET],
+                                       data[offset + OSPF_HEADER_LEN:end]) != 0:
+                return self.reject(OSPFRejectReason.BAD_CHECKSUM, checksum)
+        self.accepted += 1
+        return True
+
+    def check_lsa(self, lsa) -> bool:
+        # lsa为LSU中解码出的OSPFLazyLSAData，安装之前校验类型与Fletcher校验和（不覆盖age字段）
+        if lsa.header.type not in LSA_TYPES:
+            return self.reject(OSPFRejectReason.BAD_LSA_TYPE, lsa)
+        if not fletcher16_verify(lsa.raw[2:]):
+            return self.reject(OSPFRejectReason.BAD_LSA_CHECKSUM, lsa)
+        return True
+
+    def stats_text(self):
+        reasons = ', '.join(f'{reason}: {count}' for reason, count in sorted(self.rejected.items()))
+        return f'accepted: {self.accepted}, rejected: {sum(self.rejected.values())} ({reasons})'